@@ -1,15 +1,24 @@
+import argparse
 import csv
+import heapq
+import os
+import random
+import sys
+from collections.abc import Mapping
 from typing import List, Tuple, Dict
-import pandas as pd
-import numpy as np
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
 from datetime import datetime
+from itertools import islice
+from instrumentation import timed
+from pdf_generator import get_styles, sensor_table_style
+
+# numpy, reportlab ve katalog yükleyicisi yalnızca gereken yolda içe aktarılır; konsol çıktısı
+# ve worker.py'ye iş gönderen istemci bunları hiç yüklemez
 
 # Veri yapıları ve mevcut sınıflar aynı kalıyor
 class EnvironmentalData:
+    # __slots__: örnek başına __dict__ yok, uzun okuma listelerinde bellek tasarrufu
+    __slots__ = ('temperature', 'humidity', 'rainfall', 'soil_ph', 'soil_moisture', 'pest_risk')
+
     def __init__(self, temperature, humidity, rainfall, soil_ph, soil_moisture, pest_risk):
         self.temperature = temperature
         self.humidity = humidity
@@ -19,6 +28,8 @@ class EnvironmentalData:
         self.pest_risk = pest_risk
 
 class CropData:
+    __slots__ = ('name', 'optimal_temp', 'optimal_humidity', 'water_needs', 'optimal_ph', 'pest_resistance')
+
     def __init__(self, name, optimal_temp, optimal_humidity, water_needs, optimal_ph, pest_resistance):
         self.name = name
         self.optimal_temp = optimal_temp
@@ -37,8 +48,25 @@ class CropPredictionModel:
             'ph': 0.2,
             'pest': 0.15
         }
+        self._crop_matrix = None
 
-    def calculate_crop_score(self, env: EnvironmentalData, crop: CropData) -> Tuple[float, Dict[str, str]]:
+    def score_crop(self, env: EnvironmentalData, crop: CropData) -> float:
+        # Yalnızca sayısal skor; neden metinleri explain_crop_score ile ayrıca üretilir
+        temp_score = 1 - abs(env.temperature - crop.optimal_temp) / 50
+        humidity_score = 1 - abs(env.humidity - crop.optimal_humidity) / 100
+        water_score = 1 - abs(env.rainfall - crop.water_needs) / 1000
+        ph_score = 1 - abs(env.soil_ph - crop.optimal_ph) / 14
+        pest_score = (crop.pest_resistance / 10) * (1 - env.pest_risk / 10)
+
+        return (
+            self.weights['temperature'] * temp_score +
+            self.weights['humidity'] * humidity_score +
+            self.weights['water'] * water_score +
+            self.weights['ph'] * ph_score +
+            self.weights['pest'] * pest_score
+        )
+
+    def explain_crop_score(self, env: EnvironmentalData, crop: CropData) -> Dict[str, str]:
         reasons = {}
         
         temp_diff = abs(env.temperature - crop.optimal_temp)
@@ -60,26 +88,79 @@ class CropPredictionModel:
         pest_score = (crop.pest_resistance / 10) * (1 - env.pest_risk / 10)
         reasons['Zararli'] = f"Zararli direnci mevcut risk göz önüne alindiginda.{'yüksek' if pest_score > 0.5 else 'düsük'} "
 
-        total_score = (
-            self.weights['temperature'] * temp_score +
-            self.weights['humidity'] * humidity_score +
-            self.weights['water'] * water_score +
-            self.weights['ph'] * ph_score +
-            self.weights['pest'] * pest_score
-        )
-        
-        return total_score, reasons
+        return reasons
+
+    def calculate_crop_score(self, env: EnvironmentalData, crop: CropData) -> Tuple[float, Dict[str, str]]:
+        return self.score_crop(env, crop), self.explain_crop_score(env, crop)
 
+    @timed('ana_predict_best_crops')
     def predict_best_crops(self, env: EnvironmentalData, top_n: int = 5) -> List[Tuple[str, float, Dict[str, str]]]:
-        scores = []
-        for crop in self.crop_data:
-            score, reasons = self.calculate_crop_score(env, crop)
-            scores.append((crop.name, score, reasons))
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:top_n]
-
-def generate_pdf_report(recommendations, sensor_data, alerts, sensor_recommendations):
-    doc = SimpleDocTemplate("tarim_raporu.pdf", pagesize=letter)
-    styles = getSampleStyleSheet()
+        # Önce yalnızca sayısal skorlar, ardından seçilen top_n ürün için tembel nedenler
+        scores = ((crop, self.score_crop(env, crop)) for crop in self.crop_data)
+        best = heapq.nlargest(top_n, scores, key=lambda x: x[1])
+        return [(crop.name, score, LazyReasons(self, env, crop)) for crop, score in best]
+
+    @timed('ana_predict_best_crops_batch')
+    def predict_best_crops_batch(self, envs, top_n: int = 5, chunk_size=None) -> List[List[Tuple[str, float, Dict[str, str]]]]:
+        # Skorlar tek matris işlemiyle hesaplanır, nedenler yalnızca ilk top_n ürün için üretilir
+        from prediction_model import MAX_SCORE_BLOCK_BYTES, crop_matrix, env_matrix, score_matrix, top_n_indices
+
+        if self._crop_matrix is None:
+            self._crop_matrix = crop_matrix(self.crop_data)
+        chunk_size = chunk_size or max(1, MAX_SCORE_BLOCK_BYTES // (8 * max(1, len(self.crop_data))))
+        results = []
+        envs = iter(envs)
+        while True:
+            chunk = list(islice(envs, chunk_size))
+            if not chunk:
+                break
+            scores = score_matrix(env_matrix(chunk), self._crop_matrix, self.weights)
+            for env, row, indices in zip(chunk, scores, top_n_indices(scores, top_n)):
+                results.append([
+                    (self.crop_data[i].name, float(row[i]), LazyReasons(self, env, self.crop_data[i]))
+                    for i in indices
+                ])
+        return results
+
+class LazyReasons(Mapping):
+    """Reason strings for one crop, formatted on first access and then kept."""
+    __slots__ = ('_model', '_env', '_crop', '_reasons')
+
+    def __init__(self, model: CropPredictionModel, env: EnvironmentalData, crop: CropData):
+        self._model = model
+        self._env = env
+        self._crop = crop
+        self._reasons = None
+
+    def _resolve(self) -> Dict[str, str]:
+        if self._reasons is None:
+            self._reasons = self._model.explain_crop_score(self._env, self._crop)
+            self._model = self._env = self._crop = None
+        return self._reasons
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def __repr__(self):
+        return repr(self._resolve())
+
+    def __reduce__(self):
+        # Başka süreçlere model yerine yalnızca metinler gönderilir
+        return dict, (self._resolve(),)
+
+@timed('generate_pdf_report')
+def generate_pdf_report(recommendations, sensor_data, alerts, sensor_recommendations, filename="tarim_raporu.pdf"):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
+
+    doc = SimpleDocTemplate(filename, pagesize=letter)
+    styles = get_styles()
     elements = []
 
     # Başlık
@@ -99,12 +180,7 @@ def generate_pdf_report(recommendations, sensor_data, alerts, sensor_recommendat
     elements.append(Paragraph("Sensör Verileri", styles['Heading2']))
     sensor_data_list = [[key, f"{value:.1f}"] for key, value in sensor_data.items()]
     sensor_table = Table([["Parametre", "Deger"]] + sensor_data_list)
-    sensor_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
+    sensor_table.setStyle(sensor_table_style())
     elements.append(sensor_table)
     elements.append(Spacer(1, 12))
 
@@ -121,24 +197,160 @@ def generate_pdf_report(recommendations, sensor_data, alerts, sensor_recommendat
             elements.append(Paragraph(f"• {recommendation}", styles['Normal']))
 
     doc.build(elements)
-    return "tarim_raporu.pdf"
+    return filename
 
 # Mevcut yardımcı fonksiyonlar
 def get_sensor_data():
     return {
-        'Temperature': np.random.uniform(15, 35),
-        'Humidity': np.random.uniform(40, 100),
-        'Soil_pH': np.random.uniform(4, 9),
-        'Light': np.random.uniform(200, 2000)
+        'Temperature': random.uniform(15, 35),
+        'Humidity': random.uniform(40, 100),
+        'Soil_pH': random.uniform(4, 9),
+        'Light': random.uniform(200, 2000)
     }
 
+SENSOR_PARAMS = ['Temperature', 'Humidity', 'Soil_pH', 'Light']
+
+class SensorRangeTable:
+    """Min/Max sensor ranges per crop, compiled once from crop_conditions.csv."""
+
+    def __init__(self, crops, bounds):
+        # bounds[crop][param] = (min, max), CSV'deki int/float türleri korunur
+        import numpy as np
+
+        self.crops = list(crops)
+        self.bounds = bounds
+        self.index = {crop: i for i, crop in enumerate(self.crops)}
+        shape = (-1, len(SENSOR_PARAMS))
+        self.minimum = np.array([[bounds[crop][param][0] for param in SENSOR_PARAMS] for crop in self.crops],
+                                dtype=np.float64).reshape(shape)
+        self.maximum = np.array([[bounds[crop][param][1] for param in SENSOR_PARAMS] for crop in self.crops],
+                                dtype=np.float64).reshape(shape)
+
+    @classmethod
+    def from_dataframe(cls, crop_conditions):
+        columns = {column: crop_conditions[column].tolist() for column in crop_conditions.columns}
+        return cls._from_columns(columns)
+
+    @classmethod
+    def from_csv(cls, filepath):
+        with open(filepath, 'r') as file:
+            rows = list(csv.DictReader(file))
+        columns = {}
+        for column in rows[0].keys() if rows else ['Crop']:
+            values = [row[column] for row in rows]
+            if column != 'Crop':
+                # pandas gibi: sütunun tamamı tam sayıysa int, değilse float
+                try:
+                    values = [int(value) for value in values]
+                except ValueError:
+                    values = [float(value) for value in values]
+            columns[column] = values
+        return cls._from_columns(columns)
+
+    @classmethod
+    def _from_columns(cls, columns):
+        crops = columns['Crop']
+        bounds = {}
+        for i, crop in enumerate(crops):
+            # Aynı ürün birden fazla kez varsa analyze_sensor_data gibi ilk satır geçerlidir
+            if crop not in bounds:
+                bounds[crop] = {
+                    param: (columns[f'{param}_Min'][i], columns[f'{param}_Max'][i]) for param in SENSOR_PARAMS
+                }
+        return cls(bounds.keys(), bounds)
+
+    def rows_for(self, crops):
+        """Row index of one crop name or of an array of crop names."""
+        if isinstance(crops, str):
+            return self.index[crops]
+        import numpy as np
+        return np.array([self.index[crop] for crop in crops], dtype=np.intp)
+
+class SensorAlerts:
+    """Result of evaluate_sensor_series: boolean masks are (readings x SENSOR_PARAMS)."""
+
+    def __init__(self, values, minimum, maximum, crops, readings=None):
+        self.values = values
+        self.readings = readings
+        self.minimum = minimum
+        self.maximum = maximum
+        self.crops = crops
+        self.low = values < minimum
+        self.high = values > maximum
+        self.out_of_range = self.low | self.high
+        self.alert_counts = dict(zip(SENSOR_PARAMS, self.out_of_range.sum(axis=0).tolist()))
+        self.row_alert_counts = self.out_of_range.sum(axis=1)
+
+    def alert_rows(self):
+        import numpy as np
+        return np.flatnonzero(self.row_alert_counts)
+
+    def reading(self, row, col):
+        """The reading as it was passed in, so an int sensor value is still printed as an int."""
+        if self.readings is None:
+            return self.values[row, col]
+        import numpy as np
+        column = self.readings[SENSOR_PARAMS[col]]
+        if np.ndim(column) == 0:
+            value = column
+        else:
+            value = column.iloc[row] if hasattr(column, 'iloc') else column[row]
+        return value.item() if isinstance(value, np.generic) else value
+
+@timed('evaluate_sensor_series')
+def evaluate_sensor_series(readings, range_table: SensorRangeTable, crops, skip_unknown=False) -> SensorAlerts:
+    """
+    Check a whole time series of readings against the crop ranges at once.
+
+    readings maps each of SENSOR_PARAMS to an array (a DataFrame works too);
+    crops is one crop name for the whole series or one name per reading.
+    An unknown crop name raises KeyError, unless skip_unknown is set: then
+    its readings get NaN bounds and never raise an alert.
+    """
+    import numpy as np
+    values = np.column_stack([np.asarray(readings[param], dtype=np.float64) for param in SENSOR_PARAMS])
+    if not skip_unknown or isinstance(crops, str):
+        rows = range_table.rows_for(crops)
+        return SensorAlerts(values, range_table.minimum[rows], range_table.maximum[rows], crops, readings)
+    known = np.array([crop in range_table.index for crop in crops], dtype=bool)
+    rows = range_table.rows_for([crop for crop in crops if crop in range_table.index])
+    minimum = np.full(values.shape, np.nan)
+    maximum = np.full(values.shape, np.nan)
+    minimum[known] = range_table.minimum[rows]
+    maximum[known] = range_table.maximum[rows]
+    return SensorAlerts(values, minimum, maximum, crops, readings)
+
+def format_sensor_alerts(alerts: SensorAlerts, range_table: SensorRangeTable):
+    """Yield (row, alerts, recommendations) only for readings with an out-of-range value."""
+    import numpy as np
+    for row in alerts.alert_rows():
+        crop = alerts.crops if isinstance(alerts.crops, str) else alerts.crops[row]
+        bounds = range_table.bounds[crop]
+        messages, recommendations = [], []
+        for col in np.flatnonzero(alerts.out_of_range[row]):
+            param = SENSOR_PARAMS[col]
+            ideal_min, ideal_max = bounds[param]
+            value = alerts.reading(row, col)
+            messages.append(f"{param} su anda {value}. Ideal aralik: {ideal_min}-{ideal_max}.")
+            recommendations.append(f"{param} seviyesini düzeltmek için gerekli önlemleri alin.")
+        yield int(row), messages, recommendations
+
+@timed('analyze_sensor_data')
 def analyze_sensor_data(sensor_data, crop_conditions, selected_crop):
-    crop_data = crop_conditions[crop_conditions['Crop'] == selected_crop].iloc[0]
+    # crop_conditions bir DataFrame ya da önceden derlenmiş SensorRangeTable olabilir
+    if isinstance(crop_conditions, SensorRangeTable):
+        crop_data = {
+            f'{param}_{side}': value
+            for param, bounds in crop_conditions.bounds[selected_crop].items()
+            for side, value in zip(('Min', 'Max'), bounds)
+        }
+    else:
+        crop_data = crop_conditions[crop_conditions['Crop'] == selected_crop].iloc[0]
     
     alerts = []
     recommendations = []
 
-    for param in ['Temperature', 'Humidity', 'Soil_pH', 'Light']:
+    for param in SENSOR_PARAMS:
         current_value = sensor_data.get(param)
         ideal_min = crop_data[f'{param}_Min']
         ideal_max = crop_data[f'{param}_Max']
@@ -149,47 +361,44 @@ def analyze_sensor_data(sensor_data, crop_conditions, selected_crop):
 
     return alerts, recommendations
 
-# Ana akış
-import random
+def load_field_model(crops_path="crops.csv", conditions_path="crop_conditions.csv"):
+    """Prediction model and sensor range table used by the field flow."""
+    from data_loader import load_crop_data
 
-if __name__ == "__main__":
-    # Çevresel veri
-    environmental_data = EnvironmentalData(
-        temperature=random.uniform(15, 35),  # 15 ile 35 derece arasında rastgele sıcaklık
-        humidity=random.uniform(30, 90),     # %30 ile %90 arasında rastgele nem
-        rainfall=random.uniform(100, 300),   # 100 ile 300 mm arasında rastgele yağış
-        soil_ph=random.uniform(5.5, 7.5),    # 5.5 ile 7.5 arasında rastgele toprak pH'ı
-        soil_moisture=random.uniform(20, 50),# %20 ile %50 arasında rastgele toprak nemi
-        pest_risk=random.randint(1, 5)       # 1 ile 5 arasında rastgele zararlı riski
-    )
+    # CSV'den ürün verilerini yükleme (güncel ikili önbellek varsa o kullanılır)
+    crop_data = [
+        CropData(
+            name=crop.name,
+            optimal_temp=crop.optimal_temp,
+            optimal_humidity=crop.optimal_humidity,
+            water_needs=crop.water_needs,
+            optimal_ph=crop.optimal_ph,
+            pest_resistance=crop.pest_resistance
+        )
+        for crop in load_crop_data(crops_path)
+    ]
+    return CropPredictionModel(crop_data), SensorRangeTable.from_csv(conditions_path)
 
-    # CSV'den ürün verilerini yükleme
-    crop_data = []  # Örnek veri yapısı
-    with open("crops.csv", mode='r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            crop_data.append(CropData(
-                name=row['name'],
-                optimal_temp=float(row['optimal_temp']),
-                optimal_humidity=float(row['optimal_humidity']),
-                water_needs=float(row['water_needs']),
-                optimal_ph=float(row['optimal_ph']),
-                pest_resistance=float(row['pest_resistance'])
-            ))
-
-    # Modeli başlatma ve tahmin
-    model = CropPredictionModel(crop_data)
-    recommendations = model.predict_best_crops(environmental_data)
-
-    # Ek sensör analizi
-    crop_conditions = pd.read_csv('crop_conditions.csv')
-    sensor_data = get_sensor_data()
-    selected_crop = 'Domates'
+def run_field(model, crop_conditions, environmental_data, sensor_data, selected_crop, pdf_filename=None, top_n=5):
+    """
+    Recommendations, sensor analysis and (optionally) the PDF report for one field.
+
+    The result only holds plain lists and dicts, so worker.py can send it as JSON.
+    """
+    recommendations = model.predict_best_crops(environmental_data, top_n)
     alerts, sensor_recommendations = analyze_sensor_data(sensor_data, crop_conditions, selected_crop)
+    if pdf_filename:
+        pdf_filename = generate_pdf_report(recommendations, sensor_data, alerts, sensor_recommendations, pdf_filename)
+    return {
+        'recommendations': [[crop, score, dict(reasons)] for crop, score, reasons in recommendations],
+        'alerts': alerts,
+        'sensor_recommendations': sensor_recommendations,
+        'pdf': pdf_filename,
+    }
 
-    # Sonuçları yazdırma
+def print_field_result(result):
     print("\n=== Akilli Tarim Yapay Zeka Önerileri ===\n")
-    for crop, score, reasons in recommendations:
+    for crop, score, reasons in result['recommendations']:
         print(f"Ürün: {crop} (Skor: {score:.2f})")
         print("Nedenler:")
         for key, reason in reasons.items():
@@ -198,13 +407,52 @@ if __name__ == "__main__":
 
     print("\n=== Sensör Analizi Sonuçlari ===\n")
     print("Uyarılar:")
-    for alert in alerts:
+    for alert in result['alerts']:
         print(alert)
 
     print("\nTavsiyeler:")
-    for recommendation in sensor_recommendations:
+    for recommendation in result['sensor_recommendations']:
         print(recommendation)
 
-    # PDF raporu oluşturma
-    pdf_filename = generate_pdf_report(recommendations, sensor_data, alerts, sensor_recommendations)
-    print(f"\nPDF raporu oluşturuldu: {pdf_filename}")
\ No newline at end of file
+    if result['pdf']:
+        print(f"\nPDF raporu oluşturuldu: {result['pdf']}")
+
+# Ana akış
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tek bir tarla için ürün önerileri, sensör analizi ve PDF raporu.")
+    parser.add_argument('--crop', default='Domates', help="sensör analizinde kullanılacak ürün")
+    parser.add_argument('--pdf', default='tarim_raporu.pdf', help="rapor dosyası ('' ise PDF oluşturulmaz)")
+    parser.add_argument('--worker', default=os.environ.get('TARIM_WORKER_SOCKET'),
+                        help="iş, bu Unix soketini dinleyen worker.py sürecine gönderilir")
+    args = parser.parse_args(argv)
+
+    # Çevresel veri
+    environmental_data = EnvironmentalData(
+        temperature=random.uniform(15, 35),  # 15 ile 35 derece arasında rastgele sıcaklık
+        humidity=random.uniform(30, 90),     # %30 ile %90 arasında rastgele nem
+        rainfall=random.uniform(100, 300),   # 100 ile 300 mm arasında rastgele yağış
+        soil_ph=random.uniform(5.5, 7.5),    # 5.5 ile 7.5 arasında rastgele toprak pH'ı
+        soil_moisture=random.uniform(20, 50),# %20 ile %50 arasında rastgele toprak nemi
+        pest_risk=random.randint(1, 5)       # 1 ile 5 arasında rastgele zararlı riski
+    )
+    sensor_data = get_sensor_data()
+
+    result = None
+    if args.worker:
+        # Model ve katalog hazır bekleyen süreçte çalıştırılır; worker yoksa iş burada yapılır
+        from worker import WorkerUnavailable, submit
+        try:
+            env = {field: getattr(environmental_data, field) for field in EnvironmentalData.__slots__}
+            result = submit(args.worker, 'field', env=env, sensor_data=sensor_data, crop=args.crop,
+                            pdf=os.path.abspath(args.pdf) if args.pdf else None)
+        except WorkerUnavailable as exc:
+            print(f"Worker kullanılamıyor ({exc}), iş yerel olarak çalıştırılıyor.", file=sys.stderr)
+    if result is None:
+        model, crop_conditions = load_field_model()
+        result = run_field(model, crop_conditions, environmental_data, sensor_data, args.crop, args.pdf or None)
+
+    print_field_result(result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,55 @@
-from flask import Flask, render_template, request, jsonify
+import hmac
+import json
+import math
+import os
+
+from flask import Flask, Response, render_template, request, jsonify
+
+import instrumentation
+
+from crop_catalog import CatalogRecommendationEngine, CropCatalog
+from data_loader import CROP_COLUMNS, ENVIRONMENTAL_COLUMNS, EnvironmentalData
+from micro_batching import MicroBatcher
+from result_cache import CachedRecommendationEngine, ResultCache
 
 app = Flask(__name__)
 
+# Ürün kataloğu uygulama başlarken yüklenir; sonrasında /catalog uç noktalarıyla yeniden başlatmadan güncellenir
+CROPS_PATH = os.environ.get("CROPS_CSV", os.path.join(os.path.dirname(os.path.abspath(__file__)), "crops.csv"))
+MAX_BATCH_FIELDS = int(os.environ.get("MAX_BATCH_FIELDS", "10000"))
+# PROFILE_REQUESTS=1 iken ?profile=1 ile gönderilen tek bir istek cProfile altında çalıştırılır
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "").lower() in ("1", "true", "yes")
+
+# CATALOG_ADMIN_TOKEN ayarlı değilse katalog değiştiren uç noktalar kapalıdır
+CATALOG_ADMIN_TOKEN = os.environ.get("CATALOG_ADMIN_TOKEN")
+
+# CROP_INDEX=1 iken tekil tahminler katalog sürümleri arasında paylaşılan k-d ağacıyla yapılır.
+# SCORE_LUT bir dizin yolu ise tahmin tablosu oradan açılır (katalog değiştiyse yeniden oluşturulup kaydedilir);
+# katalog her güncellendiğinde tablo arka planda yeni sürüm için yeniden hazırlanır.
+catalog = CropCatalog.from_csv(CROPS_PATH, use_index=os.environ.get("CROP_INDEX", "").lower() in ("1", "true", "yes"),
+                               lut_path=os.environ.get("SCORE_LUT") or None)
+engine = CatalogRecommendationEngine(catalog)
+
+# RESULT_CACHE_SIZE ayarlanırsa yakın okumalar (alan başına yuvarlanmış) önbellekten yanıtlanır;
+# RESULT_CACHE_PRECISION ondalık basamak sayılarını JSON olarak verir, ör. {"temperature": 0}
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "0"))
+if RESULT_CACHE_SIZE > 0:
+    engine = CachedRecommendationEngine(
+        engine,
+        ResultCache(max_entries=RESULT_CACHE_SIZE, ttl=float(os.environ.get("RESULT_CACHE_TTL", "300"))),
+        precision=json.loads(os.environ.get("RESULT_CACHE_PRECISION", "{}")),
+    )
+
+# MICRO_BATCH_WINDOW_MS ayarlanırsa eşzamanlı /predict istekleri tek bir matris geçişinde skorlanır
+batcher = None
+if os.environ.get("MICRO_BATCH_WINDOW_MS"):
+    batcher = MicroBatcher(
+        engine,
+        max_batch_size=int(os.environ.get("MICRO_BATCH_MAX_SIZE", "64")),
+        max_wait=float(os.environ["MICRO_BATCH_WINDOW_MS"]) / 1000,
+    )
+    batcher.start_in_thread()
+
 # Örnek ürün listesi
 products = ["Buğday", "Mısır", "Pamuk", "Ayçiçeği"]
 
@@ -15,6 +63,67 @@ def get_recommendations(selected_product):
     }
     return recommendations.get(selected_product, "Bu ürün için öneri bulunamadı.")
 
+def run_request(stage, fn, *args):
+    """Time fn under stage; with ?profile=1 (and PROFILE_REQUESTS) also return its cProfile report."""
+    if PROFILE_REQUESTS and request.args.get("profile"):
+        with instrumentation.timer(stage):
+            return instrumentation.profile_call(fn, *args)
+    with instrumentation.timer(stage):
+        return fn(*args), None
+
+def parse_environment(readings):
+    """Build EnvironmentalData from a JSON object using English or Turkish sensor keys."""
+    if not isinstance(readings, dict):
+        raise ValueError("Sensör verisi bir JSON nesnesi olmalı.")
+    values = {}
+    for field, keys in ENVIRONMENTAL_COLUMNS.items():
+        key = next((key for key in (field,) + keys if key in readings), None)
+        if key is None:
+            raise ValueError(f"Eksik sensör değeri: {field}")
+        try:
+            values[field] = float(readings[key])
+        except (TypeError, ValueError):
+            raise ValueError(f"Geçersiz sensör değeri: {field}")
+        # float() "nan" ve "inf" metinlerini de kabul eder; bunlar skorları bozar ve geçerli JSON üretmez
+        if not math.isfinite(values[field]):
+            raise ValueError(f"Geçersiz sensör değeri: {field}")
+    return EnvironmentalData(**values)
+
+def parse_crop(data, partial=False):
+    """Crop fields from a JSON object using English or Turkish keys; partial allows missing values (updates)."""
+    if not isinstance(data, dict) or not isinstance(data.get("name"), str) or not data["name"]:
+        raise ValueError("Ürün bir JSON nesnesi olmalı ve 'name' alanı içermeli.")
+    values = {"name": data["name"]}
+    for field, keys in CROP_COLUMNS.items():
+        if field == "name":
+            continue
+        key = next((key for key in (field,) + keys if key in data), None)
+        if key is None:
+            if partial:
+                continue
+            raise ValueError(f"Eksik ürün değeri: {field}")
+        try:
+            values[field] = float(data[key])
+        except (TypeError, ValueError):
+            raise ValueError(f"Geçersiz ürün değeri: {field}")
+        if not math.isfinite(values[field]):
+            raise ValueError(f"Geçersiz ürün değeri: {field}")
+    return values
+
+def catalog_summary(snapshot):
+    return {"catalog_version": snapshot.version, "crops": len(snapshot), "delta": snapshot.delta_size,
+            "changes": snapshot.changes, "lut_active": snapshot.model.lut is not None}
+
+def catalog_admin_error():
+    """Error response unless the request carries the catalog admin token."""
+    if not CATALOG_ADMIN_TOKEN:
+        return jsonify({"error": "Katalog güncellemeleri kapalı (CATALOG_ADMIN_TOKEN ayarlanmamış)."}), 403
+    # Sabit süreli karşılaştırma, anahtarın yanıt süresinden tahmin edilmesini önler
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), CATALOG_ADMIN_TOKEN.encode("utf-8")):
+        return jsonify({"error": "Geçersiz yönetici anahtarı."}), 401
+    return None
+
 @app.route("/")
 def index():
     return render_template("index.html", products=products)
@@ -28,5 +137,107 @@ def recommend():
         return jsonify({"recommendation": recommendation})
     return jsonify({"error": "Ürün seçimi yapılmadı."}), 400
 
+@app.route("/predict", methods=["POST"])
+def predict():
+    """Recommendations for a single field's sensor readings."""
+    try:
+        env = parse_environment(request.get_json(silent=True))
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    if batcher is not None and not request.args.get("profile"):
+        with instrumentation.timer("http_predict"):
+            return jsonify(batcher.submit(env).result())
+    result, profile = run_request("http_predict", engine.generate_recommendations, env)
+    if profile is not None:
+        result = dict(result, profile=profile)
+    return jsonify(result)
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """
+    Recommendations for many fields in one request.
+
+    Accepts {"fields": [{"field_id": ..., <sensor readings>}, ...]} (or the bare
+    list) and scores every field in one vectorized call.
+    """
+    data = request.get_json(silent=True)
+    fields = data.get("fields") if isinstance(data, dict) else data
+    if not isinstance(fields, list) or not fields:
+        return jsonify({"error": "Tarla listesi boş veya geçersiz."}), 400
+    if len(fields) > MAX_BATCH_FIELDS:
+        return jsonify({"error": f"En fazla {MAX_BATCH_FIELDS} tarla gönderilebilir."}), 413
+
+    field_ids, envs = [], []
+    for position, field in enumerate(fields):
+        try:
+            envs.append(parse_environment(field))
+        except ValueError as exc:
+            return jsonify({"error": str(exc), "index": position}), 400
+        field_ids.append(field.get("field_id", position))
+
+    results, profile = run_request("http_predict_batch", engine.generate_recommendations_batch, envs)
+    response = {"results": [
+        dict(field_id=field_id, **recommendations) for field_id, recommendations in zip(field_ids, results)
+    ]}
+    if profile is not None:
+        response["profile"] = profile
+    return jsonify(response)
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus text exposition of the pipeline metrics (empty unless TARIM_METRICS is set)."""
+    return Response(instrumentation.prometheus_text(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/catalog")
+def catalog_info():
+    """Version and size of the crop catalog currently serving requests."""
+    return jsonify(catalog_summary(catalog.current))
+
+@app.route("/catalog/changes", methods=["POST"])
+def catalog_changes():
+    """
+    Apply {"add": [crop, ...], "update": [{"name": ..., <fields>}, ...], "remove": [name, ...]} as one new version.
+
+    Requests in flight finish on the version they started with.
+    """
+    error = catalog_admin_error()
+    if error is not None:
+        return error
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Değişiklikler bir JSON nesnesi olmalı."}), 400
+    try:
+        add = [parse_crop(crop) for crop in data.get("add", [])]
+        update = [parse_crop(crop, partial=True) for crop in data.get("update", [])]
+        remove = data.get("remove", [])
+        if not isinstance(remove, list) or not all(isinstance(name, str) for name in remove):
+            raise ValueError("'remove' ürün adlarından oluşan bir liste olmalı.")
+        snapshot = catalog.apply(add=add, update=update, remove=remove)
+    except KeyError as exc:
+        return jsonify({"error": f"Katalogda olmayan ürün: {exc.args[0]}"}), 404
+    except (TypeError, ValueError) as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(catalog_summary(snapshot))
+
+@app.route("/catalog/reload", methods=["POST"])
+def catalog_reload():
+    """Re-read CROPS_CSV and apply only what changed, without interrupting requests."""
+    error = catalog_admin_error()
+    if error is not None:
+        return error
+    try:
+        snapshot = catalog.reload(CROPS_PATH)
+    except (OSError, ValueError) as exc:
+        return jsonify({"error": f"Katalog yeniden yüklenemedi: {exc}"}), 500
+    return jsonify(catalog_summary(snapshot))
+
+@app.route("/cache/stats")
+def cache_stats():
+    """Hit, miss and eviction counts of the result cache."""
+    if not isinstance(engine, CachedRecommendationEngine):
+        return jsonify({"enabled": False})
+    stats = engine.stats()
+    return jsonify(dict(vars(stats), enabled=True, hit_rate=stats.hit_rate))
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
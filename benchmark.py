@@ -0,0 +1,455 @@
+"""
+Benchmark suite with seeded synthetic workloads.
+
+Every pipeline stage is timed separately on the same generated crop catalog
+and reading set and reported as JSON with throughput and peak traced memory.
+A run can be compared against a stored baseline to catch regressions.
+
+Each stage gets a warmup run and is then repeated until the timed runs add
+up to --min-time; throughput is computed from the fastest run, which is far
+less noisy than a single run of a stage that only takes milliseconds.
+Stages that look slower than the baseline are measured a second time and
+only reported if they are still outside the tolerance.
+
+Usage:
+    python benchmark.py --crops 10000 --readings 100000 --output sonuc.json
+    python benchmark.py --scale small --baseline sonuc.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import instrumentation
+import synthetic_data
+from prediction_model import CROP_FIELDS, ENV_FIELDS
+
+SCALES = {
+    'small': {'crops': 100, 'readings': 1000},
+    'medium': {'crops': 10_000, 'readings': 100_000},
+    'large': {'crops': 1_000_000, 'readings': 10_000_000},
+}
+
+# Crops and readings come from synthetic_data; these are the sensor values for analyze_sensor_data
+SENSOR_RANGES = {
+    'Temperature': (15, 35),
+    'Humidity': (40, 100),
+    'Soil_pH': (4, 9),
+    'Light': (200, 2000),
+}
+
+
+@dataclass
+class Workload:
+    crops: int
+    readings: int
+    seed: int
+    workdir: str
+    crop_columns: Dict[str, np.ndarray] = field(default_factory=dict)
+    reading_columns: Dict[str, np.ndarray] = field(default_factory=dict)
+    sensor_columns: Dict[str, np.ndarray] = field(default_factory=dict)
+    limits: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def crops_csv(self) -> str:
+        return os.path.join(self.workdir, 'crops.csv')
+
+    @property
+    def readings_csv(self) -> str:
+        return os.path.join(self.workdir, 'environmental_data.csv')
+
+    def crop_records(self):
+        from data_loader import CropData
+        columns = [self.crop_columns[name].tolist() for name in ('name',) + CROP_FIELDS]
+        return [CropData(*values) for values in zip(*columns)]
+
+    def env_records(self, count: int):
+        from data_loader import EnvironmentalData
+        columns = [self.reading_columns[name][:count].tolist() for name in ENV_FIELDS]
+        return [EnvironmentalData(*values) for values in zip(*columns)]
+
+
+@dataclass
+class StageResult:
+    name: str
+    items: int
+    seconds: float
+    throughput: float
+    peak_memory_bytes: Optional[int] = None
+    runs: int = 1
+    median_seconds: Optional[float] = None
+
+
+def generate_workload(crops: int, readings: int, seed: int, workdir: str) -> Workload:
+    """Seeded synthetic catalog and readings, also written as CSV for the loading stages."""
+    workload = Workload(crops, readings, seed, workdir)
+    workload.crop_columns = synthetic_data.generate('crops', crops, seed)
+    workload.reading_columns = synthetic_data.generate('environmental', readings, seed)
+    rng = np.random.default_rng(seed)
+    for name, (low, high) in SENSOR_RANGES.items():
+        workload.sensor_columns[name] = rng.uniform(low, high, readings)
+
+    # Same seed and shard size as generate(), so the files hold exactly the arrays above
+    synthetic_data.write_dataset(workload.crops_csv, 'crops', crops, seed)
+    synthetic_data.write_dataset(workload.readings_csv, 'environmental', readings, seed)
+    return workload
+
+
+STAGES: Dict[str, Callable[[Workload], int]] = {}
+STAGE_SETUP: Dict[str, Callable[[Workload], None]] = {}
+
+
+def stage(name: str, setup: Optional[Callable[[Workload], None]] = None):
+    """
+    Register a stage; the function returns how many items it processed.
+
+    setup, if given, prepares what the stage needs and runs once, untimed, before it.
+    """
+    def register(fn):
+        STAGES[name] = fn
+        if setup is not None:
+            STAGE_SETUP[name] = setup
+        return fn
+    return register
+
+
+def _pairs_limited(workload: Workload, key: str) -> int:
+    """Number of readings a stage may use so that readings x crops stays within its pair budget."""
+    return max(1, min(workload.readings, workload.limits[key] // max(1, workload.crops)))
+
+
+@stage('load_crops_csv')
+def _load_crops_csv(workload):
+    from data_loader import load_crop_data
+    return len(load_crop_data(workload.crops_csv, use_cache=False))
+
+
+@stage('load_readings_csv_chunks')
+def _load_readings_csv_chunks(workload):
+    from data_loader import iter_environmental_chunks
+    return sum(len(chunk['temperature']) for chunk in iter_environmental_chunks(workload.readings_csv, use_cache=False))
+
+
+@stage('cache_build')
+def _cache_build(workload):
+    from dataset_cache import build_cache
+    build_cache(workload.crops_csv, force=True)
+    build_cache(workload.readings_csv, force=True)
+    return workload.crops + workload.readings
+
+
+def _ensure_readings_cache(workload):
+    from dataset_cache import build_cache
+    build_cache(workload.readings_csv)
+
+
+@stage('load_readings_cached_chunks', setup=_ensure_readings_cache)
+def _load_readings_cached(workload):
+    from data_loader import iter_environmental_chunks
+    from dataset_cache import is_cache_valid
+    if not is_cache_valid(workload.readings_csv):
+        # The loader would silently parse the CSV instead, and the stage would time the wrong path
+        raise RuntimeError(f"no valid dataset cache for {workload.readings_csv}")
+    items = 0
+    for chunk in iter_environmental_chunks(workload.readings_csv):
+        # Touch the values so memory-mapped pages are actually read
+        chunk['temperature'].sum()
+        items += len(chunk['temperature'])
+    return items
+
+
+@stage('load_readings_table')
+def _load_readings_table(workload):
+    from data_loader import load_environmental_table
+    return len(load_environmental_table(workload.readings_csv, use_cache=False))
+
+
+@stage('calculate_crop_score')
+def _calculate_crop_score(workload):
+    from prediction_model import CropPredictionModel
+    crops = workload.crop_records()
+    model = CropPredictionModel(crops)
+    envs = workload.env_records(_pairs_limited(workload, 'scalar_pairs'))
+    for env in envs:
+        for crop in crops:
+            model.calculate_crop_score(env, crop)
+    return len(envs) * len(crops)
+
+
+@stage('predict_best_crops')
+def _predict_best_crops(workload):
+    from prediction_model import CropPredictionModel
+    model = CropPredictionModel(workload.crop_records())
+    envs = workload.env_records(_pairs_limited(workload, 'scalar_pairs'))
+    for env in envs:
+        model.predict_best_crops(env)
+    return len(envs)
+
+
+@stage('predict_best_crops_batch')
+def _predict_best_crops_batch(workload):
+    from prediction_model import CropPredictionModel
+    model = CropPredictionModel(workload.crop_records())
+    envs = workload.env_records(_pairs_limited(workload, 'batch_pairs'))
+    return len(model.predict_best_crops_batch(envs))
+
+
+@stage('predict_best_crops_table')
+def _predict_best_crops_table(workload):
+    from data_loader import load_crop_table, load_environmental_table
+    from prediction_model import CropPredictionModel
+    model = CropPredictionModel(load_crop_table(workload.crops_csv))
+    envs = load_environmental_table(workload.readings_csv)[:_pairs_limited(workload, 'batch_pairs')]
+    return len(model.predict_best_crops_batch(envs))
+
+
+@stage('predict_best_crops_index')
+def _predict_best_crops_index(workload):
+    from prediction_model import CropPredictionModel
+    model = CropPredictionModel(workload.crop_records())
+    model.build_index()
+    envs = workload.env_records(min(workload.readings, workload.limits['index_queries']))
+    for env in envs:
+        model.predict_best_crops(env)
+    return len(envs)
+
+
+@stage('generate_recommendations')
+def _generate_recommendations(workload):
+    from prediction_model import CropPredictionModel
+    from recommendation_engine import RecommendationEngine
+    engine = RecommendationEngine(CropPredictionModel(workload.crop_records()))
+    envs = workload.env_records(_pairs_limited(workload, 'scalar_pairs'))
+    for env in envs:
+        engine.generate_recommendations(env)
+    return len(envs)
+
+
+@stage('generate_recommendations_batch')
+def _generate_recommendations_batch(workload):
+    from prediction_model import CropPredictionModel
+    from recommendation_engine import RecommendationEngine
+    engine = RecommendationEngine(CropPredictionModel(workload.crop_records()))
+    envs = workload.env_records(_pairs_limited(workload, 'batch_pairs'))
+    return len(engine.generate_recommendations_batch(envs))
+
+
+@stage('analyze_sensor_data')
+def _analyze_sensor_data(workload):
+    from ana import SensorRangeTable, analyze_sensor_data
+    table = SensorRangeTable.from_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crop_conditions.csv'))
+    count = min(workload.readings, workload.limits['scalar_sensor_rows'])
+    columns = {param: values[:count].tolist() for param, values in workload.sensor_columns.items()}
+    for i in range(count):
+        analyze_sensor_data({param: values[i] for param, values in columns.items()}, table, 'Domates')
+    return count
+
+
+@stage('evaluate_sensor_series')
+def _evaluate_sensor_series(workload):
+    from ana import SensorRangeTable, evaluate_sensor_series
+    table = SensorRangeTable.from_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crop_conditions.csv'))
+    evaluate_sensor_series(workload.sensor_columns, table, 'Domates')
+    return workload.readings
+
+
+@stage('pdf_reports')
+def _pdf_reports(workload):
+    from pdf_generator import render_report
+    from prediction_model import CropPredictionModel
+    model = CropPredictionModel(workload.crop_records())
+    count = min(workload.readings, workload.limits['pdf_reports'])
+    for i, env in enumerate(workload.env_records(count)):
+        sensor_data = {param: float(values[i]) for param, values in workload.sensor_columns.items()}
+        render_report(os.path.join(workload.workdir, f"rapor_{i}.pdf"), model.predict_best_crops(env),
+                      sensor_data, ["Uyari"], ["Oneri"])
+    return count
+
+
+@stage('pdf_streaming_rows')
+def _pdf_streaming_rows(workload):
+    from pdf_generator import StreamingPDFReport
+    count = min(workload.readings, workload.limits['pdf_rows'])
+    report = StreamingPDFReport(os.path.join(workload.workdir, 'sensor_gecmisi.pdf'), pages_per_volume=500)
+    columns = [workload.sensor_columns[param][:count] for param in SENSOR_RANGES]
+    report.add_sensor_rows(list(SENSOR_RANGES), zip(*(column.tolist() for column in columns)))
+    report.generate()
+    return count
+
+
+def _untimed(fn: Callable[[Workload], int], workload: Workload) -> int:
+    """Run fn with instrumentation paused, so the metrics dump only covers timed runs."""
+    metrics_enabled = instrumentation.is_enabled()
+    instrumentation.disable()
+    try:
+        return fn(workload)
+    finally:
+        if metrics_enabled:
+            instrumentation.enable()
+
+
+def _traced_peak(fn: Callable[[Workload], int], workload: Workload) -> int:
+    tracemalloc.start()
+    try:
+        fn(workload)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_stage(name: str, workload: Workload, measure_memory: bool, min_time: float = 1.0,
+              warmup: int = 1) -> StageResult:
+    """
+    Time one stage: warmup untimed runs, then timed runs until they add up to min_time.
+
+    seconds and throughput come from the fastest timed run.
+    """
+    fn = STAGES[name]
+    if name in STAGE_SETUP:
+        _untimed(STAGE_SETUP[name], workload)
+    for _ in range(warmup):
+        _untimed(fn, workload)
+    times = []
+    while not times or sum(times) < min_time:
+        start = time.perf_counter()
+        items = fn(workload)
+        times.append(time.perf_counter() - start)
+    seconds = min(times)
+    peak = None
+    if measure_memory:
+        # Separate pass under tracemalloc so tracing overhead does not distort the timing
+        peak = _untimed(lambda workload: _traced_peak(fn, workload), workload)
+    return StageResult(name, items, seconds, items / seconds if seconds > 0 else float('inf'), peak,
+                       runs=len(times), median_seconds=float(np.median(times)))
+
+
+def _best_of(first: StageResult, second: StageResult) -> StageResult:
+    """Combine two measurements of one stage, keeping the faster time and the lower memory peak."""
+    best = first if first.seconds <= second.seconds else second
+    peaks = [peak for peak in (first.peak_memory_bytes, second.peak_memory_bytes) if peak is not None]
+    return StageResult(best.name, best.items, best.seconds, best.throughput, min(peaks) if peaks else None,
+                       runs=first.runs + second.runs, median_seconds=best.median_seconds)
+
+
+def compare_with_baseline(results: List[StageResult], baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Describe every stage that got slower or used more memory than the baseline allows.
+
+    Both runs' throughputs are best-of-N, so tolerance only has to absorb
+    machine noise, not the scatter of single runs.
+    """
+    previous = {stage_result['name']: stage_result for stage_result in baseline.get('stages', [])}
+    regressions = []
+    for result in results:
+        old = previous.get(result.name)
+        if old is None:
+            continue
+        if result.throughput < old['throughput'] * (1 - tolerance):
+            regressions.append(f"{result.name}: throughput {result.throughput:.1f}/s < baseline {old['throughput']:.1f}/s")
+        if result.peak_memory_bytes and old.get('peak_memory_bytes') and \
+                result.peak_memory_bytes > old['peak_memory_bytes'] * (1 + tolerance):
+            regressions.append(f"{result.name}: peak memory {result.peak_memory_bytes} B > baseline {old['peak_memory_bytes']} B")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the crop recommendation pipeline on synthetic data.")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--crops', type=int, help="catalog size (overrides --scale)")
+    parser.add_argument('--readings', type=int, help="number of readings (overrides --scale)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stages', nargs='+', choices=sorted(STAGES), help="only run these stages")
+    parser.add_argument('--no-memory', action='store_true', help="skip the peak memory pass")
+    parser.add_argument('--min-time', type=float, default=1.0, help="repeat each stage for at least this many seconds")
+    parser.add_argument('--warmup', type=int, default=1, help="untimed runs before timing each stage")
+    parser.add_argument('--scalar-pairs', type=int, default=2_000_000, help="env x crop pairs for pure-Python stages")
+    parser.add_argument('--batch-pairs', type=int, default=200_000_000, help="env x crop pairs for vectorized stages")
+    parser.add_argument('--index-queries', type=int, default=1000)
+    parser.add_argument('--scalar-sensor-rows', type=int, default=100_000)
+    parser.add_argument('--pdf-reports', type=int, default=20)
+    parser.add_argument('--pdf-rows', type=int, default=20_000)
+    parser.add_argument('--output', help="write results as JSON to this file (default: stdout)")
+    parser.add_argument('--baseline', help="JSON results of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative slowdown / memory growth")
+    parser.add_argument('--metrics', help="enable instrumentation and write its JSON dump to this file")
+    parser.add_argument('--keep-data', action='store_true', help="keep the generated working directory")
+    args = parser.parse_args(argv)
+
+    crops = args.crops or SCALES[args.scale]['crops']
+    readings = args.readings or SCALES[args.scale]['readings']
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    if args.metrics:
+        instrumentation.enable()
+    workdir = tempfile.mkdtemp(prefix='tarim_bench_')
+    try:
+        workload = generate_workload(crops, readings, args.seed, workdir)
+        workload.limits = {
+            'scalar_pairs': args.scalar_pairs,
+            'batch_pairs': args.batch_pairs,
+            'index_queries': args.index_queries,
+            'scalar_sensor_rows': args.scalar_sensor_rows,
+            'pdf_reports': args.pdf_reports,
+            'pdf_rows': args.pdf_rows,
+        }
+
+        def measure(name):
+            result = run_stage(name, workload, measure_memory=not args.no_memory, min_time=args.min_time,
+                               warmup=args.warmup)
+            print(f"{name}: {result.items} oge, en iyi {result.seconds:.4f} sn ({result.runs} tekrar), "
+                  f"{result.throughput:,.0f}/sn", file=sys.stderr)
+            return result
+
+        results = [measure(name) for name in args.stages or list(STAGES)]
+        regressions = []
+        if baseline is not None:
+            regressions = compare_with_baseline(results, baseline, args.tolerance)
+            # A stage may only have hit a busy moment on the machine; measure flagged stages once more
+            flagged = {regression.split(':', 1)[0] for regression in regressions}
+            if flagged:
+                print(f"Yeniden olculuyor: {', '.join(sorted(flagged))}", file=sys.stderr)
+                results = [_best_of(result, measure(result.name)) if result.name in flagged else result
+                           for result in results]
+                regressions = compare_with_baseline(results, baseline, args.tolerance)
+    finally:
+        if args.keep_data:
+            print(f"Veriler: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'crops': crops,
+        'readings': readings,
+        'seed': args.seed,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'stages': [asdict(result) for result in results],
+    }
+    if args.metrics:
+        instrumentation.dump_json(args.metrics)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    for regression in regressions:
+        print(f"GERILEME {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
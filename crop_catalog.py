@@ -0,0 +1,542 @@
+"""
+Versioned crop catalog with incremental updates and atomic swaps.
+
+A CropCatalog publishes immutable CatalogSnapshots. Each snapshot is a
+shared base segment (names, (C, 5) matrix and, optionally, a CropIndex)
+plus a small delta on top of it:
+
+- updated base crops, scored in place of their base row;
+- crops added since the base, appended after it in insertion order;
+- removed crops, whose slots are masked out.
+
+Applying a change set copies only the delta, so its cost is proportional
+to the delta rather than the catalog; the base arrays and index are
+reused as they are. Once the delta outgrows `compact_ratio` of the base,
+the catalog folds it into a new base (one index build), keeping the
+version number since the contents do not change.
+
+Readers take `catalog.current` once per request and use that snapshot's
+model and engine throughout, so a concurrent update never mixes two
+versions inside one response. Writers are serialized.
+
+With use_lut the catalog keeps a score_lut.ScoreLUT for predict_best_crops.
+A table covers one exact catalog and cannot be patched, so every new
+version gets a fresh table. A background thread builds it, or loads it
+from lut_path when its fingerprint matches. Until the table is ready,
+queries are scored exactly and counted as `score_lut_inactive`.
+Compaction keeps the table, since the crops do not change.
+
+Catalog order, which breaks ties between equal scores, is base order
+followed by additions in insertion order; a crop keeps its position when
+it is updated. Results of a snapshot are identical to a CropPredictionModel
+built from the same crops in that order.
+"""
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from data_loader import CropData, EnvironmentalData
+from instrumentation import count, timed, timer
+from prediction_model import CROP_FIELDS, MAX_SCORE_BLOCK_BYTES, CropPredictionModel, env_matrix, score_matrix, \
+    top_n_indices
+from recommendation_engine import RecommendationEngine
+from tables import CropTable
+
+DEFAULT_WEIGHTS = {
+    'temperature': 0.25,
+    'humidity': 0.2,
+    'water': 0.2,
+    'ph': 0.2,
+    'pest': 0.15
+}
+
+
+class _Segment:
+    """Immutable base of one or more snapshots."""
+
+    def __init__(self, table: CropTable, weights: Dict[str, float], use_index: bool, leaf_size: int):
+        self.names = table.names
+        self.matrix = np.ascontiguousarray(table.matrix())
+        self.matrix.setflags(write=False)
+        self.positions = {name: slot for slot, name in enumerate(self.names.tolist())}
+        if len(self.positions) != len(self.names):
+            raise ValueError("crop names must be unique within a catalog")
+        self.index = None
+        if use_index and len(self.names):
+            from crop_index import CropIndex
+            self.index = CropIndex(self.matrix, weights, leaf_size=leaf_size)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+class CatalogSnapshot:
+    """One immutable catalog version: a base segment plus a delta."""
+
+    def __init__(self, version: int, weights: Dict[str, float], base: _Segment,
+                 overrides: Dict[int, np.ndarray], extra_names: List[str], extra_rows: List[np.ndarray],
+                 dead: frozenset, touched: Dict[str, Optional[int]], changes: Optional[Dict[str, int]] = None):
+        self.version = version
+        self.weights = dict(weights)
+        self.base = base
+        self.overrides = overrides  # base slot -> updated (5,) row
+        self.extra_names = extra_names  # crops added since the base, slots len(base)...
+        self.extra_rows = extra_rows
+        self.dead = dead  # removed slots, base or extra
+        self.touched = touched  # name -> slot for names changed since the base, None once removed
+        self.changes = changes or {'added': 0, 'updated': 0, 'removed': 0}
+
+        self.slots = len(base) + len(extra_names)
+        self._extra_names = np.array(extra_names, dtype=object)
+        self._extra_matrix = np.array(extra_rows, dtype=np.float64).reshape(-1, len(CROP_FIELDS))
+        self._override_slots = np.array(sorted(overrides), dtype=np.intp)
+        self._override_matrix = np.array([overrides[slot] for slot in self._override_slots.tolist()],
+                                         dtype=np.float64).reshape(-1, len(CROP_FIELDS))
+        self._dead_slots = np.array(sorted(dead), dtype=np.intp)
+        # Base slots whose base row must not be used, and the rows scored on top of the base instead
+        self._excluded_base = np.union1d(self._override_slots, self._dead_slots[self._dead_slots < len(base)])
+        extra_alive = np.array([slot for slot in range(len(base), self.slots) if slot not in dead], dtype=np.intp)
+        self._delta_slots = np.concatenate((self._override_slots, extra_alive))
+        self._delta_matrix = np.concatenate((self._override_matrix, self._extra_matrix[extra_alive - len(base)]))
+        self._table: Optional[CropTable] = None
+        self._name_order: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self.expects_lut = False  # set by a CropCatalog with use_lut until the table is attached
+
+        self.model = CatalogModel(self)
+        self.engine = RecommendationEngine(self.model)
+
+    def __len__(self) -> int:
+        return self.slots - len(self.dead)
+
+    def __repr__(self) -> str:
+        return f"CatalogSnapshot(version={self.version}, crops={len(self)}, delta={self.delta_size})"
+
+    @property
+    def delta_size(self) -> int:
+        return len(self.overrides) + len(self.extra_names) + len(self.dead)
+
+    def slot_of(self, name: str) -> Optional[int]:
+        if name in self.touched:
+            return self.touched[name]
+        return self.base.positions.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return self.slot_of(name) is not None
+
+    def row(self, slot: int) -> np.ndarray:
+        """Current (5,) values of a slot."""
+        if slot >= len(self.base):
+            return self.extra_rows[slot - len(self.base)]
+        return self.overrides.get(slot, self.base.matrix[slot])
+
+    def get(self, name: str) -> Optional[CropData]:
+        slot = self.slot_of(name)
+        if slot is None:
+            return None
+        return CropData(name, *self.row(slot).tolist())
+
+    def table(self) -> CropTable:
+        """The catalog as a dense CropTable in catalog order, built once per snapshot."""
+        if self._table is None:
+            base = len(self.base)
+            alive = np.ones(base, dtype=bool)
+            alive[self._dead_slots[self._dead_slots < base]] = False
+            matrix = self.base.matrix.copy()
+            matrix[self._override_slots] = self._override_matrix
+            extra_alive = np.array([slot not in self.dead for slot in range(base, self.slots)], dtype=bool)
+            names = np.concatenate((self.base.names[alive], self._extra_names[extra_alive]))
+            matrix = np.concatenate((matrix[alive], self._extra_matrix[extra_alive]))
+            columns = {field: matrix[:, k] for k, field in enumerate(CROP_FIELDS)}
+            self._table = CropTable(dict(columns, name=names))
+        return self._table
+
+    def positions_of(self, names: np.ndarray) -> np.ndarray:
+        """Row of each name in table(), or -1 where the name is not in the catalog."""
+        table_names = self.table().names
+        names = np.asarray(names, dtype=object)
+        if len(names) == len(table_names) and bool((names == table_names).all()):
+            return np.arange(len(names))
+        if not len(table_names):
+            return np.full(len(names), -1)
+        if self._name_order is None:
+            keys = table_names.astype(str)
+            order = np.argsort(keys, kind='stable')
+            self._name_order = (keys[order], order)
+        keys, order = self._name_order
+        wanted = names.astype(str)
+        at = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        return np.where(keys[at] == wanted, order[at], -1)
+
+    def __iter__(self):
+        return iter(self.table())
+
+    def __getitem__(self, index):
+        return self.table()[index]
+
+    def score_block(self, envs: np.ndarray, weights: Dict[str, float]) -> np.ndarray:
+        """(E, slots) scores in slot order; removed slots score -inf."""
+        scores = score_matrix(envs, self.base.matrix, weights)
+        if len(self._override_slots):
+            scores[:, self._override_slots] = score_matrix(envs, self._override_matrix, weights)
+        if len(self._extra_matrix):
+            scores = np.concatenate((scores, score_matrix(envs, self._extra_matrix, weights)), axis=1)
+        if len(self._dead_slots):
+            scores[:, self._dead_slots] = -np.inf
+        return scores
+
+    def names_at(self, slots: np.ndarray) -> np.ndarray:
+        names = np.empty(slots.shape, dtype=object)
+        in_base = slots < len(self.base)
+        names[in_base] = self.base.names[slots[in_base]]
+        names[~in_base] = self._extra_names[slots[~in_base] - len(self.base)]
+        return names
+
+    def best_block(self, envs: np.ndarray, top_n: int, weights: Dict[str, float]) -> List[List[Tuple[str, float]]]:
+        """Top-N (name, score) lists for every row of an (E, 6) env matrix."""
+        scores = self.score_block(envs, weights)
+        best = top_n_indices(scores, min(top_n, len(self)))
+        top_scores = np.take_along_axis(scores, best, axis=1).tolist()
+        return [list(zip(names, row)) for names, row in zip(self.names_at(best).tolist(), top_scores)]
+
+    def best_one(self, env: np.ndarray, top_n: int, weights: Dict[str, float]) -> List[Tuple[str, float]]:
+        """Top-N for one env row, through the base index when it was built for these weights."""
+        index = self.base.index
+        if index is None or index.weights != weights:
+            return self.best_block(env[None, :], top_n, weights)[0]
+        # Asking for len(excluded) more keeps top_n usable base crops after dropping the excluded ones
+        slots, scores = index.query(env, top_n + len(self._excluded_base))
+        if len(self._excluded_base):
+            keep = ~np.isin(slots, self._excluded_base)
+            slots, scores = slots[keep][:top_n], scores[keep][:top_n]
+        if len(self._delta_slots):
+            slots = np.concatenate((slots, self._delta_slots))
+            scores = np.concatenate((scores, score_matrix(env[None, :], self._delta_matrix, weights)[0]))
+            order = np.lexsort((slots, -scores))[:top_n]
+            slots, scores = slots[order], scores[order]
+        return list(zip(self.names_at(slots).tolist(), scores.tolist()))
+
+
+class CatalogModel(CropPredictionModel):
+    """CropPredictionModel scoring a CatalogSnapshot without materializing it."""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        super().__init__(snapshot)
+        self.snapshot = snapshot
+        self.weights = dict(snapshot.weights)
+
+    @property
+    def catalog_version(self) -> int:
+        return self.snapshot.version
+
+    @property
+    def crop_matrix(self) -> np.ndarray:
+        if self._crop_matrix is None:
+            self._crop_matrix = self.snapshot.table().matrix()
+        return self._crop_matrix
+
+    def predict_best_crops(self, env: EnvironmentalData, top_n: int = 3) -> List[Tuple[str, float]]:
+        if self.index is not None:
+            # Built for this snapshot's dense table by build_index
+            return super().predict_best_crops(env, top_n)
+        with timer('predict_best_crops'):
+            if self.lut is not None:
+                best = self._predict_from_lut(env, top_n)
+                if best is not None:
+                    return best
+            elif self.snapshot.expects_lut:
+                count('score_lut_inactive')
+            return self.snapshot.best_one(env_matrix([env])[0], top_n, self.weights)
+
+    def batch_chunk_size(self) -> int:
+        return max(1, MAX_SCORE_BLOCK_BYTES // (8 * max(1, self.snapshot.slots)))
+
+    @timed('score_block')
+    def _predict_block(self, envs: np.ndarray, top_n: int) -> List[List[Tuple[str, float]]]:
+        count('scored_pairs', len(envs) * self.snapshot.slots)
+        return self.snapshot.best_block(envs, top_n, self.weights)
+
+
+def _file_digest(filepath: str) -> Optional[str]:
+    """SHA-256 of a crop file; None for columnar directories."""
+    if os.path.isdir(filepath):
+        return None
+    from dataset_cache import file_sha256
+    return file_sha256(filepath)
+
+
+def _crop_fields(item: Union[CropData, Mapping[str, Any]]) -> Dict[str, Any]:
+    if isinstance(item, Mapping):
+        return dict(item)
+    return {'name': item.name, **{field: getattr(item, field) for field in CROP_FIELDS}}
+
+
+class CropCatalog:
+    def __init__(self, crops: Union[Sequence[CropData], CropTable], weights: Optional[Dict[str, float]] = None,
+                 use_index: bool = False, leaf_size: int = 256, compact_ratio: float = 0.05, min_delta: int = 64,
+                 use_lut: bool = False, lut_path: Optional[str] = None, lut_grid=None):
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self.use_index = use_index
+        self.leaf_size = leaf_size
+        self.compact_ratio = compact_ratio
+        self.min_delta = min_delta
+        self.use_lut = use_lut or lut_path is not None
+        self.lut_path = lut_path
+        self.lut_grid = lut_grid
+        self.compactions = 0
+        self._lock = threading.RLock()
+        self._lut_lock = threading.Lock()
+        self._lut_builder: Optional[threading.Thread] = None
+        self._source: Optional[Tuple[str, str, int]] = None  # (path, sha256, version) of the last file load
+        table = crops if isinstance(crops, CropTable) else CropTable.from_records(crops)
+        self._current = self._snapshot(1, self._segment(table))
+        if self.use_lut:
+            # The first table is built (or loaded) before serving, as CropPredictionModel.build_lut does
+            self._attach_lut(self._current)
+
+    @classmethod
+    def from_csv(cls, filepath: str, use_cache: bool = True, **options) -> 'CropCatalog':
+        from data_loader import load_crop_table
+        digest = _file_digest(filepath)
+        catalog = cls(load_crop_table(filepath, use_cache=use_cache), **options)
+        if digest is not None:
+            catalog._source = (os.path.abspath(filepath), digest, catalog.version)
+        return catalog
+
+    @property
+    def current(self) -> CatalogSnapshot:
+        """The published snapshot; take it once per request."""
+        return self._current
+
+    @property
+    def version(self) -> int:
+        return self._current.version
+
+    def _segment(self, table: CropTable) -> _Segment:
+        return _Segment(table, self.weights, self.use_index, self.leaf_size)
+
+    def _snapshot(self, version: int, base: _Segment, **delta) -> CatalogSnapshot:
+        delta.setdefault('overrides', {})
+        delta.setdefault('extra_names', [])
+        delta.setdefault('extra_rows', [])
+        delta.setdefault('dead', frozenset())
+        delta.setdefault('touched', {})
+        snapshot = CatalogSnapshot(version, self.weights, base, **delta)
+        snapshot.expects_lut = self.use_lut
+        return snapshot
+
+    def _publish(self, snapshot: CatalogSnapshot):
+        self._current = snapshot
+        if self.use_lut and snapshot.model.lut is None:
+            self._start_lut_builder()
+
+    def _attach_lut(self, snapshot: CatalogSnapshot):
+        snapshot.model.build_lut(self.lut_path, grid=self.lut_grid)
+        snapshot.expects_lut = False
+        count('score_lut_builds')
+
+    def _start_lut_builder(self):
+        with self._lut_lock:
+            if self._lut_builder is not None:
+                return  # the running builder moves on to the newest snapshot when it finishes
+            self._lut_builder = threading.Thread(target=self._build_luts, name='score-lut', daemon=True)
+            self._lut_builder.start()
+
+    def _build_luts(self):
+        try:
+            while True:
+                snapshot = self._current
+                if snapshot.model.lut is None:
+                    self._attach_lut(snapshot)
+                with self._lut_lock:
+                    if self._current is snapshot:
+                        self._lut_builder = None
+                        return
+        except Exception:
+            with self._lut_lock:
+                self._lut_builder = None
+            count('score_lut_build_failures')
+            raise
+
+    def wait_for_lut(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a background table build; True once the current snapshot has its table."""
+        builder = self._lut_builder
+        if builder is not None:
+            builder.join(timeout)
+        return self._current.model.lut is not None
+
+    @timed('catalog_apply')
+    def apply(self, add: Iterable[Union[CropData, Mapping]] = (), update: Iterable[Union[CropData, Mapping]] = (),
+              remove: Iterable[str] = ()) -> CatalogSnapshot:
+        """
+        Publish one new version with crops removed, updated and added, in that order.
+
+        update items are CropData or mappings with 'name' and the fields to
+        change; other fields keep their value. The change set is applied as a
+        whole or not at all: an unknown name (KeyError) or an added name that
+        already exists (ValueError) leaves the catalog unchanged.
+        """
+        with self._lock:
+            current = self._current
+            base = current.base
+            overrides = dict(current.overrides)
+            extra_names = list(current.extra_names)
+            extra_rows = list(current.extra_rows)
+            dead = set(current.dead)
+            touched = dict(current.touched)
+            changes = {'added': 0, 'updated': 0, 'removed': 0}
+
+            def slot_of(name):
+                return touched[name] if name in touched else base.positions.get(name)
+
+            for name in remove:
+                slot = slot_of(name)
+                if slot is None:
+                    raise KeyError(name)
+                dead.add(slot)
+                overrides.pop(slot, None)
+                touched[name] = None
+                changes['removed'] += 1
+
+            for item in update:
+                fields = _crop_fields(item)
+                name = fields.pop('name')
+                slot = slot_of(name)
+                if slot is None:
+                    raise KeyError(name)
+                unknown = set(fields) - set(CROP_FIELDS)
+                if unknown:
+                    raise ValueError(f"unknown crop fields: {sorted(unknown)}")
+                current_row = extra_rows[slot - len(base)] if slot >= len(base) else overrides.get(slot, base.matrix[slot])
+                row = np.array([float(fields.get(field, value)) for field, value in zip(CROP_FIELDS, current_row.tolist())])
+                if slot >= len(base):
+                    extra_rows[slot - len(base)] = row
+                else:
+                    overrides[slot] = row
+                changes['updated'] += 1
+
+            for item in add:
+                fields = _crop_fields(item)
+                name = fields['name']
+                if slot_of(name) is not None:
+                    raise ValueError(f"crop {name!r} is already in the catalog")
+                missing = [field for field in CROP_FIELDS if field not in fields]
+                if missing:
+                    raise ValueError(f"crop {name!r} is missing {missing}")
+                touched[name] = len(base) + len(extra_names)
+                extra_names.append(name)
+                extra_rows.append(np.array([float(fields[field]) for field in CROP_FIELDS]))
+                changes['added'] += 1
+
+            if not any(changes.values()):
+                return current
+            snapshot = self._snapshot(current.version + 1, base, overrides=overrides, extra_names=extra_names,
+                                      extra_rows=extra_rows, dead=frozenset(dead), touched=touched, changes=changes)
+            if snapshot.delta_size > max(self.min_delta, self.compact_ratio * len(base)):
+                snapshot = self._compacted(snapshot)
+            self._publish(snapshot)
+            return snapshot
+
+    def add(self, crop: Union[CropData, Mapping]) -> CatalogSnapshot:
+        return self.apply(add=[crop])
+
+    def update(self, name: str, **fields) -> CatalogSnapshot:
+        return self.apply(update=[dict(fields, name=name)])
+
+    def remove(self, name: str) -> CatalogSnapshot:
+        return self.apply(remove=[name])
+
+    def _compacted(self, snapshot: CatalogSnapshot) -> CatalogSnapshot:
+        self.compactions += 1
+        compacted = self._snapshot(snapshot.version, self._segment(snapshot.table()), changes=snapshot.changes)
+        if snapshot.model.lut is not None:
+            # Same crops in the same order, so the table still applies
+            compacted.model.lut = snapshot.model.lut
+            compacted.expects_lut = False
+        return compacted
+
+    def compact(self) -> CatalogSnapshot:
+        """Fold the delta into a new base; the version and every result stay the same."""
+        with self._lock:
+            if self._current.delta_size:
+                self._publish(self._compacted(self._current))
+            return self._current
+
+    @timed('catalog_replace')
+    def replace(self, crops: Union[Sequence[CropData], CropTable]) -> CatalogSnapshot:
+        """
+        Make the catalog equal to crops, applying only the differences.
+
+        Crops that are new to the catalog are appended in the order given.
+        Finding the differences is a few array operations over the catalog;
+        only the changed crops are turned into change items.
+        """
+        table = crops if isinstance(crops, CropTable) else CropTable.from_records(crops)
+        rows = table.matrix()
+        with self._lock:
+            current = self._current
+            positions = current.positions_of(table.names)
+            found = positions >= 0
+            changed = np.zeros(len(rows), dtype=bool)
+            changed[found] = (rows[found] != current.model.crop_matrix[positions[found]]).any(axis=1)
+            present = np.zeros(len(current), dtype=bool)
+            present[positions[found]] = True
+
+            def items(mask):
+                return [{'name': name, **dict(zip(CROP_FIELDS, row))}
+                        for name, row in zip(table.names[mask].tolist(), rows[mask].tolist())]
+
+            remove = current.table().names[~present].tolist()
+            return self.apply(add=items(~found), update=items(changed), remove=remove)
+
+    @timed('catalog_reload')
+    def reload(self, filepath: str, use_cache: bool = True) -> CatalogSnapshot:
+        """
+        Re-read a crop CSV (or columnar directory) and apply what changed.
+
+        A file whose SHA-256 matches the one the current version was loaded
+        from is not parsed again.
+        """
+        from data_loader import load_crop_table
+        path, digest = os.path.abspath(filepath), _file_digest(filepath)
+        with self._lock:
+            if digest is not None and self._source == (path, digest, self.version):
+                return self._current
+            snapshot = self.replace(load_crop_table(filepath, use_cache=use_cache))
+            if digest is not None:
+                self._source = (path, digest, snapshot.version)
+            return snapshot
+
+
+class CatalogRecommendationEngine:
+    """
+    RecommendationEngine over the current version of a CropCatalog.
+
+    Every call uses one snapshot throughout and adds its version to each
+    result as 'catalog_version'.
+    """
+
+    def __init__(self, catalog: CropCatalog):
+        self.catalog = catalog
+
+    @property
+    def catalog_version(self) -> int:
+        return self.catalog.version
+
+    @property
+    def model(self) -> CatalogModel:
+        return self.catalog.current.model
+
+    def generate_recommendations(self, env: EnvironmentalData) -> Dict:
+        snapshot = self.catalog.current
+        result = snapshot.engine.generate_recommendations(env)
+        result['catalog_version'] = snapshot.version
+        return result
+
+    def generate_recommendations_batch(self, envs: Sequence[EnvironmentalData]) -> List[Dict]:
+        snapshot = self.catalog.current
+        results = snapshot.engine.generate_recommendations_batch(envs)
+        for result in results:
+            result['catalog_version'] = snapshot.version
+        return results
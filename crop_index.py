@@ -0,0 +1,95 @@
+"""
+Exact top-N crop retrieval over large catalogs.
+
+Crops are grouped into leaves of a k-d tree built over their optimum vectors.
+For a given environment every leaf gets an upper bound on the weighted-L1
+score of any crop inside it; leaves are scored best-bound first and the search
+stops once no remaining leaf can reach the current top-N.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from prediction_model import score_matrix
+
+# Normalisation constants of the distance terms, in CROP_FIELDS order.
+_SCALES = np.array([50.0, 100.0, 1000.0, 14.0])
+_WEIGHT_KEYS = ('temperature', 'humidity', 'water', 'ph')
+
+# Slack absorbing rounding differences between a bound and an exact score.
+_BOUND_EPSILON = 1e-9
+
+
+class CropIndex:
+    def __init__(self, crops: np.ndarray, weights: Dict[str, float], leaf_size: int = 256):
+        if any(weights[key] < 0 for key in _WEIGHT_KEYS + ('pest',)):
+            raise ValueError("CropIndex requires non-negative weights")
+        self.weights = dict(weights)
+        self.leaf_size = max(1, leaf_size)
+        self._distance_weights = np.array([self.weights[key] for key in _WEIGHT_KEYS]) / _SCALES
+
+        self.perm = self._build_permutation(np.asarray(crops, dtype=np.float64))
+        self.crops = np.ascontiguousarray(crops[self.perm])
+        self.leaves = self._leaf_bounds(len(self.crops))
+        self.lower = np.array([self.crops[a:b].min(axis=0) for a, b in self.leaves]).reshape(-1, 5)
+        self.upper = np.array([self.crops[a:b].max(axis=0) for a, b in self.leaves]).reshape(-1, 5)
+
+    def __len__(self) -> int:
+        return len(self.crops)
+
+    def _build_permutation(self, crops: np.ndarray) -> np.ndarray:
+        """Order crops so that every leaf_size run is a k-d tree leaf."""
+        perm = np.arange(len(crops))
+        spread_weights = np.append(self._distance_weights, self.weights['pest'] / 10)
+        stack = [(0, len(crops))]
+        while stack:
+            start, end = stack.pop()
+            if end - start <= self.leaf_size:
+                continue
+            segment = crops[perm[start:end]]
+            spread = (segment.max(axis=0) - segment.min(axis=0)) * spread_weights
+            dim = int(np.argmax(spread))
+            # Split on a multiple of leaf_size so leaves stay aligned with _leaf_bounds
+            mid = start + max(1, ((end - start) // 2) // self.leaf_size) * self.leaf_size
+            order = np.argpartition(segment[:, dim], mid - start - 1)
+            perm[start:end] = perm[start:end][order]
+            stack.append((start, mid))
+            stack.append((mid, end))
+        return perm
+
+    def _leaf_bounds(self, n_crops: int) -> List[Tuple[int, int]]:
+        return [(a, min(a + self.leaf_size, n_crops)) for a in range(0, n_crops, self.leaf_size)]
+
+    def upper_bounds(self, env: np.ndarray) -> np.ndarray:
+        """Upper bound of the score reachable inside each leaf for one env row."""
+        features = env[[0, 1, 2, 3]]
+        distance = np.maximum(0, np.maximum(self.lower[:, :4] - features, features - self.upper[:, :4]))
+        bound = sum(self.weights[key] for key in _WEIGHT_KEYS) - distance @ self._distance_weights
+        pest_factor = 1 - env[5] / 10
+        resistance = self.upper[:, 4] if pest_factor >= 0 else self.lower[:, 4]
+        return bound + self.weights['pest'] * (resistance / 10) * pest_factor
+
+    def query(self, env: np.ndarray, top_n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact top_n crops for one env row (ENV_FIELDS order).
+
+        Returns catalog indices and scores, highest first with ties in catalog
+        order, identical to a full scan.
+        """
+        best_idx = np.empty(0, dtype=np.intp)
+        best_scores = np.empty(0, dtype=np.float64)
+        if top_n <= 0 or not len(self.crops):
+            return best_idx, best_scores
+
+        bounds = self.upper_bounds(env)
+        env_row = env[None, :]
+        for leaf in np.argsort(-bounds, kind='stable'):
+            if len(best_scores) == top_n and bounds[leaf] + _BOUND_EPSILON < best_scores[-1]:
+                break
+            start, end = self.leaves[leaf]
+            scores = score_matrix(env_row, self.crops[start:end], self.weights)[0]
+            idx = np.concatenate((best_idx, self.perm[start:end]))
+            scores = np.concatenate((best_scores, scores))
+            keep = np.lexsort((idx, -scores))[:top_n]
+            best_idx, best_scores = idx[keep], scores[keep]
+        return best_idx, best_scores
@@ -2,10 +2,19 @@
 Handles loading and preprocessing of agricultural data from CSV files.
 """
 import csv
-from typing import List, Dict
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
 
-@dataclass
+import numpy as np
+
+from dataset_cache import is_columnar_dataset, load_cached_columns, load_columns
+from instrumentation import count, timed
+
+logger = logging.getLogger(__name__)
+
+# Slotted: no per-instance __dict__, for long lists of readings
+@dataclass(slots=True)
 class EnvironmentalData:
     temperature: float
     humidity: float
@@ -14,7 +23,7 @@ class EnvironmentalData:
     soil_moisture: float
     pest_risk: float
 
-@dataclass
+@dataclass(slots=True)
 class CropData:
     name: str
     optimal_temp: float
@@ -23,32 +32,187 @@ class CropData:
     optimal_ph: float
     pest_resistance: float
 
-def load_environmental_data(filepath: str) -> List[EnvironmentalData]:
-    data = []
+# Field name -> accepted CSV headers, Turkish header first.
+ENVIRONMENTAL_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    'temperature': ('sıcaklık', 'temperature'),
+    'humidity': ('nem', 'humidity'),
+    'rainfall': ('yağış', 'rainfall'),
+    'soil_ph': ('toprak_ph', 'soil_ph'),
+    'soil_moisture': ('toprak_nem', 'soil_moisture'),
+    'pest_risk': ('zararlı_risk', 'pest_risk'),
+}
+
+CROP_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    'name': ('name',),
+    'optimal_temp': ('en_uygun_sıcaklık', 'optimal_temp'),
+    'optimal_humidity': ('en_uygun_nem', 'optimal_humidity'),
+    'water_needs': ('su_ihtiyacı', 'water_needs'),
+    'optimal_ph': ('en_uygun_ph', 'optimal_ph'),
+    'pest_resistance': ('zararlı_direnci', 'pest_resistance'),
+}
+
+DEFAULT_CHUNK_SIZE = 65536
+
+@dataclass
+class BadRow:
+    filepath: str
+    line_number: int
+    row: Dict[str, str]
+    error: Exception
+
+# Called with every row that fails to parse; streaming loaders skip the row afterwards.
+BadRowHandler = Callable[[BadRow], None]
+
+def log_bad_row(bad_row: BadRow) -> None:
+    logger.warning("Skipping %s line %d: %s", bad_row.filepath, bad_row.line_number, bad_row.error)
+
+def raise_bad_row(bad_row: BadRow) -> None:
+    raise ValueError(f"{bad_row.filepath} line {bad_row.line_number}: {bad_row.error}") from bad_row.error
+
+def _resolve_headers(filepath: str, fieldnames, columns: Dict[str, Tuple[str, ...]]) -> Dict[str, str]:
+    """Map every field to the header used for it in this file."""
+    available = set(fieldnames or ())
+    headers = {}
+    for field, candidates in columns.items():
+        found = next((header for header in candidates if header in available), None)
+        if found is None:
+            raise ValueError(f"{filepath}: missing column {candidates[0]!r}")
+        headers[field] = found
+    return headers
+
+def _cached_columns(filepath: str, columns: Dict[str, Tuple[str, ...]], use_cache: bool) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Columns from a valid dataset_cache entry for filepath, or None to parse the CSV.
+
+    filepath may also be a standalone columnar directory, which is always read directly.
+    """
+    if is_columnar_dataset(filepath):
+        stored = load_columns(filepath)
+        missing = [field for field in columns if field not in stored]
+        if missing:
+            raise ValueError(f"{filepath}: missing column {missing[0]!r}")
+        return stored
+    if not use_cache:
+        return None
+    cached = load_cached_columns(filepath)
+    if cached is None or any(field not in cached for field in columns):
+        return None
+    return cached
+
+def _iter_rows(filepath: str, columns: Dict[str, Tuple[str, ...]], on_error: BadRowHandler,
+               use_cache: bool = True) -> Iterator[Tuple[str, ...]]:
+    """Yield each row as a tuple of values in `columns` order, skipping bad rows."""
+    cached = _cached_columns(filepath, columns, use_cache)
+    if cached is not None:
+        rows = len(cached[next(iter(columns))])
+        for start in range(0, rows, DEFAULT_CHUNK_SIZE):
+            yield from zip(*(cached[field][start:start + DEFAULT_CHUNK_SIZE].tolist() for field in columns))
+        return
+
     with open(filepath, 'r') as file:
         reader = csv.DictReader(file)
+        headers = _resolve_headers(filepath, reader.fieldnames, columns)
+        numeric = [headers[field] for field in columns if field != 'name']
         for row in reader:
-            data.append(EnvironmentalData(
-                temperature=float(row['sıcaklık']),
-                humidity=float(row['nem']),
-                rainfall=float(row['yağış']),
-                soil_ph=float(row['toprak_ph']),
-                soil_moisture=float(row['toprak_nem']),
-                pest_risk=float(row['zararlı_risk'])
-            ))
+            try:
+                values = tuple(float(row[header]) for header in numeric)
+            except (TypeError, ValueError) as exc:
+                on_error(BadRow(filepath, reader.line_num, row, exc))
+                continue
+            if 'name' in headers:
+                values = (row[headers['name']],) + values
+            yield values
+
+def iter_environmental_data(filepath: str, on_error: Optional[BadRowHandler] = None,
+                            use_cache: bool = True) -> Iterator[EnvironmentalData]:
+    """Stream EnvironmentalData records one row at a time."""
+    for values in _iter_rows(filepath, ENVIRONMENTAL_COLUMNS, on_error or log_bad_row, use_cache):
+        yield EnvironmentalData(*values)
+
+def iter_crop_data(filepath: str, on_error: Optional[BadRowHandler] = None,
+                   use_cache: bool = True) -> Iterator[CropData]:
+    """Stream CropData records one row at a time."""
+    for values in _iter_rows(filepath, CROP_COLUMNS, on_error or log_bad_row, use_cache):
+        yield CropData(*values)
+
+def _iter_chunks(filepath: str, columns: Dict[str, Tuple[str, ...]], chunk_size: int,
+                 on_error: Optional[BadRowHandler], use_cache: bool) -> Iterator[Dict[str, np.ndarray]]:
+    cached = _cached_columns(filepath, columns, use_cache)
+    if cached is not None:
+        rows = len(cached[next(iter(columns))])
+        for start in range(0, rows, chunk_size):
+            count('chunk_rows_loaded', min(chunk_size, rows - start))
+            yield {field: cached[field][start:start + chunk_size] for field in columns}
+        return
+
+    fields = list(columns)
+
+    def new_chunk():
+        return {field: np.empty(chunk_size, dtype=object if field == 'name' else np.float64) for field in fields}
+
+    chunk, size = new_chunk(), 0
+    for values in _iter_rows(filepath, columns, on_error or log_bad_row, use_cache=False):
+        for field, value in zip(fields, values):
+            chunk[field][size] = value
+        size += 1
+        if size == chunk_size:
+            count('chunk_rows_loaded', size)
+            yield chunk
+            chunk, size = new_chunk(), 0
+    if size:
+        count('chunk_rows_loaded', size)
+        yield {field: column[:size] for field, column in chunk.items()}
+
+def iter_environmental_chunks(filepath: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                              on_error: Optional[BadRowHandler] = None,
+                              use_cache: bool = True) -> Iterator[Dict[str, np.ndarray]]:
+    """Stream environmental data as column batches of at most chunk_size rows, keyed by field."""
+    return _iter_chunks(filepath, ENVIRONMENTAL_COLUMNS, chunk_size, on_error, use_cache)
+
+def iter_crop_chunks(filepath: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     on_error: Optional[BadRowHandler] = None,
+                     use_cache: bool = True) -> Iterator[Dict[str, np.ndarray]]:
+    """Stream crop data as column batches of at most chunk_size rows, keyed by field."""
+    return _iter_chunks(filepath, CROP_COLUMNS, chunk_size, on_error, use_cache)
+
+@timed('load_environmental_data')
+def load_environmental_data(filepath: str, use_cache: bool = True) -> List[EnvironmentalData]:
+    """Load every row, reading the binary cache from dataset_cache when it is up to date."""
+    data = list(iter_environmental_data(filepath, on_error=raise_bad_row, use_cache=use_cache))
+    count('environmental_rows_loaded', len(data))
     return data
 
-def load_crop_data(filepath: str) -> List[CropData]:
-    crops = []
-    with open(filepath, 'r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            crops.append(CropData(
-                name=row['name'],
-                optimal_temp=float(row['en_uygun_sıcaklık']),
-                optimal_humidity=float(row['en_uygun_nem']),
-                water_needs=float(row['su_ihtiyacı']),
-                optimal_ph=float(row['en_uygun_ph']),
-                pest_resistance=float(row['zararlı_direnci'])
-            ))
-    return crops
\ No newline at end of file
+@timed('load_crop_data')
+def load_crop_data(filepath: str, use_cache: bool = True) -> List[CropData]:
+    """Load every row, reading the binary cache from dataset_cache when it is up to date."""
+    data = list(iter_crop_data(filepath, on_error=raise_bad_row, use_cache=use_cache))
+    count('crop_rows_loaded', len(data))
+    return data
+
+def _load_columns(filepath: str, columns: Dict[str, Tuple[str, ...]], use_cache: bool) -> Dict[str, np.ndarray]:
+    """Whole-file columns: cached or columnar sources as memory maps, otherwise parsed chunk by chunk."""
+    cached = _cached_columns(filepath, columns, use_cache)
+    if cached is not None:
+        return cached
+    chunks = list(_iter_chunks(filepath, columns, DEFAULT_CHUNK_SIZE, raise_bad_row, use_cache=False))
+    return {
+        field: np.concatenate([chunk[field] for chunk in chunks]) if chunks
+        else np.empty(0, dtype=object if field == 'name' else np.float64)
+        for field in columns
+    }
+
+@timed('load_environmental_table')
+def load_environmental_table(filepath: str, use_cache: bool = True):
+    """Load every row into a tables.ReadingTable (8 bytes per value instead of one record per row)."""
+    from tables import ReadingTable
+    table = ReadingTable(_load_columns(filepath, ENVIRONMENTAL_COLUMNS, use_cache))
+    count('environmental_rows_loaded', len(table))
+    return table
+
+@timed('load_crop_table')
+def load_crop_table(filepath: str, use_cache: bool = True):
+    """Load every row into a tables.CropTable."""
+    from tables import CropTable
+    table = CropTable(_load_columns(filepath, CROP_COLUMNS, use_cache))
+    count('crop_rows_loaded', len(table))
+    return table
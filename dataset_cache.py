@@ -0,0 +1,245 @@
+"""
+Binary columnar cache for the crop and environmental CSV files.
+
+A cache lives next to its CSV in a `<file>.cache` directory holding one raw
+array file per column plus a meta.json describing dtypes, row count and the
+source file's size, mtime and SHA-256. Numeric columns are memory mapped on
+load, so opening a warm cache costs next to nothing regardless of file size.
+
+By default a cache is trusted while the CSV's size and mtime are unchanged.
+Edits that keep both (e.g. `cp -p`, or some sync tools restoring
+timestamps) are not detected; use --verify-hash for such files, which also
+compares the SHA-256 recorded at build time. A cache that disappears or is
+half-written while being opened (another process rebuilding it) is treated
+as missing, and the loaders fall back to parsing the CSV.
+
+The same layout without a source CSV serves as a standalone columnar dataset
+(see ColumnWriter / load_columns), e.g. as written by synthetic_data.py.
+
+Usage:
+    python dataset_cache.py build crops.csv environmental_data.csv
+    python dataset_cache.py status crops.csv --verify-hash
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+
+from instrumentation import count, timed
+
+CACHE_SUFFIX = '.cache'
+CACHE_FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+
+def cache_path(csv_path: str) -> str:
+    return csv_path + CACHE_SUFFIX
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _source_signature(csv_path: str, with_hash: bool) -> Dict:
+    stat = os.stat(csv_path)
+    signature = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        signature['sha256'] = file_sha256(csv_path)
+    return signature
+
+def read_meta(csv_path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(cache_path(csv_path), META_FILE)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def is_cache_valid(csv_path: str, verify_hash: bool = False) -> bool:
+    """
+    True if a cache exists and matches the CSV's size, mtime and (optionally) hash.
+
+    Without verify_hash an edit that keeps the file's size and mtime is not noticed.
+    """
+    meta = read_meta(csv_path)
+    if meta is None or meta.get('version') != CACHE_FORMAT_VERSION:
+        return False
+    try:
+        current = _source_signature(csv_path, with_hash=verify_hash)
+    except OSError:
+        return False
+    source = meta['source']
+    if current['size'] != source['size'] or current['mtime_ns'] != source['mtime_ns']:
+        return False
+    return not verify_hash or current['sha256'] == source['sha256']
+
+def detect_kind(csv_path: str) -> str:
+    """'crop' or 'environmental', based on the CSV header."""
+    import csv
+    from data_loader import CROP_COLUMNS
+    with open(csv_path, 'r') as file:
+        header = next(csv.reader(file), [])
+    return 'crop' if any(name in header for name in CROP_COLUMNS['name']) else 'environmental'
+
+class ColumnWriter:
+    """
+    Appends column chunks to a columnar directory; close() writes meta.json.
+
+    columns maps field -> 'str' or 'float64'. String columns are stored as
+    one UTF-8 blob plus int64 character offsets, numeric columns as raw
+    float64, so chunks of any size can be appended without holding more
+    than one chunk in memory.
+    """
+
+    def __init__(self, directory: str, columns: Mapping[str, str]):
+        self.directory = directory
+        self.columns = dict(columns)
+        self.rows = 0
+        self._name_offsets = {field: 0 for field, dtype in self.columns.items() if dtype == 'str'}
+        os.makedirs(directory, exist_ok=True)
+        self._files = {
+            field: [open(os.path.join(directory, f"{field}.{ext}"), 'wb')
+                    for ext in (('utf8', 'offsets') if dtype == 'str' else ('f8',))]
+            for field, dtype in self.columns.items()
+        }
+        for field in self._name_offsets:
+            np.zeros(1, dtype=np.int64).tofile(self._files[field][1])
+
+    def write(self, chunk: Mapping[str, np.ndarray]):
+        for field, dtype in self.columns.items():
+            values = chunk[field]
+            if dtype == 'str':
+                text = ''.join(values)
+                lengths = np.fromiter((len(value) for value in values), dtype=np.int64, count=len(values))
+                (self._name_offsets[field] + np.cumsum(lengths)).tofile(self._files[field][1])
+                self._name_offsets[field] += len(text)
+                self._files[field][0].write(text.encode('utf-8'))
+            else:
+                np.ascontiguousarray(values, dtype=np.float64).tofile(self._files[field][0])
+        self.rows += len(chunk[next(iter(self.columns))])
+
+    def close(self, **meta):
+        """Close the column files and write meta.json with any extra meta entries."""
+        for handles in self._files.values():
+            for handle in handles:
+                handle.close()
+        meta = dict({'version': CACHE_FORMAT_VERSION, 'rows': self.rows, 'columns': self.columns}, **meta)
+        with open(os.path.join(self.directory, META_FILE), 'w') as file:
+            json.dump(meta, file, indent=2)
+
+    def abort(self):
+        for handles in self._files.values():
+            for handle in handles:
+                handle.close()
+
+def is_columnar_dataset(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+def load_columns(directory: str) -> Dict[str, np.ndarray]:
+    """
+    Columns of a columnar directory keyed by field.
+
+    Numeric columns are read-only memory maps; strings are decoded into an object array.
+    """
+    with open(os.path.join(directory, META_FILE)) as file:
+        meta = json.load(file)
+    rows = meta['rows']
+    result = {}
+    for field, dtype in meta['columns'].items():
+        if dtype == 'str':
+            with open(os.path.join(directory, f"{field}.utf8"), 'rb') as file:
+                text = file.read().decode('utf-8')
+            offsets = np.fromfile(os.path.join(directory, f"{field}.offsets"), dtype=np.int64).tolist()
+            names = np.empty(rows, dtype=object)
+            names[:] = [text[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+            result[field] = names
+        elif rows:
+            result[field] = np.memmap(os.path.join(directory, f"{field}.f8"), dtype=np.float64, mode='r', shape=(rows,))
+        else:
+            result[field] = np.empty(0, dtype=np.float64)
+    return result
+
+@timed('build_dataset_cache')
+def build_cache(csv_path: str, kind: Optional[str] = None, force: bool = False) -> str:
+    """
+    Parse csv_path once and write its columnar cache; returns the cache directory.
+
+    The CSV is streamed in chunks, so building never holds the whole file in
+    memory. An up-to-date cache is left alone unless force is set.
+    """
+    from data_loader import CROP_COLUMNS, ENVIRONMENTAL_COLUMNS, iter_crop_chunks, iter_environmental_chunks, raise_bad_row
+
+    target = cache_path(csv_path)
+    if not force and is_cache_valid(csv_path):
+        return target
+    kind = kind or detect_kind(csv_path)
+    fields = CROP_COLUMNS if kind == 'crop' else ENVIRONMENTAL_COLUMNS
+    iter_chunks = iter_crop_chunks if kind == 'crop' else iter_environmental_chunks
+    signature = _source_signature(csv_path, with_hash=True)
+
+    tmp = target + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    writer = ColumnWriter(tmp, {field: 'str' if field == 'name' else 'float64' for field in fields})
+    try:
+        for chunk in iter_chunks(csv_path, on_error=raise_bad_row, use_cache=False):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close(kind=kind, source=signature)
+    # Move the old cache aside before deleting it, so readers see either a complete cache or none at all
+    stale = f"{target}.old.{os.getpid()}"
+    try:
+        os.replace(target, stale)
+    except FileNotFoundError:
+        stale = None
+    os.replace(tmp, target)
+    if stale is not None:
+        shutil.rmtree(stale, ignore_errors=True)
+    return target
+
+def load_cached_columns(csv_path: str, verify_hash: bool = False) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Columns of a valid cache keyed by field, or None if there is no usable cache.
+
+    Numeric columns are read-only memory maps; names are decoded into an object array.
+    A cache that vanishes or is incomplete while it is being opened counts as no cache.
+    """
+    if not is_cache_valid(csv_path, verify_hash=verify_hash):
+        return None
+    try:
+        return load_columns(cache_path(csv_path))
+    except (OSError, ValueError, KeyError):
+        count('dataset_cache_fallbacks')
+        return None
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Build or inspect the binary CSV caches.")
+    parser.add_argument('command', choices=['build', 'status'])
+    parser.add_argument('files', nargs='+', help="CSV files (crops or environmental data)")
+    parser.add_argument('--force', action='store_true', help="rebuild even if the cache is up to date")
+    parser.add_argument('--verify-hash', action='store_true', help="compare SHA-256 as well as size and mtime (needed if edits can keep the mtime)")
+    args = parser.parse_args(argv)
+
+    for csv_path in args.files:
+        if args.command == 'build':
+            force = args.force or (args.verify_hash and not is_cache_valid(csv_path, verify_hash=True))
+            target = build_cache(csv_path, force=force)
+            # Warm the page cache so the first real load is served from memory
+            columns = load_cached_columns(csv_path)
+            for values in columns.values():
+                if isinstance(values, np.memmap):
+                    values.sum()
+            print(f"{csv_path}: {read_meta(csv_path)['rows']} satır -> {target}")
+        else:
+            state = 'geçerli' if is_cache_valid(csv_path, verify_hash=args.verify_hash) else 'eski veya yok'
+            print(f"{csv_path}: önbellek {state}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
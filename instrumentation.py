@@ -0,0 +1,183 @@
+"""
+Lightweight, toggleable pipeline instrumentation.
+
+Stages are timed with the `timed` decorator or the `timer` context manager;
+each timing feeds a call counter and a latency histogram. Plain counters
+(`count`) track volumes such as rows loaded or pairs scored. Metrics are
+exported as Prometheus text (`prometheus_text`) or JSON (`snapshot`,
+`dump_json`).
+
+Instrumentation is off unless TARIM_METRICS is set or `enable()` is called.
+While off, a timed call costs one global flag check.
+"""
+import bisect
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+from contextlib import contextmanager, nullcontext
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets; the last bucket is +Inf
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+_enabled = os.environ.get('TARIM_METRICS', '').lower() not in ('', '0', 'false', 'no')
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cumulative count) pairs in Prometheus order, ending with +Inf."""
+        running, result = 0, []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            result.append(('+Inf' if bound == float('inf') else repr(bound), running))
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'stages': {
+                    stage: {
+                        'calls': histogram.count,
+                        'total_seconds': histogram.total,
+                        'mean_seconds': histogram.total / histogram.count if histogram.count else 0.0,
+                        'buckets': dict(histogram.cumulative()),
+                    }
+                    for stage, histogram in self.histograms.items()
+                },
+            }
+
+    def prometheus_text(self, prefix: str = 'tarim') -> str:
+        with self._lock:
+            lines = [
+                f"# HELP {prefix}_stage_seconds Time spent per pipeline stage call.",
+                f"# TYPE {prefix}_stage_seconds histogram",
+            ]
+            for stage, histogram in sorted(self.histograms.items()):
+                for le, count in histogram.cumulative():
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.total!r}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            lines.append(f"# HELP {prefix}_items_total Items processed, by counter name.")
+            lines.append(f"# TYPE {prefix}_items_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{prefix}_items_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def timed(stage: str):
+    """Decorator recording every call of the function under `stage`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe(stage, perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def _timer(stage: str):
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(stage, perf_counter() - start)
+
+
+def timer(stage: str):
+    """Context manager timing a block; a shared no-op context while instrumentation is off."""
+    return _timer(stage) if _enabled else _NULL_TIMER
+
+
+def count(name: str, value: float = 1):
+    if _enabled:
+        registry.count(name, value)
+
+
+def snapshot() -> Dict[str, Any]:
+    return registry.snapshot()
+
+
+def prometheus_text() -> str:
+    return registry.prometheus_text()
+
+
+def dump_json(path: str):
+    with open(path, 'w') as file:
+        json.dump(snapshot(), file, indent=2)
+
+
+def reset():
+    registry.reset()
+
+
+def profile_call(fn: Callable, *args, limit: int = 30, sort: str = 'cumulative', **kwargs) -> Tuple[Any, str]:
+    """Run one call under cProfile; returns its result and the top `limit` entries as text."""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(fn, *args, **kwargs)
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(limit)
+    return result, out.getvalue()
@@ -0,0 +1,133 @@
+"""
+Micro-batching in front of RecommendationEngine.
+
+Concurrent single-field requests are collected for at most `max_wait` seconds
+(or until `max_batch_size` requests are waiting) and scored together with
+generate_recommendations_batch, so one matrix pass serves the whole group.
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from data_loader import EnvironmentalData
+from recommendation_engine import RecommendationEngine
+
+_STOP = object()
+
+
+class MicroBatcher:
+    def __init__(self, engine: RecommendationEngine, max_batch_size: int = 64, max_wait: float = 0.005,
+                 max_pending: int = 10000, executor: Optional[concurrent.futures.Executor] = None):
+        self.engine = engine
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.executor = executor
+        self.batches = 0
+        self.requests = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._arrived: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def start(self):
+        """Start collecting on the running event loop (e.g. from an ASGI startup hook)."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._arrived = asyncio.Event()
+        self._task = self._loop.create_task(self._collect())
+
+    async def stop(self):
+        """Finish the requests already queued, then stop collecting."""
+        if self._task is None:
+            return
+        await self._signal_stop()
+        await self._task
+        self._task = None
+
+    async def _signal_stop(self):
+        await self._queue.put(_STOP)
+        self._arrived.set()
+
+    async def recommend(self, env: EnvironmentalData) -> Dict:
+        """Same result as engine.generate_recommendations(env), computed as part of a batch."""
+        future = self._loop.create_future()
+        # A full queue makes callers wait here instead of growing memory without bound
+        await self._queue.put((env, future))
+        self._arrived.set()
+        return await future
+
+    def start_in_thread(self):
+        """Run the batcher on its own event loop thread for synchronous servers such as Flask."""
+        ready = threading.Event()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_until_complete(self._task)
+            loop.close()
+
+        self._thread = threading.Thread(target=run, name="micro-batcher", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop_thread(self):
+        if self._thread is not None:
+            # The loop thread exits once the collector drains the queue and sees the stop marker
+            asyncio.run_coroutine_threadsafe(self._signal_stop(), self._loop)
+            self._thread.join()
+            self._task = None
+            self._thread = None
+
+    def submit(self, env: EnvironmentalData) -> concurrent.futures.Future:
+        """Thread-safe entry point; call .result() on the returned future to wait for the recommendations."""
+        return asyncio.run_coroutine_threadsafe(self.recommend(env), self._loop)
+
+    async def _collect(self):
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if self._queue.empty():
+                    timeout = deadline - self._loop.time()
+                    if timeout <= 0:
+                        break
+                    # Waiting on an event rather than queue.get() means a timeout can never drop a request
+                    self._arrived.clear()
+                    try:
+                        await asyncio.wait_for(self._arrived.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    continue
+                item = self._queue.get_nowait()
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[Tuple[EnvironmentalData, asyncio.Future]]):
+        batch = [(env, future) for env, future in batch if not future.cancelled()]
+        if not batch:
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        envs = [env for env, _ in batch]
+        try:
+            results = await self._loop.run_in_executor(self.executor, self.engine.generate_recommendations_batch, envs)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
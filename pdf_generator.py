@@ -1,63 +1,101 @@
 """
 PDF report generator for crop analysis
 """
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
 from datetime import datetime
 
+from instrumentation import timed
+
+# reportlab is imported inside the functions that build flowables, so importing
+# this module (e.g. from ana.py for console output) does not load it
+
+# Style objects are immutable once built, so each process builds them only once
+@lru_cache(maxsize=None)
+def get_styles():
+    from reportlab.lib.styles import getSampleStyleSheet
+    return getSampleStyleSheet()
+
+@lru_cache(maxsize=None)
+def crop_table_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
+@lru_cache(maxsize=None)
+def sensor_table_style():
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+
 class PDFReportGenerator:
     def __init__(self, filename="crop_report.pdf"):
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate
+
         self.filename = filename
         self.doc = SimpleDocTemplate(filename, pagesize=letter)
-        self.styles = getSampleStyleSheet()
+        self.styles = get_styles()
         self.elements = []
 
     def add_header(self, text):
+        from reportlab.platypus import Paragraph, Spacer
         self.elements.append(Paragraph(text, self.styles['Heading1']))
         self.elements.append(Spacer(1, 12))
 
     def add_subheader(self, text):
+        from reportlab.platypus import Paragraph, Spacer
         self.elements.append(Paragraph(text, self.styles['Heading2']))
         self.elements.append(Spacer(1, 8))
 
     def add_paragraph(self, text):
+        from reportlab.platypus import Paragraph, Spacer
         self.elements.append(Paragraph(text, self.styles['Normal']))
         self.elements.append(Spacer(1, 6))
 
     def add_crop_recommendations(self, recommendations):
+        from reportlab.platypus import Spacer, Table
+
         self.add_subheader("Mahsul Önerileri")
         data = [["Mahsul", "Uyumluluk Skoru"]]
-        for crop, score, _ in recommendations:
+        for crop, score, *_ in recommendations:
             data.append([crop, f"{score:.2f}"])
         
         table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 14),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        table.setStyle(crop_table_style())
         self.elements.append(table)
         self.elements.append(Spacer(1, 12))
 
     def add_sensor_data(self, sensor_data):
+        from reportlab.platypus import Spacer, Table
+
         self.add_subheader("Sensör Verileri")
         data = [["Parametre", "Değer"]]
         for key, value in sensor_data.items():
             data.append([key, f"{value:.1f}"])
         
         table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
+        table.setStyle(sensor_table_style())
         self.elements.append(table)
         self.elements.append(Spacer(1, 12))
 
@@ -72,9 +110,314 @@ class PDFReportGenerator:
             for recommendation in recommendations:
                 self.add_paragraph(f"• {recommendation}")
 
+    @timed('pdf_build')
     def generate(self):
         """Generate the final PDF report"""
         self.add_header(f"Akıllı Tarım Raporu")
         self.add_paragraph(f"Oluşturulma Tarihi: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
         self.doc.build(self.elements)
-        return self.filename
\ No newline at end of file
+        return self.filename
+
+class FlowableStream:
+    """
+    List-like view over a flowable iterator, as consumed by doc.build.
+
+    reportlab only looks at the front of its flowable list (and a few items
+    ahead for keepWithNext), so holding a small look-ahead buffer lets a
+    document be built from a generator without materialising the story.
+    """
+    LOOKAHEAD = 32
+
+    def __init__(self, flowables: Iterable):
+        self._source = iter(flowables)
+        self._buffer = []
+
+    def _fill(self, size=None):
+        """Buffer up to size items, or the whole rest of the source when size is None."""
+        if self._source is None or (size is not None and len(self._buffer) >= size):
+            return
+        if size is None:
+            self._buffer.extend(self._source)
+        else:
+            self._buffer.extend(islice(self._source, size - len(self._buffer)))
+        if size is None or len(self._buffer) < size:
+            self._source = None
+
+    def __len__(self):
+        self._fill(self.LOOKAHEAD)
+        return len(self._buffer)
+
+    def _fill_for(self, index):
+        if isinstance(index, slice):
+            if index.stop is None or index.stop < 0 or (index.start or 0) < 0:
+                self._fill()
+            else:
+                self._fill(index.stop)
+        elif index < 0:
+            self._fill()
+        else:
+            self._fill(index + 1)
+
+    def __getitem__(self, index):
+        self._fill_for(index)
+        return self._buffer[index]
+
+    def __setitem__(self, index, value):
+        self._fill_for(index)
+        self._buffer[index] = value
+
+    def __delitem__(self, index):
+        self._fill_for(index)
+        del self._buffer[index]
+
+    def insert(self, index, value):
+        self._buffer.insert(index, value)
+
+def paginated_tables(header: Sequence, rows: Iterable[Sequence], style=None, rows_per_table: int = 40) -> Iterator:
+    """Yield page-sized Table flowables, each repeating the header row, from a row iterator."""
+    from reportlab.platypus import Table
+
+    style = style or sensor_table_style()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, rows_per_table))
+        if not chunk:
+            break
+        table = Table([list(header)] + chunk)
+        table.setStyle(style)
+        yield table
+
+class StreamingPDFReport:
+    """
+    Report builder for very large reports.
+
+    Sections are kept as lazy iterables and consumed page by page during
+    generate(). reportlab still keeps every finished page of a document in
+    memory until it is saved (roughly 8 KB per page), so for reports with
+    millions of rows set pages_per_volume: the report is then written as
+    numbered volumes and memory stays bounded by one volume.
+    """
+
+    def __init__(self, filename="crop_report.pdf", rows_per_table=40, pages_per_volume=None):
+        self.filename = filename
+        self.rows_per_table = rows_per_table
+        self.pages_per_volume = pages_per_volume
+        self.styles = get_styles()
+        self._sections = []
+
+    def add_flowables(self, flowables: Iterable):
+        self._sections.append(flowables)
+
+    def add_header(self, text):
+        from reportlab.platypus import Paragraph, Spacer
+        self._sections.append((Paragraph(text, self.styles['Heading1']), Spacer(1, 12)))
+
+    def add_subheader(self, text):
+        from reportlab.platypus import Paragraph, Spacer
+        self._sections.append((Paragraph(text, self.styles['Heading2']), Spacer(1, 8)))
+
+    def add_paragraph(self, text):
+        from reportlab.platypus import Paragraph, Spacer
+        self._sections.append((Paragraph(text, self.styles['Normal']), Spacer(1, 6)))
+
+    def add_table(self, header: Sequence, rows: Iterable[Sequence], style=None):
+        """Add a table from a row iterator; it is split into page-sized chunks."""
+        from reportlab.platypus import Spacer
+
+        self._sections.append(paginated_tables(header, rows, style, self.rows_per_table))
+        self._sections.append((Spacer(1, 12),))
+
+    def add_crop_reasons(self, recommendations: Iterable[Tuple]):
+        """Score and reason table for (crop, score[, reasons]) rows, e.g. a whole catalog."""
+        from reportlab.platypus import Paragraph
+
+        self.add_subheader("Mahsul Önerileri")
+        rows = (
+            [crop, f"{score:.2f}"] + [Paragraph(str(reason), self.styles['Normal']) for reason in (rest[0].values() if rest else ())]
+            for crop, score, *rest in recommendations
+        )
+        self.add_table(["Mahsul", "Uyumluluk Skoru", "Sicaklik", "Nem", "Su", "Ph", "Zararli"], rows, crop_table_style())
+
+    def add_sensor_rows(self, columns: Sequence[str], rows: Iterable[Sequence[float]]):
+        """Sensor history table, one row per reading."""
+        self.add_subheader("Sensör Verileri")
+        self.add_table(columns, ([f"{value:.1f}" for value in row] for row in rows))
+
+    def _title(self, volume=None):
+        from reportlab.platypus import Paragraph, Spacer
+
+        title = "Akıllı Tarım Raporu" if volume is None else f"Akıllı Tarım Raporu (Cilt {volume})"
+        return (
+            Paragraph(title, self.styles['Heading1']),
+            Spacer(1, 12),
+            Paragraph(f"Oluşturulma Tarihi: {datetime.now().strftime('%d/%m/%Y %H:%M')}", self.styles['Normal']),
+            Spacer(1, 6),
+        )
+
+    def _volume_filename(self, volume):
+        base, ext = os.path.splitext(self.filename)
+        return f"{base}_{volume:03d}{ext or '.pdf'}"
+
+    @timed('pdf_streaming_build')
+    def generate(self):
+        """
+        Generate the PDF, consuming the section generators as pages are laid out.
+
+        Returns the filename, or the list of volume filenames when pages_per_volume is set.
+        """
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate
+
+        story = chain.from_iterable(self._sections)
+        self._sections = []
+        if not self.pages_per_volume:
+            doc = SimpleDocTemplate(self.filename, pagesize=letter, pageCompression=1)
+            doc.build(FlowableStream(chain(self._title(), story)))
+            return self.filename
+
+        filenames = []
+        story = FlowableStream(story)
+        while len(story) or not filenames:
+            filename = self._volume_filename(len(filenames) + 1)
+            doc = SimpleDocTemplate(filename, pagesize=letter, pageCompression=1)
+            doc.build(FlowableStream(chain(self._title(len(filenames) + 1), self._take_pages(story))))
+            filenames.append(filename)
+        return filenames
+
+    def _take_pages(self, story):
+        """Yield flowables from story until pages_per_volume page-sized tables were emitted."""
+        from reportlab.platypus import Table
+
+        tables = 0
+        while len(story) and tables < self.pages_per_volume:
+            flowable = story[0]
+            del story[0]
+            tables += isinstance(flowable, Table)
+            yield flowable
+
+def render_report(filename, recommendations, sensor_data, alerts, sensor_recommendations=()):
+    """Build one complete report with PDFReportGenerator and return its path."""
+    report = PDFReportGenerator(filename)
+    report.add_crop_recommendations(recommendations)
+    report.add_sensor_data(sensor_data)
+    report.add_alerts_and_recommendations(alerts, sensor_recommendations)
+    return report.generate()
+
+@dataclass
+class BulkReportSummary:
+    total: int = 0
+    succeeded: int = 0
+    failed: List[Tuple[Any, str]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def __str__(self):
+        lines = [f"{self.succeeded}/{self.total} rapor oluşturuldu, {len(self.failed)} hata ({self.elapsed:.1f} sn)"]
+        lines += [f"  - {field_id}: {error}" for field_id, error in self.failed]
+        return "\n".join(lines)
+
+def report_filename(output_dir: str, filename_template: str, field_id) -> str:
+    """Output path for one field; path separators in the field id are replaced."""
+    safe_id = str(field_id).replace(os.sep, "_").replace("/", "_")
+    return os.path.join(output_dir, filename_template.format(field_id=safe_id))
+
+def _warm_worker():
+    get_styles()
+    crop_table_style()
+    sensor_table_style()
+
+def _render_job(job, output_dir, filename_template):
+    field_id, recommendations, sensor_data, alerts, *rest = job
+    try:
+        path = report_filename(output_dir, filename_template, field_id)
+        render_report(path, recommendations, sensor_data, alerts, rest[0] if rest else ())
+        return field_id, path, None
+    except Exception as exc:
+        # Exceptions are returned as text because reportlab errors are not always picklable
+        return field_id, None, f"{type(exc).__name__}: {exc}"
+
+# Only the total is timed here; per-report timings stay in the worker processes
+@timed('pdf_bulk')
+def generate_bulk_reports(jobs: Iterable[Tuple], output_dir: str = ".", filename_template: str = "{field_id}.pdf",
+                          workers: Optional[int] = None, progress: Optional[Callable[[int, int], None]] = None,
+                          max_in_flight: Optional[int] = None) -> BulkReportSummary:
+    """
+    Render one report per (field_id, recommendations, sensor_data, alerts[, sensor_recommendations]) job.
+
+    Jobs are rendered across a process pool; each worker builds the style
+    sheet and table styles once. Only max_in_flight jobs are submitted at a
+    time, so a lazy iterable of jobs is never materialised. progress, if
+    given, is called with (finished, failed) after every report.
+
+    A job that cannot be sent to a worker (e.g. unpicklable data) or whose
+    worker dies is recorded as failed like any other. A dead worker breaks
+    the pool for every job queued on it, so those jobs are retried one at a
+    time on a separate pool; only a job that breaks that pool on its own is
+    counted as failed. Later jobs go to a new pool.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * 4
+    summary = BulkReportSummary()
+    start = time.perf_counter()
+
+    def record(field_id, error):
+        if error is None:
+            summary.succeeded += 1
+        else:
+            summary.failed.append((field_id, error))
+        if progress is not None:
+            progress(summary.succeeded + len(summary.failed), len(summary.failed))
+
+    def collect(done):
+        for future in done:
+            job = pending.pop(future)
+            try:
+                _, _, error = future.result()
+            except BrokenProcessPool:
+                # The worker that died may have been running a different job
+                retry.append(job)
+                continue
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+            record(job[0], error)
+
+    def run_alone(jobs):
+        solo = None
+        try:
+            for job in jobs:
+                solo = solo or ProcessPoolExecutor(max_workers=1, initializer=_warm_worker)
+                try:
+                    _, _, error = solo.submit(_render_job, job, output_dir, filename_template).result()
+                except BrokenProcessPool as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                    solo.shutdown(wait=False)
+                    solo = None
+                except Exception as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                record(job[0], error)
+        finally:
+            if solo is not None:
+                solo.shutdown()
+
+    pending = {}
+    retry = []
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+    try:
+        for job in jobs:
+            if len(pending) >= max_in_flight:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            try:
+                future = pool.submit(_render_job, job, output_dir, filename_template)
+            except BrokenProcessPool:
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_worker)
+                future = pool.submit(_render_job, job, output_dir, filename_template)
+            pending[future] = job
+            summary.total += 1
+        collect(wait(pending).done)
+    finally:
+        pool.shutdown()
+    run_alone(retry)
+
+    summary.elapsed = time.perf_counter() - start
+    return summary
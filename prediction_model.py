@@ -1,11 +1,98 @@
 """
 Core prediction model for crop recommendations.
 """
-from typing import List, Tuple
+import heapq
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
 from data_loader import EnvironmentalData, CropData
+from instrumentation import count, timed
+from rules import Condition, Rule, RuleSet
+from tables import CROP_FIELDS, ENV_FIELDS, CropTable, ReadingTable
+
+# Upper bound for one env x crop block of float64 scores.
+MAX_SCORE_BLOCK_BYTES = 32 * 1024 * 1024
+
+
+def env_matrix(envs: Sequence[EnvironmentalData]) -> np.ndarray:
+    """Stack environmental readings (records or a ReadingTable) into an (E, 6) array in ENV_FIELDS order."""
+    if isinstance(envs, ReadingTable):
+        return envs.matrix()
+    rows = [[getattr(env, field) for field in ENV_FIELDS] for env in envs]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(ENV_FIELDS))
+
+
+def env_matrix_from_columns(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Build an (E, 6) env matrix from a column batch keyed by ENV_FIELDS."""
+    return np.column_stack([np.asarray(columns[field], dtype=np.float64) for field in ENV_FIELDS])
+
+
+def crop_matrix(crops: Sequence[CropData]) -> np.ndarray:
+    """Stack crop optimums (records or a CropTable) into a (C, 5) array in CROP_FIELDS order."""
+    if isinstance(crops, CropTable):
+        return crops.matrix()
+    rows = [[getattr(crop, field) for field in CROP_FIELDS] for crop in crops]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(CROP_FIELDS))
+
+
+def score_matrix(envs: np.ndarray, crops: np.ndarray, weights: Dict[str, float]) -> np.ndarray:
+    """
+    Score every env row against every crop row, returning an (E, C) array.
+
+    Performs the same floating point operations in the same order as
+    CropPredictionModel.calculate_crop_score, so the results are bit-identical.
+    """
+    def component(env_col, crop_col, scale):
+        part = np.abs(envs[:, env_col, None] - crops[None, :, crop_col])
+        part /= scale
+        return np.subtract(1, part, out=part)
+
+    total = component(0, 0, 50)
+    total *= weights['temperature']
+    for env_col, crop_col, scale, key in ((1, 1, 100, 'humidity'),
+                                          (2, 2, 1000, 'water'),
+                                          (3, 3, 14, 'ph')):
+        part = component(env_col, crop_col, scale)
+        part *= weights[key]
+        total += part
+
+    pest = (crops[None, :, 4] / 10) * (1 - envs[:, 5, None] / 10)
+    pest *= weights['pest']
+    total += pest
+    return total
+
+
+def top_n_indices(scores: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    Row-wise indices of the top_n scores, highest first, ties in catalog order.
+
+    Uses a partial selection (argpartition) instead of a full sort; rows where
+    ties straddle the cut-off fall back to an exact per-row selection.
+    """
+    n_rows, n_cols = scores.shape
+    top_n = min(top_n, n_cols)
+    if top_n <= 0:
+        return np.empty((n_rows, 0), dtype=np.intp)
+    if top_n == n_cols:
+        return np.argsort(-scores, axis=1, kind='stable')
+
+    part = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+    values = np.take_along_axis(scores, part, axis=1)
+    cutoff = values.min(axis=1)
+    at_or_above = (scores >= cutoff[:, None]).sum(axis=1)
+
+    order = np.lexsort((part, -values), axis=1)
+    result = np.take_along_axis(part, order, axis=1)
+    for row in np.flatnonzero(at_or_above > top_n):
+        candidates = np.flatnonzero(scores[row] >= cutoff[row])
+        ranked = np.argsort(-scores[row, candidates], kind='stable')
+        result[row] = candidates[ranked[:top_n]]
+    return result
 
 class CropPredictionModel:
-    def __init__(self, crop_data: List[CropData]):
+    def __init__(self, crop_data: Union[List[CropData], CropTable]):
         self.crop_data = crop_data
         self.weights = {
             'temperature': 0.25,
@@ -14,6 +101,9 @@ class CropPredictionModel:
             'ph': 0.2,
             'pest': 0.15
         }
+        self._crop_matrix: Optional[np.ndarray] = None
+        self.index = None
+        self.lut = None
 
     def calculate_crop_score(self, env: EnvironmentalData, crop: CropData) -> float:
         """Calculate compatibility score between environment and crop."""
@@ -31,31 +121,162 @@ class CropPredictionModel:
             self.weights['pest'] * pest_score
         )
 
+    @timed('predict_best_crops')
     def predict_best_crops(self, env: EnvironmentalData, top_n: int = 3) -> List[Tuple[str, float]]:
         """Predict the best crops for given environmental conditions."""
-        scores = []
-        for crop in self.crop_data:
-            score = self.calculate_crop_score(env, crop)
-            scores.append((crop.name, score))
-        
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:top_n]
+        if self.lut is not None:
+            best = self._predict_from_lut(env, top_n)
+            if best is not None:
+                return best
+        if self.index is not None:
+            indices, scores = self.index.query(env_matrix([env])[0], top_n)
+            return [(self.crop_data[i].name, float(score)) for i, score in zip(indices, scores)]
+        if isinstance(self.crop_data, CropTable):
+            # Same scores and tie order as the scan below, without a row view per crop
+            return self._predict_block(env_matrix([env]), top_n)[0]
+
+        scores = ((crop.name, self.calculate_crop_score(env, crop)) for crop in self.crop_data)
+        return heapq.nlargest(top_n, scores, key=lambda x: x[1])
+
+    def _predict_from_lut(self, env: EnvironmentalData, top_n: int) -> Optional[List[Tuple[str, float]]]:
+        """Rescore the lookup table's candidates; None when they cannot prove the exact answer."""
+        entry = self.lut.lookup(env, top_n)
+        if entry is None:
+            return None
+        indices, bound = entry
+        candidates = (self.crop_data[i] for i in indices)
+        best = heapq.nlargest(top_n, ((crop.name, self.calculate_crop_score(env, crop)) for crop in candidates),
+                              key=lambda x: x[1])
+        if best and best[-1][1] <= bound:
+            self.lut.fallbacks += 1
+            return None
+        self.lut.hits += 1
+        return best
+
+    @property
+    def crop_matrix(self) -> np.ndarray:
+        """Crop optimums as a (C, 5) array, built on first use."""
+        if self._crop_matrix is None:
+            self._crop_matrix = crop_matrix(self.crop_data)
+        return self._crop_matrix
+
+    @timed('build_index')
+    def build_index(self, leaf_size: int = 256):
+        """
+        Build a CropIndex so predict_best_crops prunes crops instead of scanning them all.
+
+        The index snapshots the current catalog and weights; rebuild it after changing either.
+        """
+        from crop_index import CropIndex
+        self.index = CropIndex(self.crop_matrix, self.weights, leaf_size=leaf_size)
+        return self.index
+
+    def sweep_weights(self, envs: Iterable[EnvironmentalData], candidates: np.ndarray, top_n: int = 3,
+                      reference: Optional[Sequence[int]] = None, workers: Optional[int] = None):
+        """
+        Compare candidate weight vectors against the current weights; see weight_sweep.sweep_weights.
+
+        candidates is a (K, 5) array in weight_sweep.WEIGHT_KEYS order.
+        """
+        from weight_sweep import sweep_weights
+        return sweep_weights(env_matrix(envs), self.crop_matrix, candidates, self.weights,
+                             top_n=top_n, reference=reference, workers=workers)
+
+    def score_raster(self, layer_dir: str, output_dir: str, top_n: int = 3, tile_size: int = 512,
+                     workers: Optional[int] = None, restart: bool = False, progress=None):
+        """Top-N crops for every cell of an environmental raster; see raster_scoring.score_raster."""
+        from raster_scoring import score_raster
+        return score_raster(layer_dir, output_dir, self.crop_matrix, self.weights, top_n=top_n,
+                            tile_size=tile_size, workers=workers, restart=restart, progress=progress)
+
+    def build_lut(self, path: Optional[str] = None, grid=None, candidates: int = 16):
+        """
+        Build (or memory-map from path, if it matches the catalog) a ScoreLUT for predict_best_crops.
+
+        A newly built table is saved to path when one is given. Like the index,
+        the table snapshots the catalog and weights.
+        """
+        from score_lut import DEFAULT_GRID, ScoreLUT
+        lut = ScoreLUT.load(path, self.crop_matrix, self.weights) if path else None
+        if lut is None or (grid is not None and lut.grid != tuple(grid)) or lut.depth != min(candidates, len(self.crop_data)):
+            lut = ScoreLUT.build(self.crop_matrix, self.weights, grid or DEFAULT_GRID, candidates)
+            if path:
+                lut.save(path)
+        self.lut = lut
+        return lut
+
+    def batch_chunk_size(self) -> int:
+        """Number of environments scored per block so a block stays within MAX_SCORE_BLOCK_BYTES."""
+        return max(1, MAX_SCORE_BLOCK_BYTES // (8 * max(1, len(self.crop_data))))
+
+    @timed('predict_best_crops_batch')
+    def predict_best_crops_batch(self, envs: Iterable[EnvironmentalData], top_n: int = 3,
+                                 chunk_size: Optional[int] = None) -> List[List[Tuple[str, float]]]:
+        """
+        Predict the best crops for many environments at once.
+
+        Returns one list per environment, identical to predict_best_crops.
+        Environments are consumed in chunks of chunk_size so the score matrix
+        never holds more than one block in memory.
+        """
+        return list(self.iter_best_crops_batch(envs, top_n, chunk_size))
+
+    def iter_best_crops_batch(self, envs: Iterable[EnvironmentalData], top_n: int = 3,
+                              chunk_size: Optional[int] = None) -> Iterator[List[Tuple[str, float]]]:
+        """Lazy predict_best_crops_batch: yields each environment's result as its block is scored."""
+        chunk_size = chunk_size or self.batch_chunk_size()
+        if isinstance(envs, ReadingTable):
+            for start in range(0, len(envs), chunk_size):
+                yield from self._predict_block(envs.matrix(start, start + chunk_size), top_n)
+            return
+        envs = iter(envs)
+        while True:
+            chunk = list(islice(envs, chunk_size))
+            if not chunk:
+                break
+            yield from self._predict_block(env_matrix(chunk), top_n)
+
+    def iter_best_crops_chunks(self, chunks: Iterable[Dict[str, np.ndarray]],
+                               top_n: int = 3) -> Iterator[List[List[Tuple[str, float]]]]:
+        """
+        Score column batches such as those from data_loader.iter_environmental_chunks.
+
+        Yields one list of per-environment results for every incoming chunk.
+        """
+        block_size = self.batch_chunk_size()
+        for chunk in chunks:
+            envs = env_matrix_from_columns(chunk)
+            results = []
+            for start in range(0, len(envs), block_size):
+                results.extend(self._predict_block(envs[start:start + block_size], top_n))
+            yield results
+
+    @timed('score_block')
+    def _predict_block(self, envs: np.ndarray, top_n: int) -> List[List[Tuple[str, float]]]:
+        count('scored_pairs', len(envs) * len(self.crop_data))
+        scores = score_matrix(envs, self.crop_matrix, self.weights)
+        best = top_n_indices(scores, top_n)
+        top_scores = np.take_along_axis(scores, best, axis=1).tolist()
+        if isinstance(self.crop_data, CropTable):
+            names = self.crop_data.names[best].tolist()
+        else:
+            names = [[self.crop_data[i].name for i in indices] for indices in best.tolist()]
+        return [list(zip(row_names, row_scores)) for row_names, row_scores in zip(names, top_scores)]
+ASSESS_RISK_RULES = RuleSet([
+    Rule((Condition('rainfall', '<', 100),), "Drought risk detected: Rainfall is too low."),
+    Rule((Condition('pest_risk', '>', 7),), "High pest risk detected."),
+    Rule((Condition('soil_ph', '<', 5.5), Condition('soil_ph', '>', 7.5)),
+         "Soil pH is outside optimal range for most crops."),
+], first_match=False)
+# The second rule can never fire (pest_risk > 7 implies > 5); kept to preserve behaviour
+PEST_SUGGESTION_RULES = RuleSet([
+    Rule((Condition('pest_risk', '>', 5),), ("Consider using pest-resistant crops.",
+                                             "Apply pest control measures (e.g., biological control or pesticides).")),
+    Rule((Condition('pest_risk', '>', 7),), ("Immediate pest control is required.",)),
+], first_match=True, default=())
 def assess_risks(self, env: EnvironmentalData) -> List[str]:
     """Assess potential risks based on environmental conditions."""
-    risks = []
-    if env.rainfall < 100:
-        risks.append("Drought risk detected: Rainfall is too low.")
-    if env.pest_risk > 7:
-        risks.append("High pest risk detected.")
-    if env.soil_ph < 5.5 or env.soil_ph > 7.5:
-        risks.append("Soil pH is outside optimal range for most crops.")
-    return risks
+    return ASSESS_RISK_RULES.evaluate(env)
 def pest_control_suggestions(self, env: EnvironmentalData) -> List[str]:
     """Provide suggestions for pest control based on pest risk."""
-    suggestions = []
-    if env.pest_risk > 5:
-        suggestions.append("Consider using pest-resistant crops.")
-        suggestions.append("Apply pest control measures (e.g., biological control or pesticides).")
-    elif env.pest_risk > 7:
-        suggestions.append("Immediate pest control is required.")
-    return suggestions
-    
\ No newline at end of file
+    return list(PEST_SUGGESTION_RULES.evaluate(env))
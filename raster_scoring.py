@@ -0,0 +1,266 @@
+"""
+Region-scale crop scoring over environmental rasters.
+
+A raster is a directory with one 2-D .npy file per ENV_FIELDS layer
+(temperature.npy, humidity.npy, ...), all of the same shape. Layers are
+memory mapped and scored tile by tile in a process pool; every cell gets
+its top-N crop indices and scores in two memory-mapped .npy outputs
+(H x W x N). Cells with a NaN in any layer are left at index -1 / NaN.
+
+Progress is tracked per tile in tiles_done.npy next to the outputs. A tile
+is only marked done after its outputs were flushed, so an interrupted job
+resumes with the remaining tiles when started again with the same inputs.
+
+Usage:
+    python raster_scoring.py synthetic bolge/ --height 4000 --width 2500
+    python raster_scoring.py score bolge/ sonuc/ --crops crops.csv --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from prediction_model import ENV_FIELDS, MAX_SCORE_BLOCK_BYTES, score_matrix, top_n_indices
+
+JOB_FILE = 'raster_job.json'
+INDICES_FILE = 'top_indices.npy'
+SCORES_FILE = 'top_scores.npy'
+DONE_FILE = 'tiles_done.npy'
+
+
+def layer_path(directory: str, field: str) -> str:
+    return os.path.join(directory, f"{field}.npy")
+
+
+def open_layers(directory: str) -> Dict[str, np.ndarray]:
+    """Read-only memory maps of the six layers, keyed by ENV_FIELDS."""
+    layers = {field: np.load(layer_path(directory, field), mmap_mode='r') for field in ENV_FIELDS}
+    shapes = {layer.shape for layer in layers.values()}
+    if len(shapes) != 1 or len(next(iter(shapes))) != 2:
+        raise ValueError(f"{directory}: layers must be 2-D arrays of the same shape, got {sorted(shapes)}")
+    return layers
+
+
+def iter_tiles(shape: Tuple[int, int], tile_size: int) -> Iterator[Tuple[int, int, slice, slice]]:
+    """(tile_row, tile_col, row_slice, col_slice) for every tile in row-major order."""
+    height, width = shape
+    for tile_row, top in enumerate(range(0, height, tile_size)):
+        for tile_col, left in enumerate(range(0, width, tile_size)):
+            yield tile_row, tile_col, slice(top, min(top + tile_size, height)), slice(left, min(left + tile_size, width))
+
+
+def job_fingerprint(layer_dir: str, crops: np.ndarray, weights: Dict[str, float], top_n: int,
+                    shape: Tuple[int, int], tile_size: int) -> str:
+    """Identifies a job (layer files, catalog, weights and tiling); a resumed job must match it exactly."""
+    digest = hashlib.sha256(np.ascontiguousarray(crops, dtype=np.float64).tobytes())
+    layers = [(os.stat(layer_path(layer_dir, field)).st_size, os.stat(layer_path(layer_dir, field)).st_mtime_ns)
+              for field in ENV_FIELDS]
+    digest.update(json.dumps([sorted(weights.items()), top_n, list(shape), tile_size, layers]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+@dataclass
+class RasterResult:
+    indices: np.ndarray  # (H, W, N) int32 memmap, -1 for nodata cells
+    scores: np.ndarray  # (H, W, N) float64 memmap, NaN for nodata cells
+    tiles_total: int
+    tiles_scored: int
+    tiles_skipped: int
+
+
+# Per-process state set up by _init_worker so tiles only carry their coordinates
+_worker: Dict = {}
+
+
+def _init_worker(layer_dir: str, output_dir: str, crops: np.ndarray, weights: Dict[str, float], top_n: int):
+    _worker.update(
+        layers=open_layers(layer_dir),
+        indices=np.load(os.path.join(output_dir, INDICES_FILE), mmap_mode='r+'),
+        scores=np.load(os.path.join(output_dir, SCORES_FILE), mmap_mode='r+'),
+        crops=crops,
+        weights=weights,
+        top_n=top_n,
+    )
+
+
+def _score_tile(tile: Tuple[int, int, slice, slice]) -> Tuple[int, int]:
+    tile_row, tile_col, rows, cols = tile
+    layers, crops, top_n = _worker['layers'], _worker['crops'], _worker['top_n']
+    envs = np.stack([np.asarray(layers[field][rows, cols], dtype=np.float64).ravel() for field in ENV_FIELDS], axis=1)
+    valid = np.flatnonzero(~np.isnan(envs).any(axis=1))
+    top_n = min(top_n, len(crops))
+    tile_indices = np.full((len(envs), _worker['indices'].shape[2]), -1, dtype=np.int32)
+    tile_scores = np.full((len(envs), _worker['scores'].shape[2]), np.nan)
+    block = max(1, MAX_SCORE_BLOCK_BYTES // (8 * max(1, len(crops))))
+    for start in range(0, len(valid), block):
+        cells = valid[start:start + block]
+        scores = score_matrix(envs[cells], crops, _worker['weights'])
+        best = top_n_indices(scores, top_n)
+        tile_indices[cells, :top_n] = best
+        tile_scores[cells, :top_n] = np.take_along_axis(scores, best, axis=1)
+
+    height, width = rows.stop - rows.start, cols.stop - cols.start
+    _worker['indices'][rows, cols] = tile_indices.reshape(height, width, -1)
+    _worker['scores'][rows, cols] = tile_scores.reshape(height, width, -1)
+    _worker['indices'].flush()
+    _worker['scores'].flush()
+    return tile_row, tile_col
+
+
+def _prepare_outputs(output_dir: str, shape: Tuple[int, int], tile_grid: Tuple[int, int], top_n: int,
+                     fingerprint: str, restart: bool) -> np.ndarray:
+    """Create the output arrays, or reuse them when they belong to the same job; returns the done markers."""
+    os.makedirs(output_dir, exist_ok=True)
+    job_path = os.path.join(output_dir, JOB_FILE)
+    if not restart and os.path.exists(job_path):
+        with open(job_path) as file:
+            job = json.load(file)
+        if job.get('fingerprint') != fingerprint:
+            raise ValueError(f"{output_dir} holds a different raster job; use restart=True to overwrite it")
+        return np.load(os.path.join(output_dir, DONE_FILE), mmap_mode='r+')
+
+    if os.path.exists(job_path):
+        os.unlink(job_path)
+    height, width = shape
+    indices = np.lib.format.open_memmap(os.path.join(output_dir, INDICES_FILE), mode='w+', dtype=np.int32,
+                                        shape=(height, width, top_n))
+    indices[:] = -1
+    indices.flush()
+    scores = np.lib.format.open_memmap(os.path.join(output_dir, SCORES_FILE), mode='w+', dtype=np.float64,
+                                       shape=(height, width, top_n))
+    scores[:] = np.nan
+    scores.flush()
+    done = np.lib.format.open_memmap(os.path.join(output_dir, DONE_FILE), mode='w+', dtype=np.uint8, shape=tile_grid)
+    done[:] = 0
+    done.flush()
+    # The job file is written last, so a job interrupted during setup is simply set up again
+    with open(job_path, 'w') as file:
+        json.dump({'fingerprint': fingerprint, 'shape': list(shape), 'tile_grid': list(tile_grid),
+                   'top_n': top_n}, file, indent=2)
+    return done
+
+
+def score_raster(layer_dir: str, output_dir: str, crops: np.ndarray, weights: Dict[str, float], top_n: int = 3,
+                 tile_size: int = 512, workers: Optional[int] = None, restart: bool = False,
+                 progress: Optional[Callable[[int, int], None]] = None) -> RasterResult:
+    """
+    Score every cell of a raster against a (C, 5) crop matrix.
+
+    Tiles already marked done in output_dir are skipped. progress, if given,
+    is called with (tiles done, tiles total) after every tile.
+    """
+    shape = next(iter(open_layers(layer_dir).values())).shape
+    tile_grid = (-(-shape[0] // tile_size), -(-shape[1] // tile_size))
+    fingerprint = job_fingerprint(layer_dir, crops, weights, top_n, shape, tile_size)
+    done = _prepare_outputs(output_dir, shape, tile_grid, top_n, fingerprint, restart)
+
+    pending = [tile for tile in iter_tiles(shape, tile_size) if not done[tile[0], tile[1]]]
+    total = tile_grid[0] * tile_grid[1]
+    skipped = total - len(pending)
+    completed = skipped
+
+    def mark(tile_row, tile_col):
+        nonlocal completed
+        done[tile_row, tile_col] = 1
+        done.flush()
+        completed += 1
+        if progress is not None:
+            progress(completed, total)
+
+    init_args = (layer_dir, output_dir, np.ascontiguousarray(crops, dtype=np.float64), dict(weights), top_n)
+    if not workers or workers <= 1:
+        _init_worker(*init_args)
+        try:
+            for tile in pending:
+                mark(*_score_tile(tile))
+        finally:
+            _worker.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+            tiles = iter(pending)
+            in_flight = set()
+            while True:
+                # A bounded number of submitted tiles keeps the parent's bookkeeping small for huge grids
+                for tile in tiles:
+                    in_flight.add(executor.submit(_score_tile, tile))
+                    if len(in_flight) >= 2 * workers:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    mark(*future.result())
+
+    return RasterResult(
+        indices=np.load(os.path.join(output_dir, INDICES_FILE), mmap_mode='r'),
+        scores=np.load(os.path.join(output_dir, SCORES_FILE), mmap_mode='r'),
+        tiles_total=total,
+        tiles_scored=len(pending),
+        tiles_skipped=skipped,
+    )
+
+
+def write_synthetic_layers(directory: str, height: int, width: int, seed: int = 0, workers: Optional[int] = None):
+    """Fill a raster directory with synthetic_data environmental readings, streamed shard by shard."""
+    from synthetic_data import iter_shards
+
+    os.makedirs(directory, exist_ok=True)
+    layers = {field: np.lib.format.open_memmap(layer_path(directory, field), mode='w+', dtype=np.float64,
+                                               shape=(height, width)) for field in ENV_FIELDS}
+    flat = {field: layer.reshape(-1) for field, layer in layers.items()}
+    offset = 0
+    for shard in iter_shards('environmental', height * width, seed, workers=workers):
+        count = len(shard[ENV_FIELDS[0]])
+        for field in ENV_FIELDS:
+            flat[field][offset:offset + count] = shard[field]
+        offset += count
+    for layer in layers.values():
+        layer.flush()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Best-crop maps for environmental rasters.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    score = commands.add_parser('score', help="score a raster directory")
+    score.add_argument('layers', help="directory with one .npy layer per environmental field")
+    score.add_argument('output', help="directory for top_indices.npy / top_scores.npy")
+    score.add_argument('--crops', default='crops.csv')
+    score.add_argument('--top-n', type=int, default=3)
+    score.add_argument('--tile-size', type=int, default=512)
+    score.add_argument('--workers', type=int, default=0, help="worker processes (0: one per CPU)")
+    score.add_argument('--restart', action='store_true', help="discard earlier progress in the output directory")
+    synthetic = commands.add_parser('synthetic', help="write synthetic layers for testing")
+    synthetic.add_argument('layers')
+    synthetic.add_argument('--height', type=int, required=True)
+    synthetic.add_argument('--width', type=int, required=True)
+    synthetic.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'synthetic':
+        write_synthetic_layers(args.layers, args.height, args.width, args.seed)
+        print(f"{args.layers}: {args.height}x{args.width} katman yazıldı")
+        return 0
+
+    from data_loader import load_crop_data
+    from prediction_model import CropPredictionModel
+
+    model = CropPredictionModel(load_crop_data(args.crops))
+
+    def report(done, total):
+        print(f"\r{done}/{total} karo", end='', file=sys.stderr, flush=True)
+
+    result = model.score_raster(args.layers, args.output, top_n=args.top_n, tile_size=args.tile_size,
+                                workers=args.workers or os.cpu_count(), restart=args.restart, progress=report)
+    print(file=sys.stderr)
+    print(f"{result.tiles_scored} karo skorlandı, {result.tiles_skipped} karo daha önce tamamlanmıştı")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,79 @@
 """
 Generates detailed recommendations based on predictions.
 """
-from typing import Dict, List
+from typing import Dict, List, Sequence, Union
+import numpy as np
 from data_loader import EnvironmentalData
-from prediction_model import CropPredictionModel
+from instrumentation import timed
+from prediction_model import ENV_FIELDS, CropPredictionModel, env_matrix
+from rules import Condition, Rule, RuleSet
+from tables import ReadingTable
+
+IRRIGATION_RULES = RuleSet([
+    Rule((Condition('soil_moisture', '<', 0.3),), {'frequency': 'high', 'amount': 'moderate'}),
+    Rule((Condition('soil_moisture', '<', 0.6),), {'frequency': 'moderate', 'amount': 'moderate'}),
+    Rule((), {'frequency': 'low', 'amount': 'low'}),
+], first_match=True)
+
+PEST_CONTROL_RULES = RuleSet([
+    Rule((Condition('pest_risk', '>', 7),), ("Immediate pest control measures required",)),
+    Rule((Condition('pest_risk', '>', 4),), ("Monitor pest situation closely",)),
+], first_match=True, default=())
+
+RISK_RULES = RuleSet([
+    Rule((Condition('temperature', '>', 35),), "High temperature risk"),
+    Rule((Condition('humidity', '>', 80),), "Disease risk due to high humidity"),
+    Rule((Condition('soil_moisture', '<', 0.2),), "Drought risk"),
+], first_match=False)
 
 class RecommendationEngine:
     def __init__(self, model: CropPredictionModel):
         self.model = model
 
+    @timed('generate_recommendations')
     def generate_recommendations(self, env: EnvironmentalData) -> Dict:
         best_crops = self.model.predict_best_crops(env)
-        
+        return self._build_recommendations(env, best_crops)
+
+    @timed('generate_recommendations_batch')
+    def generate_recommendations_batch(self, envs: Union[Sequence[EnvironmentalData], ReadingTable]) -> List[Dict]:
+        """generate_recommendations for many environments, scoring all crops in one vectorized pass."""
+        best_crops = self.model.predict_best_crops_batch(envs)
+        codes = self.evaluate_rules_batch(envs if isinstance(envs, ReadingTable) else env_matrix(envs))
+        irrigation = IRRIGATION_RULES.decode_batch(codes['irrigation_schedule'])
+        pest_control = PEST_CONTROL_RULES.decode_batch(codes['pest_control'])
+        risks = RISK_RULES.decode_batch(codes['risk_assessment'])
+        return [
+            {
+                'crop_recommendations': crops,
+                'irrigation_schedule': dict(irrigation[i]),
+                'pest_control': list(pest_control[i]),
+                'risk_assessment': list(risks[i])
+            }
+            for i, crops in enumerate(best_crops)
+        ]
+
+    @staticmethod
+    @timed('evaluate_rules_batch')
+    def evaluate_rules_batch(envs: Union[np.ndarray, ReadingTable]) -> Dict[str, np.ndarray]:
+        """
+        Apply the irrigation, pest control and risk rules to an (E, 6) env matrix or a ReadingTable.
+
+        Returns rule codes per reading: the matching rule index for irrigation
+        and pest control, a bitmask of matched rules for risks. Use the
+        *_RULES.decode_batch helpers to turn codes into the usual strings.
+        """
+        if isinstance(envs, ReadingTable):
+            columns = envs.columns
+        else:
+            columns = {field: envs[:, i] for i, field in enumerate(ENV_FIELDS)}
+        return {
+            'irrigation_schedule': IRRIGATION_RULES.evaluate_batch(columns),
+            'pest_control': PEST_CONTROL_RULES.evaluate_batch(columns),
+            'risk_assessment': RISK_RULES.evaluate_batch(columns),
+        }
+
+    def _build_recommendations(self, env: EnvironmentalData, best_crops) -> Dict:
         recommendations = {
             'crop_recommendations': best_crops,
             'irrigation_schedule': self._get_irrigation_schedule(env),
@@ -22,27 +84,10 @@ class RecommendationEngine:
         return recommendations
 
     def _get_irrigation_schedule(self, env: EnvironmentalData) -> Dict:
-        if env.soil_moisture < 0.3:
-            return {'frequency': 'high', 'amount': 'moderate'}
-        elif env.soil_moisture < 0.6:
-            return {'frequency': 'moderate', 'amount': 'moderate'}
-        else:
-            return {'frequency': 'low', 'amount': 'low'}
+        return dict(IRRIGATION_RULES.evaluate(env))
 
     def _get_pest_control_recommendations(self, env: EnvironmentalData) -> List[str]:
-        recommendations = []
-        if env.pest_risk > 7:
-            recommendations.append("Immediate pest control measures required")
-        elif env.pest_risk > 4:
-            recommendations.append("Monitor pest situation closely")
-        return recommendations
+        return list(PEST_CONTROL_RULES.evaluate(env))
 
     def _assess_risks(self, env: EnvironmentalData) -> List[str]:
-        risks = []
-        if env.temperature > 35:
-            risks.append("High temperature risk")
-        if env.humidity > 80:
-            risks.append("Disease risk due to high humidity")
-        if env.soil_moisture < 0.2:
-            risks.append("Drought risk")
-        return risks
\ No newline at end of file
+        return RISK_RULES.evaluate(env)
@@ -0,0 +1,180 @@
+"""
+Bounded LRU cache for recommendation results.
+
+Readings from nearby fields are often nearly identical, so results are
+cached under the environment rounded to a per-field number of decimals
+(negative values round to tens, hundreds, ...) plus the crop catalog
+version. Entries expire after `ttl` seconds and the least recently used
+entry is evicted once `max_entries` is reached.
+
+All readings that round to the same key share the result computed for the
+first of them; cached results are shared objects and must not be modified.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from data_loader import EnvironmentalData
+from instrumentation import count
+from prediction_model import ENV_FIELDS
+
+# Decimals kept per field when building cache keys
+DEFAULT_PRECISION: Dict[str, int] = {
+    'temperature': 1,
+    'humidity': 0,
+    'rainfall': 0,
+    'soil_ph': 1,
+    'soil_moisture': 2,
+    'pest_risk': 0,
+}
+
+_MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResultCache:
+    """Thread-safe LRU mapping with a per-entry time to live."""
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] < self.clock():
+                del self._entries[key]
+                self._stats.expirations += 1
+                entry = _MISSING
+            if entry is _MISSING:
+                self._stats.misses += 1
+                count('result_cache_misses')
+                return default
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+        count('result_cache_hits')
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        expires = self.clock() + self.ttl if self.ttl is not None else float('inf')
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Cached value for key, computing and storing it on a miss.
+
+        compute runs outside the lock, so concurrent misses on the same key
+        may each compute the value once.
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._stats.hits, self._stats.misses, self._stats.evictions,
+                              self._stats.expirations, len(self._entries))
+
+
+def model_catalog_version(model) -> str:
+    """Short fingerprint of a model's crop catalog and weights, used as the default catalog version."""
+    digest = hashlib.sha256(model.crop_matrix.tobytes())
+    digest.update(repr(sorted(model.weights.items())).encode('utf-8'))
+    digest.update('\0'.join(crop.name for crop in model.crop_data).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class CachedRecommendationEngine:
+    """
+    RecommendationEngine front end that serves repeated readings from a ResultCache.
+
+    Set catalog_version whenever the engine's catalog or weights change;
+    entries of older versions then stop matching and age out. Engines that
+    track their own catalog_version (crop_catalog.CatalogRecommendationEngine)
+    are followed automatically.
+    """
+
+    def __init__(self, engine, cache: Optional[ResultCache] = None, precision: Optional[Dict[str, int]] = None,
+                 catalog_version: Optional[Hashable] = None):
+        self.engine = engine
+        self.cache = cache if cache is not None else ResultCache()
+        self.precision = dict(DEFAULT_PRECISION, **(precision or {}))
+        if catalog_version is None and not hasattr(engine, 'catalog_version'):
+            catalog_version = model_catalog_version(engine.model)
+        self._catalog_version = catalog_version
+        self._digits = [self.precision[field] for field in ENV_FIELDS]
+
+    @property
+    def model(self):
+        return self.engine.model
+
+    @property
+    def catalog_version(self) -> Hashable:
+        return self._catalog_version if self._catalog_version is not None else self.engine.catalog_version
+
+    @catalog_version.setter
+    def catalog_version(self, version: Hashable):
+        self._catalog_version = version
+
+    def key(self, env: EnvironmentalData) -> Tuple:
+        return tuple(round(getattr(env, field), digits) for field, digits in zip(ENV_FIELDS, self._digits)) + (
+            self.catalog_version,)
+
+    def generate_recommendations(self, env: EnvironmentalData) -> Dict:
+        return self.cache.get_or_compute(self.key(env), lambda: self.engine.generate_recommendations(env))
+
+    def generate_recommendations_batch(self, envs: Sequence[EnvironmentalData]) -> List[Dict]:
+        """Cached results where available; all misses are scored in one batch call."""
+        envs = list(envs)
+        keys = [self.key(env) for env in envs]
+        results = [self.cache.get(key, _MISSING) for key in keys]
+        # Misses sharing a key are computed once
+        pending: Dict[Tuple, List[int]] = {}
+        for position, result in enumerate(results):
+            if result is _MISSING:
+                pending.setdefault(keys[position], []).append(position)
+        if pending:
+            computed = self.engine.generate_recommendations_batch([envs[positions[0]] for positions in pending.values()])
+            for (key, positions), result in zip(pending.items(), computed):
+                self.cache.put(key, result)
+                for position in positions:
+                    results[position] = result
+        return results
+
+    def stats(self) -> CacheStats:
+        return self.cache.stats()
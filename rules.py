@@ -0,0 +1,96 @@
+"""
+Declarative threshold rules over environmental readings.
+
+A RuleSet is an ordered table of rules. First-match tables behave like an
+if/elif chain and evaluate to the index of the matching rule; all-match
+tables behave like independent ifs and evaluate to a bitmask. The same
+table serves single readings (returning the rule values directly) and
+arrays of readings (returning codes, decoded to values only on request).
+"""
+import operator
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+
+@dataclass(frozen=True)
+class Condition:
+    field: str
+    op: str
+    threshold: float
+
+    def test(self, env) -> bool:
+        return _OPERATORS[self.op](getattr(env, self.field), self.threshold)
+
+    def test_batch(self, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        return _OPERATORS[self.op](np.asarray(columns[self.field]), self.threshold)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Matches when any of its conditions holds; a rule without conditions always matches."""
+    when: Tuple[Condition, ...]
+    value: Any
+
+    def test(self, env) -> bool:
+        return not self.when or any(condition.test(env) for condition in self.when)
+
+    def test_batch(self, columns: Mapping[str, np.ndarray], size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool) if self.when else np.ones(size, dtype=bool)
+        for condition in self.when:
+            mask |= condition.test_batch(columns)
+        return mask
+
+
+class RuleSet:
+    def __init__(self, rules: Sequence[Rule], first_match: bool, default: Any = None):
+        self.rules = tuple(rules)
+        self.first_match = first_match
+        self.default = default
+        if not first_match and len(self.rules) > 63:
+            raise ValueError("all-match rule sets are limited to 63 rules per bitmask")
+
+    def evaluate(self, env) -> Any:
+        """Value of the first matching rule, or the list of values of all matching rules."""
+        if self.first_match:
+            return next((rule.value for rule in self.rules if rule.test(env)), self.default)
+        return [rule.value for rule in self.rules if rule.test(env)]
+
+    def evaluate_batch(self, columns: Mapping[str, np.ndarray]) -> np.ndarray:
+        """
+        Codes for every reading in a column batch.
+
+        First-match sets return the index of the matching rule (len(rules)
+        when none matched); all-match sets return a bitmask with bit i set
+        when rule i matched.
+        """
+        size = len(np.asarray(next(iter(columns.values()))))
+        if self.first_match:
+            codes = np.full(size, len(self.rules), dtype=np.int8)
+            for index in range(len(self.rules) - 1, -1, -1):
+                codes[self.rules[index].test_batch(columns, size)] = index
+            return codes
+        mask = np.zeros(size, dtype=np.uint64)
+        for index, rule in enumerate(self.rules):
+            mask |= rule.test_batch(columns, size).astype(np.uint64) << np.uint64(index)
+        return mask
+
+    def decode(self, code) -> Any:
+        """Rule value(s) for one code returned by evaluate_batch."""
+        code = int(code)
+        if self.first_match:
+            return self.rules[code].value if code < len(self.rules) else self.default
+        return [rule.value for index, rule in enumerate(self.rules) if code >> index & 1]
+
+    def decode_batch(self, codes: np.ndarray) -> List[Any]:
+        # Identical codes share one decoded value, so decoding costs one lookup per reading
+        table: Dict[int, Any] = {}
+        values = []
+        for code in codes.tolist():
+            if code not in table:
+                table[code] = self.decode(code)
+            values.append(table[code])
+        return values
@@ -0,0 +1,201 @@
+"""
+Precomputed top-K lookup table for predict_best_crops.
+
+Scores depend on temperature, humidity, rainfall, soil pH and pest risk
+(soil moisture does not enter the score). The table quantizes these five
+inputs into a regular grid and stores, for every cell, the K best crops
+scored at the cell centre together with the (K+1)-th best centre score.
+
+Within a cell no crop's score can differ from its centre score by more
+than
+
+    max_error = sum(|w_i| / scale_i * step_i / 2) + |w_pest| * max|pest_resistance| / 100 * step_pest / 2
+
+over the four distance terms (scales 50, 100, 1000, 14) plus the pest
+term. CropPredictionModel rescores the K stored crops exactly at the query
+point; if the N-th of them still beats every crop that was left out
+(centre cutoff plus max_error), the answer is exact. Otherwise, or when
+the query falls outside the grid, it falls back to a full scan. Results
+are therefore always identical to the full scan.
+
+A lookup is one index computation plus K exact scores, independent of
+catalog size. How often it succeeds depends on the gaps between crop
+scores: with the 100-crop catalog and the default grid, K=16 answers about
+95% of top-3 queries. Dense catalogs of thousands of crops have gaps well
+below max_error and mostly fall back; combine the table with build_index
+there, which then serves the fallbacks. Building costs one score per cell
+and crop.
+"""
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from prediction_model import MAX_SCORE_BLOCK_BYTES, score_matrix, top_n_indices
+
+LUT_FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+CANDIDATES_FILE = 'candidates.npy'
+CUTOFF_FILE = 'cutoff.npy'
+
+# Env matrix columns (ENV_FIELDS order) covered by the grid, and their field names
+GRID_COLUMNS = (0, 1, 2, 3, 5)
+GRID_FIELDS = ('temperature', 'humidity', 'rainfall', 'soil_ph', 'pest_risk')
+
+# Slack absorbing rounding differences between the bound and exact scores
+_BOUND_EPSILON = 1e-9
+
+
+@dataclass(frozen=True)
+class GridAxis:
+    low: float
+    high: float
+    step: float
+
+    @property
+    def cells(self) -> int:
+        return max(1, int(np.ceil((self.high - self.low) / self.step - 1e-9)))
+
+    def centres(self) -> np.ndarray:
+        return self.low + (np.arange(self.cells) + 0.5) * self.step
+
+
+# temperature, humidity, rainfall, soil_ph, pest_risk: 25 * 20 * 20 * 10 * 10 = 1M cells
+DEFAULT_GRID = (
+    GridAxis(0, 50, 2),
+    GridAxis(0, 100, 5),
+    GridAxis(0, 500, 25),
+    GridAxis(4, 9, 0.5),
+    GridAxis(0, 10, 1),
+)
+
+
+def max_score_error(crops: np.ndarray, weights: Dict[str, float], grid=DEFAULT_GRID) -> float:
+    """Largest possible difference between a crop's score anywhere in a cell and at its centre."""
+    slopes = [abs(weights[key]) / scale for key, scale in
+              (('temperature', 50), ('humidity', 100), ('water', 1000), ('ph', 14))]
+    max_resistance = float(np.abs(crops[:, 4]).max()) if len(crops) else 0.0
+    slopes.append(abs(weights['pest']) * max_resistance / 100)
+    return float(sum(slope * axis.step / 2 for slope, axis in zip(slopes, grid)))
+
+
+def catalog_fingerprint(crops: np.ndarray, weights: Dict[str, float], grid, candidates: int) -> str:
+    digest = hashlib.sha256(np.ascontiguousarray(crops, dtype=np.float64).tobytes())
+    spec = [sorted(weights.items()), [[axis.low, axis.high, axis.step] for axis in grid], candidates]
+    digest.update(json.dumps(spec).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ScoreLUT:
+    def __init__(self, crops: np.ndarray, weights: Dict[str, float], grid, candidates: np.ndarray,
+                 cutoff: np.ndarray, fingerprint: str):
+        self.crops = np.ascontiguousarray(crops, dtype=np.float64)
+        self.weights = dict(weights)
+        self.grid = tuple(grid)
+        self.candidates = candidates  # (*cells, K) crop indices of the K best at the centre, ascending
+        self.cutoff = cutoff  # (*cells,) (K+1)-th best centre score, -inf when every crop is stored
+        self.fingerprint = fingerprint
+        self.max_error = max_score_error(self.crops, self.weights, self.grid)
+        self._lows = [axis.low for axis in self.grid]
+        self._steps = [axis.step for axis in self.grid]
+        self._cells = [axis.cells for axis in self.grid]
+        # Plain ndarray views of the (possibly memory-mapped) tables, flattened to one row per cell
+        self._candidates = np.asarray(candidates).reshape(-1, candidates.shape[-1])
+        self._cutoff = np.asarray(cutoff).reshape(-1)
+        self.hits = 0
+        self.fallbacks = 0
+
+    @property
+    def depth(self) -> int:
+        return self.candidates.shape[-1]
+
+    @classmethod
+    def build(cls, crops: np.ndarray, weights: Dict[str, float], grid=DEFAULT_GRID, candidates: int = 16) -> 'ScoreLUT':
+        """Score every cell centre against the catalog and keep the best `candidates` crops."""
+        crops = np.ascontiguousarray(crops, dtype=np.float64)
+        grid = tuple(grid)
+        shape = tuple(axis.cells for axis in grid)
+        depth = min(candidates, len(crops))
+        # int16 halves the table for catalogs of up to 32767 crops
+        stored = np.empty(shape + (depth,), dtype=np.int16 if len(crops) <= np.iinfo(np.int16).max else np.int32)
+        cutoff = np.full(shape, -np.inf)
+        flat_stored, flat_cutoff = stored.reshape(-1, depth), cutoff.reshape(-1)
+
+        centres = np.meshgrid(*[axis.centres() for axis in grid], indexing='ij')
+        centres = np.column_stack([centre.ravel() for centre in centres])
+        block = max(1, MAX_SCORE_BLOCK_BYTES // (8 * max(1, len(crops))))
+        for start in range(0, len(centres), block):
+            envs = np.zeros((len(centres[start:start + block]), 6))
+            envs[:, GRID_COLUMNS] = centres[start:start + block]
+            scores = score_matrix(envs, crops, weights)
+            best = top_n_indices(scores, depth + 1)
+            flat_stored[start:start + len(envs)] = np.sort(best[:, :depth], axis=1)
+            if best.shape[1] > depth:
+                flat_cutoff[start:start + len(envs)] = np.take_along_axis(scores, best[:, depth:], axis=1)[:, 0]
+        return cls(crops, weights, grid, stored, cutoff, catalog_fingerprint(crops, weights, grid, depth))
+
+    def save(self, path: str):
+        """Write the table to a directory, replacing any earlier table there."""
+        tmp = path + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, CANDIDATES_FILE), self.candidates)
+        np.save(os.path.join(tmp, CUTOFF_FILE), self.cutoff)
+        meta = {
+            'version': LUT_FORMAT_VERSION,
+            'fingerprint': self.fingerprint,
+            'grid': [[axis.low, axis.high, axis.step] for axis in self.grid],
+            'candidates': self.depth,
+            'crops': len(self.crops),
+            'max_error': self.max_error,
+        }
+        with open(os.path.join(tmp, META_FILE), 'w') as file:
+            json.dump(meta, file, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, crops: np.ndarray, weights: Dict[str, float]) -> Optional['ScoreLUT']:
+        """Memory-map a saved table; None if it is missing or was built for another catalog or weights."""
+        try:
+            with open(os.path.join(path, META_FILE)) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != LUT_FORMAT_VERSION:
+            return None
+        grid = tuple(GridAxis(*axis) for axis in meta['grid'])
+        if catalog_fingerprint(crops, weights, grid, meta['candidates']) != meta['fingerprint']:
+            return None
+        return cls(crops, weights, grid,
+                   np.load(os.path.join(path, CANDIDATES_FILE), mmap_mode='r'),
+                   np.load(os.path.join(path, CUTOFF_FILE), mmap_mode='r'),
+                   meta['fingerprint'])
+
+    def cell(self, env) -> Optional[int]:
+        """Flat grid cell of an EnvironmentalData, or None outside the grid."""
+        flat = 0
+        for field, low, step, cells in zip(GRID_FIELDS, self._lows, self._steps, self._cells):
+            position = (getattr(env, field) - low) / step
+            if not 0 <= position <= cells:  # also rejects NaN
+                return None
+            flat = flat * cells + min(int(position), cells - 1)
+        return flat
+
+    def lookup(self, env, top_n: int) -> Optional[Tuple[List[int], float]]:
+        """
+        Stored candidate crop indices (ascending) for env and the score bound they must beat.
+
+        If the top_n best candidates, scored exactly, all score above the
+        bound, they are the exact top_n of the whole catalog. Returns None
+        when env is outside the grid or top_n exceeds the stored depth.
+        """
+        cell = self.cell(env)
+        if cell is None or top_n > self.depth:
+            self.fallbacks += 1
+            return None
+        return self._candidates[cell].tolist(), float(self._cutoff[cell]) + self.max_error + _BOUND_EPSILON
@@ -0,0 +1,372 @@
+"""
+Continuous sensor ingestion with windowed aggregation.
+
+Readings flow source -> bounded queue -> per-field ring buffer. At every
+emit interval the fields that received data are aggregated (rolling mean,
+min and max over the last `window` readings) and the means are fed to
+RecommendationEngine and the sensor range check in one batched call each.
+Sources produce batches of readings, so nothing downstream of parsing runs
+per reading.
+
+Sensors report independently. A sensor that stayed silent for the whole
+window is aggregated as its last reported value. A field is only scored
+once every ENV_FIELDS sensor has reported at least once; until then its
+recommendations entry is None.
+
+Readings are JSON objects with a `field_id` and any of READING_FIELDS, e.g.
+    {"field_id": "tarla-7", "temperature": 24.1, "humidity": 61, "light": 900}
+"""
+import asyncio
+import json
+import os
+import time
+import warnings
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from data_loader import EnvironmentalData
+from instrumentation import count
+from prediction_model import ENV_FIELDS
+
+READING_FIELDS = ENV_FIELDS + ('light',)
+ENV_COLUMNS = [READING_FIELDS.index(field) for field in ENV_FIELDS]
+
+# analyze_sensor_data parameters and the reading fields they are checked against
+SENSOR_PARAM_FIELDS = {'Temperature': 'temperature', 'Humidity': 'humidity', 'Soil_pH': 'soil_ph', 'Light': 'light'}
+
+
+@dataclass
+class ReadingBatch:
+    field_ids: List[str]
+    values: np.ndarray  # (n, len(READING_FIELDS)), NaN where a sensor did not report
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> 'ReadingBatch':
+        records = list(records)
+        values = np.array(
+            [[record.get(field, np.nan) for field in READING_FIELDS] for record in records], dtype=np.float64
+        ).reshape(-1, len(READING_FIELDS))
+        return cls([str(record['field_id']) for record in records], values)
+
+    def __len__(self):
+        return len(self.field_ids)
+
+
+@dataclass
+class WindowAggregate:
+    field_ids: List[str]
+    mean: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    count: np.ndarray
+
+    def complete(self) -> np.ndarray:
+        """Mask of the fields with a value for every ENV_FIELDS column."""
+        return np.isfinite(self.mean[:, ENV_COLUMNS]).all(axis=1)
+
+    def environmental_data(self, rows: Optional[np.ndarray] = None) -> List[EnvironmentalData]:
+        """Window means as EnvironmentalData, for all fields or only the given rows."""
+        mean = self.mean if rows is None else self.mean[rows]
+        columns = [mean[:, column].tolist() for column in ENV_COLUMNS]
+        return [EnvironmentalData(*values) for values in zip(*columns)]
+
+
+@dataclass
+class PipelineUpdate:
+    aggregate: WindowAggregate
+    # One entry per aggregate field; None for fields still missing an environment sensor
+    recommendations: Optional[List[Optional[Dict]]] = None
+    sensor_alerts: Optional[object] = None
+
+
+class RingBuffer:
+    """Last `window` readings for up to `max_fields` fields, in one preallocated array."""
+
+    def __init__(self, max_fields: int = 10000, window: int = 60):
+        self.max_fields = max_fields
+        self.window = window
+        self.data = np.full((max_fields, window, len(READING_FIELDS)), np.nan)
+        self.last = np.full((max_fields, len(READING_FIELDS)), np.nan)
+        self.head = np.zeros(max_fields, dtype=np.int64)
+        self.filled = np.zeros(max_fields, dtype=np.int64)
+        self.dirty = np.zeros(max_fields, dtype=bool)
+        self.slots: Dict[str, int] = {}
+        self.field_ids: List[str] = []
+        self.dropped = 0
+
+    def _slots_for(self, field_ids: List[str]) -> np.ndarray:
+        slots = np.empty(len(field_ids), dtype=np.int64)
+        for i, field_id in enumerate(field_ids):
+            slot = self.slots.get(field_id)
+            if slot is None:
+                if len(self.field_ids) >= self.max_fields:
+                    slot = -1
+                else:
+                    slot = self.slots[field_id] = len(self.field_ids)
+                    self.field_ids.append(field_id)
+            slots[i] = slot
+        return slots
+
+    def append(self, batch: ReadingBatch):
+        slots = self._slots_for(batch.field_ids)
+        known = slots >= 0
+        self.dropped += int((~known).sum())
+        slots, values = slots[known], batch.values[known]
+        if not len(slots):
+            return
+
+        # Position of each reading among the batch's readings for the same field
+        order = np.argsort(slots, kind='stable')
+        sorted_slots = slots[order]
+        starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+        counts = np.diff(np.r_[starts, len(sorted_slots)])
+        rank = np.arange(len(sorted_slots)) - np.repeat(starts, counts)
+        total = np.repeat(counts, counts)
+        # Only the newest `window` readings of a field can survive this batch
+        keep = rank >= total - self.window
+        target_slots = sorted_slots[keep]
+        positions = (self.head[target_slots] + rank[keep]) % self.window
+        ordered = values[order]
+        self.data[target_slots, positions] = ordered[keep]
+
+        # Newest reported value of every sensor, used when a sensor is silent for a whole window
+        for column in range(len(READING_FIELDS)):
+            present = ~np.isnan(ordered[:, column])
+            column_slots = sorted_slots[present]
+            if len(column_slots):
+                newest = np.r_[column_slots[1:] != column_slots[:-1], True]
+                self.last[column_slots[newest], column] = ordered[present, column][newest]
+
+        unique_slots = sorted_slots[starts]
+        self.head[unique_slots] = (self.head[unique_slots] + counts) % self.window
+        self.filled[unique_slots] = np.minimum(self.filled[unique_slots] + counts, self.window)
+        self.dirty[unique_slots] = True
+
+    def aggregate(self, only_dirty: bool = True) -> WindowAggregate:
+        """
+        Rolling mean/min/max per field; clears the dirty flags of the returned fields.
+
+        Sensors without a reading in the window take their last reported
+        value; sensors that never reported stay NaN.
+        """
+        slots = np.flatnonzero(self.dirty if only_dirty else self.filled > 0)
+        window = self.data[slots]
+        last = self.last[slots]
+        with warnings.catch_warnings():
+            # nan* functions warn about sensors that never reported in the window
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mean = np.nanmean(window, axis=1)
+            minimum = np.nanmin(window, axis=1)
+            maximum = np.nanmax(window, axis=1)
+        silent = np.isnan(mean)
+        aggregate = WindowAggregate(
+            field_ids=[self.field_ids[slot] for slot in slots],
+            mean=np.where(silent, last, mean),
+            minimum=np.where(silent, last, minimum),
+            maximum=np.where(silent, last, maximum),
+            count=self.filled[slots].copy(),
+        )
+        self.dirty[slots] = False
+        return aggregate
+
+
+class SimulatedSource:
+    """Seeded random readings for tests and load experiments."""
+
+    def __init__(self, n_fields: int = 100, batch_size: int = 1000, batches: Optional[int] = None,
+                 interval: float = 0.0, seed: int = 0):
+        self.n_fields = n_fields
+        self.batch_size = batch_size
+        self.batches = batches
+        self.interval = interval
+        self.seed = seed
+
+    async def __aiter__(self) -> AsyncIterator[ReadingBatch]:
+        rng = np.random.default_rng(self.seed)
+        low = np.array([15, 30, 100, 5.5, 0.1, 1, 200])
+        high = np.array([35, 90, 300, 7.5, 0.8, 9, 2000])
+        produced = 0
+        while self.batches is None or produced < self.batches:
+            fields = rng.integers(0, self.n_fields, self.batch_size)
+            values = rng.uniform(low, high, (self.batch_size, len(READING_FIELDS)))
+            yield ReadingBatch([f"tarla-{field}" for field in fields.tolist()], values)
+            produced += 1
+            await asyncio.sleep(self.interval)
+
+
+class FileTailSource:
+    """Follows a JSON-lines file like `tail -f`, yielding whatever lines were appended."""
+
+    def __init__(self, path: str, batch_size: int = 1000, poll_interval: float = 0.2, from_start: bool = False):
+        self.path = path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.from_start = from_start
+
+    async def __aiter__(self) -> AsyncIterator[ReadingBatch]:
+        with open(self.path, 'r') as file:
+            if not self.from_start:
+                file.seek(0, os.SEEK_END)
+            pending = ''
+            while True:
+                records = []
+                while len(records) < self.batch_size:
+                    line = file.readline()
+                    if not line:
+                        break
+                    pending += line
+                    if not pending.endswith('\n'):
+                        break  # partial line, the writer is not done with it yet
+                    records.extend(_parse_lines(pending))
+                    pending = ''
+                if records:
+                    yield ReadingBatch.from_records(records)
+                else:
+                    await asyncio.sleep(self.poll_interval)
+
+
+class SocketSource:
+    """
+    Accepts JSON-lines readings on a local Unix socket.
+
+    Connections stop being read while the internal queue is full, so slow
+    consumers push back on the senders instead of growing memory.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000, max_pending: int = 100000, linger: float = 0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.linger = linger
+        self._records: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            async for line in reader:
+                for record in _parse_lines(line.decode('utf-8')):
+                    await self._records.put(record)
+        finally:
+            writer.close()
+
+    async def __aiter__(self) -> AsyncIterator[ReadingBatch]:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        try:
+            while True:
+                records = [await self._records.get()]
+                deadline = time.monotonic() + self.linger
+                while len(records) < self.batch_size and time.monotonic() < deadline:
+                    try:
+                        records.append(self._records.get_nowait())
+                    except asyncio.QueueEmpty:
+                        await asyncio.sleep(0)
+                        if self._records.empty():
+                            break
+                yield ReadingBatch.from_records(records)
+        finally:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+def _parse_lines(text: str) -> List[Dict]:
+    records = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and 'field_id' in record:
+            records.append(record)
+    return records
+
+
+class SensorPipeline:
+    """
+    Runs ingestion and aggregation as two asyncio tasks joined by a bounded queue.
+
+    engine (a RecommendationEngine) and range_table (an ana.SensorRangeTable
+    with crop_for_field mapping field ids to crop names) are both optional;
+    fields whose crop is None or not in range_table get no alerts.
+    on_update receives a PipelineUpdate for every emit with new data.
+    """
+
+    def __init__(self, source, engine=None, range_table=None, crop_for_field: Optional[Callable[[str], str]] = None,
+                 window: int = 60, max_fields: int = 10000, queue_size: int = 64, emit_interval: float = 1.0,
+                 on_update: Optional[Callable[[PipelineUpdate], None]] = None):
+        self.source = source
+        self.engine = engine
+        self.range_table = range_table
+        self.crop_for_field = crop_for_field
+        self.buffer = RingBuffer(max_fields=max_fields, window=window)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.emit_interval = emit_interval
+        self.on_update = on_update
+        self.readings = 0
+
+    async def _ingest(self):
+        try:
+            async for batch in self.source:
+                # Blocks while the queue is full, which in turn stops the source from reading
+                await self.queue.put(batch)
+        finally:
+            await self.queue.put(None)
+
+    async def _aggregate(self):
+        loop = asyncio.get_running_loop()
+        next_emit = loop.time() + self.emit_interval
+        finished = False
+        getter = None
+        while not finished:
+            # The pending get() survives a timeout, so no batch is lost between emits
+            if getter is None:
+                getter = loop.create_task(self.queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=max(0.0, next_emit - loop.time()))
+            batch = ()
+            if done:
+                batch, getter = getter.result(), None
+            if batch is None:
+                finished = True
+            elif batch:
+                self.buffer.append(batch)
+                self.readings += len(batch)
+            if finished or loop.time() >= next_emit:
+                await self.emit()
+                next_emit = loop.time() + self.emit_interval
+
+    async def emit(self) -> Optional[PipelineUpdate]:
+        """Aggregate fields that received readings since the last emit and score them."""
+        aggregate = self.buffer.aggregate()
+        if not aggregate.field_ids:
+            return None
+        update = PipelineUpdate(aggregate)
+        if self.engine is not None:
+            rows = np.flatnonzero(aggregate.complete())
+            update.recommendations = [None] * len(aggregate.field_ids)
+            if len(rows):
+                loop = asyncio.get_running_loop()
+                results = await loop.run_in_executor(None, self.engine.generate_recommendations_batch,
+                                                     aggregate.environmental_data(rows))
+                for row, result in zip(rows.tolist(), results):
+                    update.recommendations[row] = result
+        if self.range_table is not None and self.crop_for_field is not None:
+            from ana import evaluate_sensor_series
+            readings = {param: aggregate.mean[:, READING_FIELDS.index(field)] for param, field in SENSOR_PARAM_FIELDS.items()}
+            crops = [self.crop_for_field(field_id) for field_id in aggregate.field_ids]
+            # A field mapped to no crop, or to one missing from the table, gets no alerts
+            unknown = sum(crop not in self.range_table.index for crop in crops)
+            if unknown:
+                count('sensor_unknown_crops', unknown)
+            update.sensor_alerts = evaluate_sensor_series(readings, self.range_table, crops, skip_unknown=True)
+        if self.on_update is not None:
+            self.on_update(update)
+        return update
+
+    async def run(self):
+        """Run until the source is exhausted (forever for live sources)."""
+        await asyncio.gather(self._ingest(), self._aggregate())
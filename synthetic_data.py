@@ -0,0 +1,258 @@
+"""
+Seeded synthetic datasets for load testing.
+
+Three schemas are supported: crops (same columns as crops.csv),
+environmental (environmental readings with the Turkish headers) and
+crop_conditions (per-crop sensor ranges like crop_conditions.csv).
+
+Rows are generated in shards of `shard_rows`. Shard i always draws from
+SeedSequence(seed, spawn_key=(stream, i)), where every schema has its own
+stream, so the output depends only on seed,
+row count and shard size, never on the number of worker processes. Shards
+are generated in parallel but written in order, with at most a few shards
+in flight, so peak memory is bounded by the shard size.
+
+Usage:
+    python synthetic_data.py crops crops.csv --rows 100 --seed 42
+    python synthetic_data.py environmental env.csv --rows 50000000 --workers 8
+    python synthetic_data.py environmental env_columns --rows 50000000 --format columnar
+"""
+import argparse
+import os
+import shutil
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from dataset_cache import ColumnWriter
+
+DEFAULT_SHARD_ROWS = 100_000
+
+
+@dataclass(frozen=True)
+class Schema:
+    kind: str
+    stream: int  # keeps the schemas' random streams independent for the same seed
+    columns: Tuple[Tuple[str, str], ...]  # (field, CSV header)
+    generate: Callable[[np.random.Generator, int, int], Dict[str, np.ndarray]]
+    integer_fields: Tuple[str, ...] = ()  # written without a decimal part in CSV
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(field for field, _ in self.columns)
+
+    @property
+    def headers(self) -> Tuple[str, ...]:
+        return tuple(header for _, header in self.columns)
+
+    def dtypes(self) -> Dict[str, str]:
+        return {field: 'str' if field in ('name', 'Crop') else 'float64' for field in self.fields}
+
+
+def crop_names(start: int, count: int) -> np.ndarray:
+    """urun_<n> names for rows start..start+count-1, numbered from 1 like "100 ürünün csv.py"."""
+    names = np.empty(count, dtype=object)
+    names[:] = [f"urun_{i}" for i in range(start + 1, start + count + 1)]
+    return names
+
+
+def _generate_crops(rng: np.random.Generator, start: int, count: int) -> Dict[str, np.ndarray]:
+    return {
+        'name': crop_names(start, count),
+        'optimal_temp': rng.uniform(15, 35, count),
+        'optimal_humidity': rng.uniform(40, 90, count),
+        'water_needs': rng.uniform(100, 300, count),
+        'optimal_ph': rng.uniform(5.5, 7.5, count),
+        'pest_resistance': rng.uniform(1, 10, count),
+    }
+
+
+def _generate_environmental(rng: np.random.Generator, start: int, count: int) -> Dict[str, np.ndarray]:
+    # Sensor precision: two decimals; soil moisture is a fraction as in RecommendationEngine
+    return {
+        'temperature': np.round(rng.uniform(15, 35, count), 2),
+        'humidity': np.round(rng.uniform(30, 90, count), 2),
+        'rainfall': np.round(rng.uniform(100, 300, count), 2),
+        'soil_ph': np.round(rng.uniform(5.5, 7.5, count), 2),
+        'soil_moisture': np.round(rng.uniform(0.1, 0.8, count), 2),
+        'pest_risk': rng.integers(1, 10, count).astype(np.float64),
+    }
+
+
+def _generate_crop_conditions(rng: np.random.Generator, start: int, count: int) -> Dict[str, np.ndarray]:
+    temperature_min = rng.integers(5, 26, count)
+    humidity_min = rng.integers(30, 71, count)
+    ph_min = np.round(rng.uniform(4.5, 6.5, count), 1)
+    light_min = rng.integers(2, 9, count) * 100
+    return {
+        'Crop': crop_names(start, count),
+        'Temperature_Min': temperature_min.astype(np.float64),
+        'Temperature_Max': (temperature_min + rng.integers(5, 16, count)).astype(np.float64),
+        'Humidity_Min': humidity_min.astype(np.float64),
+        'Humidity_Max': np.minimum(humidity_min + rng.integers(10, 31, count), 100).astype(np.float64),
+        'Soil_pH_Min': ph_min,
+        'Soil_pH_Max': np.round(ph_min + rng.uniform(0.5, 2.0, count), 1),
+        'Light_Min': light_min.astype(np.float64),
+        'Light_Max': (light_min + rng.integers(5, 16, count) * 100).astype(np.float64),
+    }
+
+
+SCHEMAS: Dict[str, Schema] = {
+    'crops': Schema('crop', 0, (
+        ('name', 'name'),
+        ('optimal_temp', 'optimal_temp'),
+        ('optimal_humidity', 'optimal_humidity'),
+        ('water_needs', 'water_needs'),
+        ('optimal_ph', 'optimal_ph'),
+        ('pest_resistance', 'pest_resistance'),
+    ), _generate_crops),
+    'environmental': Schema('environmental', 1, (
+        ('temperature', 'sıcaklık'),
+        ('humidity', 'nem'),
+        ('rainfall', 'yağış'),
+        ('soil_ph', 'toprak_ph'),
+        ('soil_moisture', 'toprak_nem'),
+        ('pest_risk', 'zararlı_risk'),
+    ), _generate_environmental),
+    'crop_conditions': Schema('crop_conditions', 2, tuple((column, column) for column in (
+        'Crop', 'Temperature_Min', 'Temperature_Max', 'Humidity_Min', 'Humidity_Max',
+        'Soil_pH_Min', 'Soil_pH_Max', 'Light_Min', 'Light_Max',
+    )), _generate_crop_conditions, integer_fields=(
+        'Temperature_Min', 'Temperature_Max', 'Humidity_Min', 'Humidity_Max', 'Light_Min', 'Light_Max',
+    )),
+}
+
+
+def generate_shard(schema_name: str, seed: int, shard: int, rows: int, shard_rows: int = DEFAULT_SHARD_ROWS) -> Dict[str, np.ndarray]:
+    """Columns of one shard, keyed by field; the last shard may be shorter than shard_rows."""
+    start = shard * shard_rows
+    count = max(0, min(shard_rows, rows - start))
+    schema = SCHEMAS[schema_name]
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(schema.stream, shard)))
+    return schema.generate(rng, start, count)
+
+
+def generate(schema_name: str, rows: int, seed: int = 0, shard_rows: int = DEFAULT_SHARD_ROWS) -> Dict[str, np.ndarray]:
+    """A whole dataset in memory; identical to what write_dataset writes for the same arguments."""
+    shards = [generate_shard(schema_name, seed, shard, rows, shard_rows) for shard in range(_shard_count(rows, shard_rows))]
+    if not shards:
+        shards = [generate_shard(schema_name, seed, 0, 0, shard_rows)]
+    return {field: np.concatenate([shard[field] for shard in shards]) for field in SCHEMAS[schema_name].fields}
+
+
+def format_csv_rows(schema: Schema, columns: Dict[str, np.ndarray]) -> str:
+    """CSV text (no header) for a column chunk; floats use the shortest round-tripping repr."""
+    texts = []
+    for field in schema.fields:
+        values = columns[field]
+        if values.dtype == object:
+            texts.append(values.tolist())
+        elif field in schema.integer_fields:
+            texts.append(list(map(str, values.astype(np.int64).tolist())))
+        else:
+            # str() of Python floats is faster than ndarray.astype(str) and matches the csv module
+            texts.append(list(map(str, values.tolist())))
+    return ''.join(','.join(row) + '\n' for row in zip(*texts))
+
+
+def _shard_count(rows: int, shard_rows: int) -> int:
+    return -(-rows // shard_rows)
+
+
+def _shard_payload(schema_name: str, seed: int, shard: int, rows: int, shard_rows: int, fmt: str):
+    columns = generate_shard(schema_name, seed, shard, rows, shard_rows)
+    if fmt == 'csv':
+        return format_csv_rows(SCHEMAS[schema_name], columns).encode('utf-8')
+    return columns
+
+
+def iter_shards(schema_name: str, rows: int, seed: int = 0, shard_rows: int = DEFAULT_SHARD_ROWS,
+                workers: Optional[int] = None, fmt: str = 'columns') -> Iterator:
+    """
+    Yield shards in order: column dicts, or encoded CSV rows when fmt is 'csv'.
+
+    With workers > 1 shards are produced by a process pool; at most two
+    shards per worker are pending at any time.
+    """
+    shards = _shard_count(rows, shard_rows)
+    if not workers or workers <= 1 or shards <= 1:
+        for shard in range(shards):
+            yield _shard_payload(schema_name, seed, shard, rows, shard_rows, fmt)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        next_shard = 0
+        while next_shard < shards or pending:
+            while next_shard < shards and len(pending) < 2 * workers:
+                pending.append(executor.submit(_shard_payload, schema_name, seed, next_shard, rows, shard_rows, fmt))
+                next_shard += 1
+            yield pending.popleft().result()
+
+
+def write_dataset(path: str, schema_name: str, rows: int, seed: int = 0, fmt: str = 'csv',
+                  shard_rows: int = DEFAULT_SHARD_ROWS, workers: Optional[int] = None) -> str:
+    """
+    Write rows of a schema to path as a CSV file or, with fmt='columnar', a
+    dataset_cache-style columnar directory that data_loader reads directly.
+
+    Output is written next to path first and moved into place when complete.
+    """
+    schema = SCHEMAS[schema_name]
+    tmp = path + '.tmp'
+    if fmt == 'csv':
+        try:
+            with open(tmp, 'wb') as file:
+                file.write((','.join(schema.headers) + '\n').encode('utf-8'))
+                for payload in iter_shards(schema_name, rows, seed, shard_rows, workers, fmt='csv'):
+                    file.write(payload)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        os.replace(tmp, path)
+        return path
+
+    if fmt != 'columnar':
+        raise ValueError(f"unknown format {fmt!r}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    writer = ColumnWriter(tmp, schema.dtypes())
+    try:
+        for columns in iter_shards(schema_name, rows, seed, shard_rows, workers):
+            writer.write(columns)
+    except BaseException:
+        writer.abort()
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    writer.close(kind=schema.kind, headers=dict(schema.columns),
+                 generator={'schema': schema_name, 'seed': seed, 'shard_rows': shard_rows})
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic datasets.")
+    parser.add_argument('schema', choices=sorted(SCHEMAS))
+    parser.add_argument('output', help="CSV file, or directory for --format columnar")
+    parser.add_argument('--rows', type=int, required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=['csv', 'columnar'], default='csv')
+    parser.add_argument('--workers', type=int, default=1, help="worker processes (0: one per CPU)")
+    parser.add_argument('--shard-rows', type=int, default=DEFAULT_SHARD_ROWS,
+                        help="rows per shard; changing it changes the generated values")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count()
+    write_dataset(args.output, args.schema, args.rows, seed=args.seed, fmt=args.format,
+                  shard_rows=args.shard_rows, workers=workers)
+    print(f"{args.output}: {args.rows} satır ({args.schema}, seed={args.seed})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Columnar containers for crop catalogs and reading histories.
+
+A list of EnvironmentalData records costs roughly 100 bytes per reading
+(instance plus six boxed floats). ReadingTable and CropTable keep one
+float64 array per field instead, 8 bytes per value, and columns loaded
+from a dataset_cache or columnar directory stay memory mapped.
+
+Indexing a table returns a ReadingRow / CropRow view that reads its values
+from the columns, so a row can be passed anywhere a record is expected
+without copying; slicing returns a table over views of the same columns.
+CropPredictionModel and RecommendationEngine accept tables in place of
+record lists and score them through the vectorized paths.
+"""
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from data_loader import CROP_COLUMNS, ENVIRONMENTAL_COLUMNS, CropData, EnvironmentalData
+
+# Column order of the matrices used by the vectorized scoring helpers.
+ENV_FIELDS = tuple(ENVIRONMENTAL_COLUMNS)
+CROP_FIELDS = tuple(field for field in CROP_COLUMNS if field != 'name')
+
+
+def _field_property(position: int, field: str) -> property:
+    return property(lambda row: float(row._table._values[position][row._index]), doc=f"{field} of this row")
+
+
+class _Table:
+    """Equal-length float64 columns in FIELDS order, with row views and zero-copy slices."""
+    FIELDS: Sequence[str] = ()
+    ROW: type = None
+    RECORD: type = None
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = {field: np.asarray(columns[field], dtype=np.float64) for field in self.FIELDS}
+        lengths = {len(column) for column in self.columns.values()}
+        if len(lengths) != 1 or any(column.ndim != 1 for column in self.columns.values()):
+            raise ValueError(f"columns must be 1-D arrays of equal length, got lengths {sorted(lengths)}")
+        self._length = lengths.pop()
+        self._values = tuple(self.columns[field] for field in self.FIELDS)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._slice(index)
+        position = index + self._length if index < 0 else index
+        if not 0 <= position < self._length:
+            raise IndexError(f"row {index} out of range for {self._length} rows")
+        return self.ROW(self, position)
+
+    def __iter__(self):
+        return (self.ROW(self, position) for position in range(self._length))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._length} rows)"
+
+    def _slice(self, index: slice):
+        return type(self)({field: column[index] for field, column in self.columns.items()})
+
+    def matrix(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Rows start:stop as a (rows, fields) array in FIELDS order (a copy)."""
+        return np.column_stack([column[start:stop] for column in self._values]).reshape(-1, len(self.FIELDS))
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[Dict[str, np.ndarray]]:
+        """Column batches of at most chunk_size rows, like data_loader's chunk iterators (views, not copies)."""
+        for start in range(0, self._length, chunk_size):
+            yield {field: column[start:start + chunk_size] for field, column in self.columns.items()}
+
+    def to_records(self) -> List:
+        return [self.RECORD(*values) for values in zip(*(column.tolist() for column in self._values))]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self._values)
+
+
+class ReadingRow:
+    """View of one ReadingTable row with the attributes of EnvironmentalData."""
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: 'ReadingTable', index: int):
+        self._table = table
+        self._index = index
+
+    def to_record(self) -> EnvironmentalData:
+        return EnvironmentalData(*(getattr(self, field) for field in ENV_FIELDS))
+
+    def __repr__(self) -> str:
+        return f"ReadingRow({', '.join(f'{field}={getattr(self, field)!r}' for field in ENV_FIELDS)})"
+
+
+class CropRow:
+    """View of one CropTable row with the attributes of CropData."""
+    __slots__ = ('_table', '_index')
+
+    def __init__(self, table: 'CropTable', index: int):
+        self._table = table
+        self._index = index
+
+    @property
+    def name(self) -> str:
+        return self._table.names[self._index]
+
+    def to_record(self) -> CropData:
+        return CropData(self.name, *(getattr(self, field) for field in CROP_FIELDS))
+
+    def __repr__(self) -> str:
+        values = ', '.join(f'{field}={getattr(self, field)!r}' for field in CROP_FIELDS)
+        return f"CropRow(name={self.name!r}, {values})"
+
+
+for _position, _field in enumerate(ENV_FIELDS):
+    setattr(ReadingRow, _field, _field_property(_position, _field))
+for _position, _field in enumerate(CROP_FIELDS):
+    setattr(CropRow, _field, _field_property(_position, _field))
+
+
+class ReadingTable(_Table):
+    """Environmental readings as one float64 column per ENV_FIELDS field."""
+    FIELDS = ENV_FIELDS
+    ROW = ReadingRow
+    RECORD = EnvironmentalData
+
+    @classmethod
+    def from_records(cls, records: Sequence[EnvironmentalData]) -> 'ReadingTable':
+        records = list(records)
+        return cls({field: np.fromiter((getattr(record, field) for record in records), dtype=np.float64,
+                                       count=len(records)) for field in ENV_FIELDS})
+
+
+class CropTable(_Table):
+    """Crop catalog as a name array plus one float64 column per CROP_FIELDS field."""
+    FIELDS = CROP_FIELDS
+    ROW = CropRow
+    RECORD = CropData
+
+    def __init__(self, columns: Dict[str, Union[np.ndarray, Sequence]]):
+        super().__init__(columns)
+        self.names = np.asarray(columns['name'], dtype=object)
+        if self.names.shape != (self._length,):
+            raise ValueError(f"name column has {len(self.names)} rows, expected {self._length}")
+
+    def _slice(self, index: slice) -> 'CropTable':
+        return CropTable(dict({field: column[index] for field, column in self.columns.items()}, name=self.names[index]))
+
+    def iter_chunks(self, chunk_size: int) -> Iterator[Dict[str, np.ndarray]]:
+        for start, chunk in zip(range(0, self._length, chunk_size), super().iter_chunks(chunk_size)):
+            yield dict(chunk, name=self.names[start:start + chunk_size])
+
+    def to_records(self) -> List[CropData]:
+        return [CropData(name, *values) for name, values in
+                zip(self.names.tolist(), zip(*(column.tolist() for column in self._values)))]
+
+    @classmethod
+    def from_records(cls, records: Sequence[CropData]) -> 'CropTable':
+        records = list(records)
+        columns = {field: np.fromiter((getattr(record, field) for record in records), dtype=np.float64,
+                                      count=len(records)) for field in CROP_FIELDS}
+        columns['name'] = [record.name for record in records]
+        return cls(columns)
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+import ana
+
+CONDITIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crop_conditions.csv")
+
+@pytest.fixture(scope="module")
+def range_table():
+    return ana.SensorRangeTable.from_csv(CONDITIONS)
+
+@pytest.mark.parametrize("reading", [
+    {"Temperature": 35, "Humidity": 90, "Soil_pH": 8, "Light": 1600},
+    {"Temperature": 35.5, "Humidity": 70.0, "Soil_pH": 4.25, "Light": 2000},
+])
+def test_series_alerts_match_single_reading_analysis(range_table, reading):
+    expected = ana.analyze_sensor_data(reading, range_table, "Domates")
+    alerts = ana.evaluate_sensor_series({param: [value] for param, value in reading.items()}, range_table, "Domates")
+
+    assert [(messages, recommendations) for _, messages, recommendations
+            in ana.format_sensor_alerts(alerts, range_table)] == [expected]
+
+def test_integer_readings_keep_their_formatting(range_table):
+    readings = {"Temperature": [25, 40], "Humidity": [70, 70], "Soil_pH": [6.0, 6.0], "Light": [1000, 1600]}
+    alerts = ana.evaluate_sensor_series(readings, range_table, "Domates")
+
+    [(row, messages, _)] = list(ana.format_sensor_alerts(alerts, range_table))
+    assert row == 1
+    assert messages == ["Temperature su anda 40. Ideal aralik: 18-30.", "Light su anda 1600. Ideal aralik: 500-1500."]
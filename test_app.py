@@ -0,0 +1,44 @@
+import pytest
+
+import app
+
+READINGS = {"temperature": 22, "humidity": 60, "rainfall": 500, "soil_ph": 6.5, "soil_moisture": 0.3, "pest_risk": 2}
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+def test_predict_returns_recommendations(client):
+    response = client.post("/predict", json=READINGS)
+    assert response.status_code == 200
+    assert len(response.get_json()["crop_recommendations"]) > 0
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", "NaN"])
+def test_non_finite_readings_are_rejected(client, value):
+    response = client.post("/predict", json=dict(READINGS, temperature=value))
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Geçersiz sensör değeri: temperature"}
+
+    response = client.post("/predict/batch", json=[READINGS, dict(READINGS, rainfall=value)])
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Geçersiz sensör değeri: rainfall", "index": 1}
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(app, "CATALOG_ADMIN_TOKEN", "gizli")
+    return {"X-Admin-Token": "gizli"}
+
+def test_catalog_changes_require_the_admin_token(client, admin):
+    assert client.post("/catalog/changes", json={"remove": []}).status_code == 401
+    assert client.post("/catalog/changes", json={"remove": []}, headers={"X-Admin-Token": "yanlış"}).status_code == 401
+    assert client.post("/catalog/changes", json={"remove": []}, headers=admin).status_code == 200
+
+@pytest.mark.parametrize("value", ["nan", "inf"])
+def test_non_finite_crop_values_are_rejected(client, admin, value):
+    version = client.get("/catalog").get_json()["catalog_version"]
+    name = app.catalog.current.table().names[0]
+    response = client.post("/catalog/changes", json={"update": [{"name": name, "water_needs": value}]}, headers=admin)
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Geçersiz ürün değeri: water_needs"}
+    assert client.get("/catalog").get_json()["catalog_version"] == version
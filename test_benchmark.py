@@ -0,0 +1,30 @@
+import pytest
+
+import benchmark
+from dataset_cache import is_cache_valid
+
+@pytest.fixture
+def workload(tmp_path):
+    return benchmark.generate_workload(crops=10, readings=50, seed=1, workdir=str(tmp_path))
+
+def test_stage_is_repeated_until_min_time(workload):
+    result = benchmark.run_stage('evaluate_sensor_series', workload, measure_memory=False, min_time=0.05)
+
+    assert result.items == 50
+    assert result.runs > 1
+    assert result.seconds <= result.median_seconds
+
+def test_cached_stage_builds_its_cache(workload):
+    with pytest.raises(RuntimeError):
+        benchmark.STAGES['load_readings_cached_chunks'](workload)
+
+    result = benchmark.run_stage('load_readings_cached_chunks', workload, measure_memory=False, min_time=0)
+    assert result.items == 50
+    assert is_cache_valid(workload.readings_csv)
+
+def test_compare_with_baseline_tolerance():
+    result = benchmark.StageResult('stage', 100, 1.0, 100.0, 1000)
+    baseline = {'stages': [{'name': 'stage', 'throughput': 120.0, 'peak_memory_bytes': 1000}]}
+
+    assert benchmark.compare_with_baseline([result], baseline, tolerance=0.2) == []
+    assert len(benchmark.compare_with_baseline([result], baseline, tolerance=0.1)) == 1
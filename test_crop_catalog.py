@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from crop_catalog import CatalogRecommendationEngine, CropCatalog
+from data_loader import CropData
+from prediction_model import CropPredictionModel
+from tables import CropTable
+from test_prediction_model import random_crops, random_envs
+
+def random_changes(rng, snapshot, step):
+    names = snapshot.table().names.tolist()
+    remove = rng.sample(names, rng.randint(0, 3))
+    kept = [name for name in names if name not in remove]
+    update = [{"name": name, "pest_resistance": rng.uniform(0, 10)} for name in rng.sample(kept, rng.randint(0, 3))]
+    add = []
+    for i in range(rng.randint(0, 3)):
+        # Some additions copy an existing crop's values, so ties between old and new slots occur
+        values = snapshot.get(rng.choice(kept)) if rng.random() < 0.3 else random_crops(1, seed=rng.random())[0]
+        add.append(CropData(f"yeni_{step}_{i}", *(getattr(values, field) for field in CropData.__slots__[1:])))
+    if remove and rng.random() < 0.2:
+        add.append(snapshot.get(remove[0]))  # a removed name comes back as a new crop
+    return {"add": add, "update": update, "remove": remove}
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_updates_and_compactions_match_a_fresh_model(use_index):
+    rng = random.Random(7)
+    envs = random_envs(30, seed=2)
+    catalog = CropCatalog(random_crops(120), use_index=use_index, leaf_size=8, min_delta=10)
+    for step in range(20):
+        snapshot = catalog.apply(**random_changes(rng, catalog.current, step))
+        expected = CropPredictionModel(snapshot.table().to_records())
+        for top_n in (1, 3, 7):
+            assert [snapshot.model.predict_best_crops(env, top_n) for env in envs] == \
+                [expected.predict_best_crops(env, top_n) for env in envs]
+        assert snapshot.model.predict_best_crops_batch(envs, 5) == [expected.predict_best_crops(env, 5) for env in envs]
+    assert catalog.compactions > 0
+
+    before = [catalog.current.model.predict_best_crops(env, 5) for env in envs]
+    version = catalog.version
+    compacted = catalog.compact()
+    assert (compacted.version, compacted.delta_size) == (version, 0)
+    assert [compacted.model.predict_best_crops(env, 5) for env in envs] == before
+
+@pytest.mark.parametrize("changes", [
+    {"remove": ["yok"]},
+    {"add": [{"name": "urun_0"}]},
+    {"add": [random_crops(1)[0]]},
+    {"update": [{"name": "urun_1", "renk": 1}]},
+    {"remove": ["urun_2"], "update": [{"name": "urun_2", "pest_resistance": 1}]},
+])
+def test_failed_change_sets_leave_the_catalog_unchanged(changes):
+    catalog = CropCatalog(random_crops(20))
+    with pytest.raises((KeyError, ValueError)):
+        catalog.apply(**changes)
+    assert (catalog.version, catalog.current.delta_size) == (1, 0)
+
+def test_replace_applies_only_the_differences():
+    crops = random_crops(200)
+    catalog = CropCatalog(crops)
+    edited = [CropData(crop.name, crop.optimal_temp, crop.optimal_humidity, crop.water_needs, crop.optimal_ph,
+                       crop.pest_resistance + (i % 50 == 0)) for i, crop in enumerate(crops) if i != 5]
+    edited.append(CropData("taze", 20.0, 60.0, 300.0, 6.5, 5.0))
+    shuffled = random.Random(0).sample(edited, len(edited))
+
+    snapshot = catalog.replace(CropTable.from_records(shuffled))
+    assert snapshot.changes == {"added": 1, "updated": 5, "removed": 1}
+    assert snapshot.table().to_records() == edited
+    assert catalog.replace(edited) is snapshot
+
+def test_reload_skips_an_unchanged_file_but_reverts_edits(tmp_path):
+    path = str(tmp_path / "crops.csv")
+    crops = random_crops(30)
+    with open(path, "w") as file:
+        file.write("name,optimal_temp,optimal_humidity,water_needs,optimal_ph,pest_resistance\n")
+        file.writelines(f"{crop.name},{crop.optimal_temp!r},{crop.optimal_humidity!r},{crop.water_needs!r},"
+                        f"{crop.optimal_ph!r},{crop.pest_resistance!r}\n" for crop in crops)
+    catalog = CropCatalog.from_csv(path, use_cache=False)
+    assert catalog.reload(path, use_cache=False) is catalog.current
+
+    catalog.update(crops[0].name, water_needs=1.0)
+    snapshot = catalog.reload(path, use_cache=False)
+    assert snapshot.version == 3
+    assert snapshot.get(crops[0].name) == crops[0]
+
+def test_responses_report_the_version_they_were_scored_with():
+    catalog = CropCatalog(random_crops(20))
+    engine = CatalogRecommendationEngine(catalog)
+    env = random_envs(1)[0]
+    assert engine.generate_recommendations(env)["catalog_version"] == 1
+    catalog.remove("urun_3")
+    assert [result["catalog_version"] for result in engine.generate_recommendations_batch([env, env])] == [2, 2]
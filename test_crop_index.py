@@ -0,0 +1,25 @@
+import pytest
+
+from prediction_model import CropPredictionModel
+from test_prediction_model import random_crops, random_envs
+
+@pytest.mark.parametrize("leaf_size", [4, 256])
+@pytest.mark.parametrize("top_n", [1, 3, 10])
+def test_index_top_n_matches_full_scan(leaf_size, top_n):
+    crops = random_crops(600)
+    envs = random_envs(100)
+    expected = [CropPredictionModel(crops).predict_best_crops(env, top_n) for env in envs]
+    model = CropPredictionModel(crops)
+    model.build_index(leaf_size=leaf_size)
+
+    assert [model.predict_best_crops(env, top_n) for env in envs] == expected
+
+def test_index_follows_rebuild_after_weight_change():
+    crops = random_crops(300)
+    envs = random_envs(50)
+    model = CropPredictionModel(crops)
+    model.weights = dict(model.weights, pest=0.5, water=0.05)
+    expected = [model.predict_best_crops(env) for env in envs]
+    model.build_index(leaf_size=16)
+
+    assert [model.predict_best_crops(env) for env in envs] == expected
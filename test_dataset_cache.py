@@ -0,0 +1,48 @@
+import os
+import shutil
+
+import dataset_cache
+from data_loader import load_crop_data
+
+def copy_crops(tmp_path):
+    path = str(tmp_path / "crops.csv")
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), "crops.csv"), path)
+    return path
+
+def test_same_size_and_mtime_edit_needs_verify_hash(tmp_path):
+    path = copy_crops(tmp_path)
+    dataset_cache.build_cache(path)
+    stat = os.stat(path)
+    with open(path) as file:
+        text = file.read()
+    with open(path, "w") as file:
+        file.write(text.replace("urun_1,", "urun_X,", 1))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert dataset_cache.is_cache_valid(path)
+    assert not dataset_cache.is_cache_valid(path, verify_hash=True)
+
+def test_missing_cache_file_falls_back_to_csv(tmp_path):
+    path = copy_crops(tmp_path)
+    expected = load_crop_data(path, use_cache=False)
+    dataset_cache.build_cache(path)
+    os.remove(os.path.join(dataset_cache.cache_path(path), "optimal_ph.f8"))
+
+    assert dataset_cache.load_cached_columns(path) is None
+    assert load_crop_data(path) == expected
+
+def test_truncated_cache_file_falls_back_to_csv(tmp_path):
+    path = copy_crops(tmp_path)
+    expected = load_crop_data(path, use_cache=False)
+    dataset_cache.build_cache(path)
+    with open(os.path.join(dataset_cache.cache_path(path), "water_needs.f8"), "r+b") as file:
+        file.truncate(8)
+
+    assert load_crop_data(path) == expected
+
+def test_rebuild_replaces_existing_cache(tmp_path):
+    path = copy_crops(tmp_path)
+    target = dataset_cache.build_cache(path)
+    assert dataset_cache.build_cache(path, force=True) == target
+    assert sorted(os.listdir(tmp_path)) == ["crops.csv", "crops.csv.cache"]
+    assert load_crop_data(path) == load_crop_data(path, use_cache=False)
@@ -0,0 +1,101 @@
+import os
+import re
+
+from pdf_generator import FlowableStream, StreamingPDFReport, generate_bulk_reports, paginated_tables
+
+RECOMMENDATIONS = [("Domates", 0.91), ("Biber", 0.84)]
+SENSOR_DATA = {"Sıcaklık": 24.0, "Nem": 61.0}
+
+class KillsWorker:
+    """Unpickling this in a worker process ends the process, which breaks the pool."""
+
+    def __reduce__(self):
+        return os._exit, (1,)
+
+def pdf_pages(path):
+    """Page count of a complete PDF file written by reportlab."""
+    with open(path, "rb") as file:
+        data = file.read()
+    assert data.startswith(b"%PDF-") and data.rstrip().endswith(b"%%EOF")
+    return len(re.findall(rb"/Type /Page(?![s\w])", data))
+
+def sensor_report(filename, rows, **kwargs):
+    report = StreamingPDFReport(filename, rows_per_table=20, **kwargs)
+    report.add_sensor_rows(["Sıcaklık", "Nem"], ((i, i * 0.5) for i in range(rows)))
+    return report.generate()
+
+def job(field_id, sensor_data=SENSOR_DATA):
+    return field_id, RECOMMENDATIONS, sensor_data, ["Nem yüksek"]
+
+def test_bulk_reports_are_written(tmp_path):
+    summary = generate_bulk_reports([job(f"tarla-{i}") for i in range(3)], str(tmp_path), workers=2)
+
+    assert (summary.total, summary.succeeded, summary.failed) == (3, 3, [])
+    assert sorted(os.listdir(tmp_path)) == ["tarla-0.pdf", "tarla-1.pdf", "tarla-2.pdf"]
+
+def test_render_error_is_recorded(tmp_path):
+    summary = generate_bulk_reports([job("iyi"), job("kötü", {"Nem": "yok"})], str(tmp_path), workers=1)
+
+    assert summary.succeeded == 1
+    assert [field_id for field_id, _ in summary.failed] == ["kötü"]
+
+def test_unpicklable_job_is_recorded(tmp_path):
+    summary = generate_bulk_reports([job("iyi"), job("lambda", {"Nem": lambda: 1})], str(tmp_path), workers=1)
+
+    assert summary.succeeded == 1
+    assert [field_id for field_id, _ in summary.failed] == ["lambda"]
+
+def test_dead_worker_does_not_abort_the_run(tmp_path):
+    jobs = [job("önce"), job("çöken", KillsWorker())] + [job(f"sonra-{i}") for i in range(3)]
+    progress = []
+    summary = generate_bulk_reports(jobs, str(tmp_path), workers=1, max_in_flight=1,
+                                    progress=lambda finished, failed: progress.append((finished, failed)))
+
+    assert summary.total == 5
+    assert summary.succeeded == 4
+    assert summary.failed[0][0] == "çöken"
+    assert "BrokenProcessPool" in summary.failed[0][1]
+    assert progress[-1] == (5, 1)
+
+def test_dead_worker_only_fails_its_own_job(tmp_path):
+    jobs = [job(f"b{i}") for i in range(6)] + [job("çöken", KillsWorker())] + [job(f"a{i}") for i in range(6)]
+    summary = generate_bulk_reports(jobs, str(tmp_path), workers=2)
+
+    assert (summary.total, summary.succeeded) == (13, 12)
+    assert [field_id for field_id, _ in summary.failed] == ["çöken"]
+    assert len(os.listdir(tmp_path)) == 12
+
+def test_flowable_stream_reads_ahead_only_as_needed():
+    produced = []
+    stream = FlowableStream(produced.append(i) or i for i in range(100))
+
+    assert len(stream) == FlowableStream.LOOKAHEAD and len(produced) == FlowableStream.LOOKAHEAD
+    del stream[0]
+    stream.insert(0, "parça")
+    assert stream[:3] == ["parça", 1, 2]
+    assert stream[-1] == 99 and len(stream) == 100
+
+def test_paginated_tables_repeat_the_header():
+    tables = list(paginated_tables(["a", "b"], ([i, i] for i in range(45)), rows_per_table=20))
+
+    assert [len(table._cellvalues) for table in tables] == [21, 21, 6]
+    assert all(table._cellvalues[0] == ["a", "b"] for table in tables)
+
+def test_streamed_report_spans_several_pages(tmp_path):
+    path = sensor_report(str(tmp_path / "rapor.pdf"), 100)
+
+    assert path == str(tmp_path / "rapor.pdf")
+    assert pdf_pages(path) == 4
+
+def test_streamed_report_splits_into_volumes(tmp_path):
+    # 100 rows in 20-row tables are 5 page-sized tables, 2 per volume
+    paths = sensor_report(str(tmp_path / "rapor.pdf"), 100, pages_per_volume=2)
+
+    assert [os.path.basename(path) for path in paths] == ["rapor_001.pdf", "rapor_002.pdf", "rapor_003.pdf"]
+    assert [pdf_pages(path) for path in paths] == [2, 2, 1]
+
+def test_empty_streamed_report_still_writes_one_volume(tmp_path):
+    paths = sensor_report(str(tmp_path / "rapor.pdf"), 0, pages_per_volume=2)
+
+    assert [os.path.basename(path) for path in paths] == ["rapor_001.pdf"]
+    assert pdf_pages(paths[0]) == 1
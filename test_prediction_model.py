@@ -0,0 +1,48 @@
+import dataclasses
+import random
+
+import pytest
+
+from data_loader import CropData, EnvironmentalData
+from prediction_model import CropPredictionModel
+from tables import CropTable, ReadingTable
+
+def random_crops(count, seed=0):
+    rng = random.Random(seed)
+    crops = [CropData(f"urun_{i}", rng.uniform(5, 40), rng.uniform(20, 95), rng.uniform(100, 1500),
+                      rng.uniform(4.5, 8.5), rng.uniform(0, 10)) for i in range(count)]
+    # Exact duplicates under other names, so ties have to come out in catalog order
+    return crops + [dataclasses.replace(crops[i * 7], name=f"kopya_{i}") for i in range(count // 10)]
+
+def random_envs(count, seed=1):
+    rng = random.Random(seed)
+    return [EnvironmentalData(rng.uniform(0, 45), rng.uniform(10, 100), rng.uniform(0, 2000),
+                              rng.uniform(4, 9), rng.uniform(0, 1), rng.uniform(0, 10)) for _ in range(count)]
+
+@pytest.mark.parametrize("top_n", [1, 3, 10])
+def test_batch_matches_scalar_exactly(top_n):
+    model = CropPredictionModel(random_crops(200))
+    envs = random_envs(300)
+    expected = [model.predict_best_crops(env, top_n) for env in envs]
+
+    assert model.predict_best_crops_batch(envs, top_n) == expected
+    assert model.predict_best_crops_batch(envs, top_n, chunk_size=7) == expected
+
+def test_chunks_and_tables_match_scalar_exactly():
+    crops = random_crops(150)
+    envs = random_envs(120)
+    model = CropPredictionModel(crops)
+    expected = [model.predict_best_crops(env) for env in envs]
+    table = ReadingTable.from_records(envs)
+    chunks = [{field: column[start:start + 50] for field, column in table.columns.items()}
+              for start in range(0, len(table), 50)]
+
+    assert [row for block in model.iter_best_crops_chunks(chunks) for row in block] == expected
+    table_model = CropPredictionModel(CropTable.from_records(crops))
+    assert table_model.predict_best_crops_batch(table) == expected
+    assert [table_model.predict_best_crops(env) for env in envs] == expected
+
+def test_top_n_larger_than_catalog():
+    model = CropPredictionModel(random_crops(4))
+    env = random_envs(1)[0]
+    assert model.predict_best_crops_batch([env], top_n=10) == [model.predict_best_crops(env, 10)]
@@ -0,0 +1,49 @@
+import pytest
+
+from crop_catalog import CropCatalog
+from prediction_model import CropPredictionModel
+from score_lut import GridAxis
+from test_prediction_model import random_crops, random_envs
+
+GRID = (GridAxis(0, 50, 5), GridAxis(0, 100, 10), GridAxis(0, 2000, 200), GridAxis(4, 9, 1), GridAxis(0, 10, 2))
+
+@pytest.fixture(scope="module")
+def crops():
+    return random_crops(60)
+
+@pytest.mark.parametrize("top_n", [1, 3])
+def test_lut_answers_match_exact_scoring(crops, top_n):
+    envs = random_envs(400)
+    exact = CropPredictionModel(crops)
+    model = CropPredictionModel(crops)
+    lut = model.build_lut(grid=GRID)
+
+    assert [model.predict_best_crops(env, top_n) for env in envs] == \
+        [exact.predict_best_crops(env, top_n) for env in envs]
+    assert lut.hits > 0 and lut.fallbacks > 0
+
+def test_saved_lut_is_reused_only_for_the_same_catalog(crops, tmp_path):
+    path = str(tmp_path / "lut")
+    built = CropPredictionModel(crops).build_lut(path, grid=GRID)
+    loaded = CropPredictionModel(crops).build_lut(path, grid=GRID)
+    assert loaded.fingerprint == built.fingerprint
+    assert (loaded.candidates == built.candidates).all()
+
+    changed = CropPredictionModel(crops[1:]).build_lut(path, grid=GRID)
+    assert changed.fingerprint != built.fingerprint
+
+def test_catalog_rebuilds_lut_for_new_versions(crops):
+    envs = random_envs(200, seed=3)
+    catalog = CropCatalog(crops, lut_grid=GRID, use_lut=True)
+    assert catalog.current.model.lut is not None
+
+    catalog.apply(update=[{"name": crops[0].name, "water_needs": 450.0}], remove=[crops[5].name])
+    assert catalog.wait_for_lut(timeout=30)
+    snapshot = catalog.current
+    assert snapshot.version == 2
+    exact = CropPredictionModel(snapshot.table())
+    assert [snapshot.model.predict_best_crops(env) for env in envs] == [exact.predict_best_crops(env) for env in envs]
+    assert snapshot.model.lut.hits > 0
+
+    lut = snapshot.model.lut
+    assert catalog.compact().model.lut is lut
@@ -0,0 +1,84 @@
+import asyncio
+import math
+import os
+
+import pytest
+
+import instrumentation
+from ana import SensorRangeTable, format_sensor_alerts
+from data_loader import EnvironmentalData, load_crop_data
+from prediction_model import CropPredictionModel
+from recommendation_engine import RecommendationEngine
+from sensor_pipeline import ReadingBatch, SensorPipeline
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CROPS = os.path.join(HERE, "crops.csv")
+CONDITIONS = os.path.join(HERE, "crop_conditions.csv")
+FULL = {"temperature": 24.0, "humidity": 61.0, "rainfall": 180.0, "soil_ph": 6.4, "soil_moisture": 0.35,
+        "pest_risk": 3.0, "light": 900.0}
+
+@pytest.fixture(scope="module")
+def engine():
+    return RecommendationEngine(CropPredictionModel(load_crop_data(CROPS)))
+
+def emit(pipeline, *records):
+    pipeline.buffer.append(ReadingBatch.from_records(records))
+    return asyncio.run(pipeline.emit())
+
+def scores(result):
+    return [score for _, score in result["crop_recommendations"]]
+
+def test_partial_readings_are_not_scored(engine):
+    pipeline = SensorPipeline(source=None, engine=engine, window=4)
+    update = emit(pipeline, {"field_id": "tarla-7", "temperature": 24.1, "humidity": 61, "light": 900},
+                  dict(FULL, field_id="tarla-8"))
+
+    assert update.aggregate.field_ids == ["tarla-7", "tarla-8"]
+    assert update.recommendations[0] is None
+    assert update.recommendations[1] == engine.generate_recommendations(
+        EnvironmentalData(*(FULL[field] for field in EnvironmentalData.__slots__)))
+
+def test_field_is_scored_once_every_sensor_has_reported(engine):
+    pipeline = SensorPipeline(source=None, engine=engine, window=4)
+    emit(pipeline, {"field_id": "tarla-7", "temperature": 24.1, "humidity": 61, "light": 900})
+    update = emit(pipeline, {"field_id": "tarla-7", "rainfall": 180, "soil_ph": 6.4, "soil_moisture": 0.35,
+                             "pest_risk": 3})
+
+    [result] = update.recommendations
+    env = EnvironmentalData(24.1, 61, 180, 6.4, 0.35, 3)
+    assert all(math.isfinite(score) for score in scores(result))
+    assert result == engine.generate_recommendations(env)
+    assert result == engine.generate_recommendations_batch([env])[0]
+
+def test_silent_sensor_keeps_its_last_value(engine):
+    pipeline = SensorPipeline(source=None, engine=engine, window=2)
+    emit(pipeline, dict(FULL, field_id="tarla-1"))
+    # Three temperature-only readings push every other sensor out of the two-reading window
+    update = emit(pipeline, *({"field_id": "tarla-1", "temperature": value} for value in (20.0, 26.0, 28.0)))
+
+    mean = dict(zip(("temperature", "humidity", "rainfall", "soil_ph", "soil_moisture", "pest_risk", "light"),
+                    update.aggregate.mean[0].tolist()))
+    assert mean == dict(FULL, temperature=27.0)
+    assert update.aggregate.minimum[0, 2] == update.aggregate.maximum[0, 2] == FULL["rainfall"]
+    assert update.recommendations[0] == engine.generate_recommendations(
+        EnvironmentalData(27.0, 61.0, 180.0, 6.4, 0.35, 3.0))
+
+def test_unmapped_field_gets_no_alerts():
+    range_table = SensorRangeTable.from_csv(CONDITIONS)
+    crops = {"tarla-1": "Domates", "tarla-2": "Bilinmeyen"}
+    pipeline = SensorPipeline(source=None, range_table=range_table, crop_for_field=crops.get, window=4)
+    enabled = instrumentation.is_enabled()
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        update = emit(pipeline, dict(FULL, field_id="tarla-1", temperature=40.0),
+                      dict(FULL, field_id="tarla-2", temperature=40.0), dict(FULL, field_id="tarla-3", temperature=40.0))
+    finally:
+        if not enabled:
+            instrumentation.disable()
+
+    assert update.aggregate.field_ids == ["tarla-1", "tarla-2", "tarla-3"]
+    assert update.sensor_alerts.row_alert_counts.tolist() == [1, 0, 0]
+    [(row, messages, _)] = list(format_sensor_alerts(update.sensor_alerts, range_table))
+    assert row == 0 and messages[0].startswith("Temperature su anda 40.0")
+    assert instrumentation.snapshot()["counters"]["sensor_unknown_crops"] == 2
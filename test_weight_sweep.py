@@ -0,0 +1,36 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from prediction_model import CropPredictionModel, crop_matrix, env_matrix, top_n_indices
+from test_prediction_model import random_crops, random_envs
+from weight_sweep import _sweep_block, _top_n_along_crops, sweep_weights, weight_vector
+
+def tied_crops(count):
+    # Whole-number optimums, as in most crop tables, plus the duplicates from random_crops
+    return [dataclasses.replace(crop, optimal_temp=round(crop.optimal_temp), optimal_humidity=round(crop.optimal_humidity),
+                                water_needs=round(crop.water_needs, -2), optimal_ph=round(crop.optimal_ph),
+                                pest_resistance=round(crop.pest_resistance))
+            for crop in random_crops(count)]
+
+@pytest.mark.parametrize("top_n", [1, 3, 10])
+def test_top_n_along_crops_matches_top_n_indices(top_n):
+    scores = np.random.default_rng(0).integers(0, 5, size=(40, 3, 30)).astype(np.float64)
+
+    expected = np.stack([top_n_indices(scores[:, k], top_n) for k in range(3)], axis=1)
+    assert np.array_equal(_top_n_along_crops(scores, top_n), expected)
+
+def test_baseline_weights_as_candidate_change_nothing():
+    crops = tied_crops(80)
+    envs = env_matrix(random_envs(60))
+    model = CropPredictionModel(crops)
+    baseline = weight_vector(model.weights)
+
+    sums = _sweep_block(envs, crop_matrix(crops), baseline[None, :], baseline, None, top_n=5)
+    assert sums['top1_unchanged'][0] == len(envs)
+    assert sums['top_n_overlap'][0] == len(envs)
+    assert sums['rank_change'][0] == 0 and sums['max_rank_change'][0] == 0
+
+    result = sweep_weights(envs, crop_matrix(crops), baseline, model.weights, top_n=5)
+    assert (result.top1_unchanged[0], result.top_n_overlap[0], result.mean_rank_change[0]) == (1.0, 1.0, 0.0)
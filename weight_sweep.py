@@ -0,0 +1,302 @@
+"""
+Weight sweeps and sensitivity analysis for CropPredictionModel.
+
+A crop score is a weighted sum of five component scores, so the component
+tensor (env x crop x 5) only has to be computed once; every candidate
+weight vector is then a matrix product against it. For each candidate the
+sweep reports how stable the top-N recommendations are compared to the
+baseline weights (top-1 kept, top-N overlap, rank changes of the baseline
+top-N crops) and, given a labeled reference set, how often the labeled
+crop is ranked first or within the top N.
+
+Environments are processed in blocks; each block's tensor is reused for
+all candidates, and blocks can be spread over worker processes.
+
+Usage:
+    python weight_sweep.py crops.csv environmental_data.csv --candidates 2000 --workers 4
+    python weight_sweep.py crops.csv environmental_data.csv --labels etiketler.txt --output sweep.json
+"""
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from prediction_model import MAX_SCORE_BLOCK_BYTES
+
+# Order of the weight vector columns; names match CropPredictionModel.weights
+WEIGHT_KEYS = ('temperature', 'humidity', 'water', 'ph', 'pest')
+
+# Upper bound on the boolean comparisons held at once when counting ranks
+MAX_RANK_ELEMENTS = 16 * 1024 * 1024
+
+
+def weight_vector(weights: Dict[str, float]) -> np.ndarray:
+    return np.array([weights[key] for key in WEIGHT_KEYS], dtype=np.float64)
+
+
+def component_tensor(envs: np.ndarray, crops: np.ndarray) -> np.ndarray:
+    """
+    Unweighted component scores as an (E, C, 5) array in WEIGHT_KEYS order.
+
+    tensor @ weight_vector(model.weights) equals score_matrix up to floating
+    point summation order.
+    """
+    tensor = np.empty((len(envs), len(crops), len(WEIGHT_KEYS)))
+    for column, scale in enumerate((50, 100, 1000, 14)):
+        tensor[:, :, column] = 1 - np.abs(envs[:, column, None] - crops[None, :, column]) / scale
+    tensor[:, :, 4] = (crops[None, :, 4] / 10) * (1 - envs[:, 5, None] / 10)
+    return tensor
+
+
+def random_weights(count: int, base: Dict[str, float], concentration: float = 50.0, seed: int = 0) -> np.ndarray:
+    """
+    Candidate weight vectors drawn from a Dirichlet distribution centred on base.
+
+    Higher concentration keeps candidates closer to base; every row sums to
+    the sum of the base weights.
+    """
+    base_vector = weight_vector(base)
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(base_vector / base_vector.sum() * concentration, count) * base_vector.sum()
+
+
+def grid_weights(step: float = 0.05, total: float = 1.0) -> np.ndarray:
+    """Every weight vector on the simplex with components that are multiples of step."""
+    units = int(round(total / step))
+    grid = np.stack(np.meshgrid(*[np.arange(units + 1)] * (len(WEIGHT_KEYS) - 1), indexing='ij'), -1)
+    grid = grid.reshape(-1, len(WEIGHT_KEYS) - 1)
+    grid = grid[grid.sum(axis=1) <= units]
+    return np.column_stack([grid, units - grid.sum(axis=1)]) * step
+
+
+@dataclass
+class SweepResult:
+    weights: np.ndarray  # (K, 5) in WEIGHT_KEYS order
+    top_n: int
+    environments: int
+    top1_unchanged: np.ndarray  # share of environments whose best crop matches the baseline
+    top_n_overlap: np.ndarray  # mean share of the baseline top-N kept in the candidate's top-N
+    mean_rank_change: np.ndarray  # mean |rank shift| of the baseline top-N crops
+    max_rank_change: np.ndarray
+    labeled: int = 0
+    reference_top1: Optional[np.ndarray] = None  # share of labeled envs whose label ranks first
+    reference_hit_at_n: Optional[np.ndarray] = None  # share of labeled envs with the label in the top-N
+
+    def ranking(self, metric: str = 'top_n_overlap') -> np.ndarray:
+        """Candidate indices, best first by metric (lowest first for rank changes)."""
+        values = getattr(self, metric)
+        return np.argsort(values if 'rank_change' in metric else -values, kind='stable')
+
+    def rows(self, limit: Optional[int] = None, metric: str = 'top_n_overlap') -> List[Dict]:
+        rows = []
+        for index in self.ranking(metric)[:limit]:
+            row = {'candidate': int(index), 'weights': dict(zip(WEIGHT_KEYS, self.weights[index].tolist()))}
+            for name in ('top1_unchanged', 'top_n_overlap', 'mean_rank_change', 'max_rank_change',
+                         'reference_top1', 'reference_hit_at_n'):
+                values = getattr(self, name)
+                if values is not None:
+                    row[name] = float(values[index])
+            rows.append(row)
+        return rows
+
+
+def _top_n_along_crops(scores: np.ndarray, top_n: int) -> np.ndarray:
+    """
+    (..., N) crop indices of the top_n scores along the last axis, ties in catalog order.
+
+    Same selection as top_n_indices, so the candidate and baseline rankings
+    agree on which tied crops make the top N; rows where ties straddle the
+    cut-off pick the lowest crop indices with one cumulative count.
+    """
+    if top_n <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+    if top_n >= scores.shape[-1]:
+        return np.argsort(-scores, axis=-1, kind='stable')
+    flat = scores.reshape(-1, scores.shape[-1])
+    part = np.argpartition(-flat, top_n - 1, axis=-1)[:, :top_n]
+    cutoff = np.take_along_axis(flat, part, axis=-1).min(axis=-1, keepdims=True)
+    straddle = np.flatnonzero((flat >= cutoff).sum(axis=-1) > top_n)
+    if len(straddle):
+        rows, row_cutoff = flat[straddle], cutoff[straddle]
+        tied = rows == row_cutoff
+        room = top_n - (rows > row_cutoff).sum(axis=-1, keepdims=True)
+        selected = (rows > row_cutoff) | (tied & (np.cumsum(tied, axis=-1) <= room))
+        part[straddle] = np.nonzero(selected)[1].reshape(-1, top_n)
+    order = np.lexsort((part, -np.take_along_axis(flat, part, axis=-1)), axis=-1)
+    return np.take_along_axis(part, order, axis=-1).reshape(scores.shape[:-1] + (top_n,))
+
+
+def _env_block_size(crops: int, top_n: int) -> int:
+    tensor_rows = MAX_SCORE_BLOCK_BYTES // (8 * len(WEIGHT_KEYS) * max(1, crops))
+    rank_rows = MAX_RANK_ELEMENTS // (max(1, crops) * max(1, top_n))
+    return max(1, min(tensor_rows, rank_rows))
+
+
+def _sweep_block(envs: np.ndarray, crops: np.ndarray, weights: np.ndarray, baseline: np.ndarray,
+                 labels: Optional[np.ndarray], top_n: int) -> Dict[str, np.ndarray]:
+    """Per-candidate sums over one block of environments."""
+    tensor = component_tensor(envs, crops)
+    rows, crop_count = len(envs), len(crops)
+    top_n = min(top_n, crop_count)
+    # Tensor rows are transposed to (B, 5, C) so every candidate's scores lie contiguous along crops
+    tensor_t = tensor.transpose(0, 2, 1)
+    base_scores = np.matmul(baseline, tensor_t)  # (B, C)
+    base_top = _top_n_along_crops(base_scores, top_n)
+    base_at = np.take_along_axis(base_scores, base_top, axis=1)
+    base_rank = (base_scores[:, :, None] > base_at[:, None, :]).sum(axis=1)
+
+    k = len(weights)
+    sums = {name: np.zeros(k) for name in ('top1_unchanged', 'top_n_overlap', 'rank_change', 'max_rank_change',
+                                           'reference_top1', 'reference_hit_at_n')}
+    labeled = labels >= 0 if labels is not None else None
+    step = max(1, MAX_RANK_ELEMENTS // max(1, rows * crop_count * top_n))
+    for start in range(0, k, step):
+        stop = min(k, start + step)
+        scores = np.matmul(weights[start:stop], tensor_t)  # (B, Kc, C)
+        top = _top_n_along_crops(scores, top_n)  # (B, Kc, N)
+        sums['top1_unchanged'][start:stop] = (top[:, :, 0] == base_top[:, :1]).sum(axis=0)
+        kept = (top[:, :, :, None] == base_top[:, None, None, :]).any(axis=2)
+        sums['top_n_overlap'][start:stop] = kept.sum(axis=(0, 2)) / top_n
+        at = np.take_along_axis(scores, np.broadcast_to(base_top[:, None, :], (rows, stop - start, top_n)), axis=-1)
+        rank = (scores[:, :, None, :] > at[:, :, :, None]).sum(axis=-1)  # (B, Kc, N)
+        change = np.abs(rank - base_rank[:, None, :])
+        sums['rank_change'][start:stop] = change.sum(axis=(0, 2)) / top_n
+        sums['max_rank_change'][start:stop] = change.max(axis=(0, 2))
+        if labels is not None:
+            label = labels[:, None]
+            sums['reference_top1'][start:stop] = ((top[:, :, 0] == label) & labeled[:, None]).sum(axis=0)
+            hit = (top == label[:, :, None]).any(axis=-1)
+            sums['reference_hit_at_n'][start:stop] = (hit & labeled[:, None]).sum(axis=0)
+    sums['labeled'] = np.array(int(labeled.sum()) if labeled is not None else 0)
+    return sums
+
+
+def _sweep_range(args):
+    envs, crops, weights, baseline, labels, top_n = args
+    block = _env_block_size(len(crops), top_n)
+    total = None
+    for start in range(0, len(envs), block):
+        block_labels = labels[start:start + block] if labels is not None else None
+        sums = _sweep_block(envs[start:start + block], crops, weights, baseline, block_labels, top_n)
+        if total is None:
+            total = sums
+            continue
+        for name, values in sums.items():
+            if name == 'max_rank_change':
+                np.maximum(total[name], values, out=total[name])
+            else:
+                total[name] = total[name] + values
+    return total
+
+
+def sweep_weights(envs: np.ndarray, crops: np.ndarray, weights: np.ndarray, baseline: Dict[str, float],
+                  top_n: int = 3, reference: Optional[Sequence[int]] = None, workers: Optional[int] = None) -> SweepResult:
+    """
+    Evaluate every row of weights (K, 5) on an (E, 6) env matrix and (C, 5) crop matrix.
+
+    reference holds the expected crop index per environment (-1 for
+    unlabeled ones). With workers > 1 the environments are split across a
+    process pool; each worker builds its own tensor blocks.
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    if weights.shape[1] != len(WEIGHT_KEYS):
+        raise ValueError(f"weight vectors must have {len(WEIGHT_KEYS)} columns ({', '.join(WEIGHT_KEYS)})")
+    labels = np.asarray(reference, dtype=np.int64) if reference is not None else None
+    if labels is not None and len(labels) != len(envs):
+        raise ValueError("reference must have one label per environment")
+    base = weight_vector(baseline)
+
+    if workers and workers > 1 and len(envs) > 1:
+        bounds = np.linspace(0, len(envs), min(workers * 4, len(envs)) + 1).astype(int)
+        jobs = [(envs[a:b], crops, weights, base, labels[a:b] if labels is not None else None, top_n)
+                for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(_sweep_range, jobs))
+    else:
+        parts = [_sweep_range((envs, crops, weights, base, labels, top_n))]
+
+    total = parts[0]
+    for part in parts[1:]:
+        for name, values in part.items():
+            total[name] = np.maximum(total[name], values) if name == 'max_rank_change' else total[name] + values
+    environments = max(1, len(envs))
+    labeled = int(total['labeled'])
+    result = SweepResult(
+        weights=weights,
+        top_n=min(top_n, len(crops)),
+        environments=len(envs),
+        top1_unchanged=total['top1_unchanged'] / environments,
+        top_n_overlap=total['top_n_overlap'] / environments,
+        mean_rank_change=total['rank_change'] / environments,
+        max_rank_change=total['max_rank_change'],
+        labeled=labeled,
+    )
+    if labels is not None:
+        result.reference_top1 = total['reference_top1'] / max(1, labeled)
+        result.reference_hit_at_n = total['reference_hit_at_n'] / max(1, labeled)
+    return result
+
+
+def main(argv=None) -> int:
+    from data_loader import iter_environmental_chunks, load_crop_data
+    from prediction_model import CropPredictionModel, env_matrix_from_columns
+
+    parser = argparse.ArgumentParser(description="Evaluate many scoring weight vectors at once.")
+    parser.add_argument('crops', help="crop catalog CSV (or columnar directory)")
+    parser.add_argument('environments', help="environmental data CSV (or columnar directory)")
+    parser.add_argument('--candidates', type=int, default=1000, help="random candidates around the current weights")
+    parser.add_argument('--grid-step', type=float, help="use every simplex grid point with this step instead")
+    parser.add_argument('--concentration', type=float, default=50.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top-n', type=int, default=3)
+    parser.add_argument('--labels', help="text file with the expected crop name per environment row ('' = unlabeled)")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--metric', default='top_n_overlap',
+                        choices=['top1_unchanged', 'top_n_overlap', 'mean_rank_change', 'max_rank_change',
+                                 'reference_top1', 'reference_hit_at_n'])
+    parser.add_argument('--limit', type=int, default=20, help="number of candidates to report")
+    parser.add_argument('--output', help="write the report as JSON to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    crop_data = load_crop_data(args.crops)
+    model = CropPredictionModel(crop_data)
+    envs = np.concatenate([env_matrix_from_columns(chunk) for chunk in iter_environmental_chunks(args.environments)])
+    reference = None
+    if args.labels:
+        positions = {crop.name: i for i, crop in enumerate(crop_data)}
+        with open(args.labels, encoding='utf-8') as file:
+            reference = [positions.get(line.strip(), -1) for line in file]
+    if args.metric.startswith('reference') and reference is None:
+        parser.error(f"--metric {args.metric} requires --labels")
+
+    if args.grid_step:
+        candidates = grid_weights(args.grid_step, total=sum(model.weights.values()))
+    else:
+        candidates = random_weights(args.candidates, model.weights, args.concentration, args.seed)
+    result = sweep_weights(envs, model.crop_matrix, candidates, model.weights, top_n=args.top_n,
+                           reference=reference, workers=args.workers)
+    report = {
+        'environments': result.environments,
+        'crops': len(crop_data),
+        'candidates': len(candidates),
+        'top_n': result.top_n,
+        'labeled': result.labeled,
+        'baseline': dict(model.weights),
+        'metric': args.metric,
+        'best': result.rows(args.limit, args.metric),
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    else:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
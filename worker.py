@@ -0,0 +1,219 @@
+"""
+Persistent worker for the field CLI.
+
+Every `python ana.py` run imports numpy and reportlab and loads the crop
+catalog before doing a few milliseconds of work. The worker does all of
+that once and then serves jobs over a Unix socket (or stdin/stdout), one
+JSON object per line in each direction:
+
+    {"op": "field", "env": {...}, "sensor_data": {...}, "crop": "Domates", "pdf": "/tam/yol/rapor.pdf"}
+    {"ok": true, "result": {...}}    or    {"ok": false, "error": "KeyError: 'humidity'"}
+
+Operations: ping, predict, analyze, field and shutdown. A connection may
+send several requests. PDF paths are resolved in the worker's working
+directory, so clients should send absolute paths.
+
+This module only imports the standard library at load time, so a client
+submitting a job stays cheap to start.
+
+Usage:
+    python worker.py serve --socket /tmp/tarim_worker.sock
+    TARIM_WORKER_SOCKET=/tmp/tarim_worker.sock python ana.py
+    python worker.py ping
+    python worker.py stop
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_SOCKET = os.environ.get('TARIM_WORKER_SOCKET') or os.path.join(tempfile.gettempdir(), 'tarim_worker.sock')
+
+
+class WorkerUnavailable(Exception):
+    """No worker accepted the connection; the job was not sent."""
+
+
+class WorkerError(Exception):
+    """The worker received the job but it failed."""
+
+
+class FieldWorker:
+    """Prediction model, sensor ranges and PDF styles loaded once and shared by all jobs."""
+
+    def __init__(self, crops_path: str = 'crops.csv', conditions_path: str = 'crop_conditions.csv'):
+        import ana
+        from pdf_generator import crop_table_style, get_styles, sensor_table_style
+
+        self.ana = ana
+        self.model, self.crop_conditions = ana.load_field_model(crops_path, conditions_path)
+        # reportlab is imported and the styles are built now rather than in the first report job
+        get_styles()
+        crop_table_style()
+        sensor_table_style()
+        self.jobs = 0
+        self._lock = threading.Lock()
+
+    def handle(self, request: Dict) -> Any:
+        op = request.get('op')
+        if op == 'ping':
+            return {'pid': os.getpid(), 'jobs': self.jobs, 'crops': len(self.model.crop_data)}
+        if op == 'predict':
+            env = self.ana.EnvironmentalData(**request['env'])
+            self._count()
+            return [[crop, score, dict(reasons)]
+                    for crop, score, reasons in self.model.predict_best_crops(env, request.get('top_n', 5))]
+        if op == 'analyze':
+            self._count()
+            alerts, recommendations = self.ana.analyze_sensor_data(request['sensor_data'], self.crop_conditions,
+                                                                   request['crop'])
+            return {'alerts': alerts, 'sensor_recommendations': recommendations}
+        if op == 'field':
+            self._count()
+            return self.ana.run_field(self.model, self.crop_conditions, self.ana.EnvironmentalData(**request['env']),
+                                      request['sensor_data'], request['crop'], request.get('pdf'),
+                                      request.get('top_n', 5))
+        raise ValueError(f"unknown operation: {op!r}")
+
+    def _count(self):
+        with self._lock:
+            self.jobs += 1
+
+
+def process_line(worker: FieldWorker, line: bytes) -> Tuple[bytes, bool]:
+    """Encoded response to one request line, and whether the worker should stop."""
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+        if request.get('op') == 'shutdown':
+            return json.dumps({'ok': True, 'result': None}).encode('utf-8') + b'\n', True
+        response = {'ok': True, 'result': worker.handle(request)}
+    except Exception as exc:
+        # The worker keeps serving; the client gets the error instead of a dropped connection
+        response = {'ok': False, 'error': f"{type(exc).__name__}: {exc}"}
+    return json.dumps(response).encode('utf-8') + b'\n', False
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response, stop = process_line(self.server.worker, line)
+            self.wfile.write(response)
+            self.wfile.flush()
+            if stop:
+                # shutdown() waits for serve_forever, so it cannot run on this handler's thread
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+
+def _is_listening(path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            return False
+    return True
+
+
+def serve_socket(worker: FieldWorker, path: str = DEFAULT_SOCKET, on_ready: Optional[Callable[[], None]] = None):
+    """Serve jobs on a Unix socket, one thread per connection, until a shutdown request."""
+    if os.path.exists(path):
+        if _is_listening(path):
+            raise RuntimeError(f"a worker is already listening on {path}")
+        os.unlink(path)  # left behind by a worker that was killed
+    with socketserver.ThreadingUnixStreamServer(path, _RequestHandler) as server:
+        server.daemon_threads = True
+        server.worker = worker
+        if on_ready is not None:
+            on_ready()
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
+
+def serve_stream(worker: FieldWorker, infile=None, outfile=None):
+    """Serve jobs line by line from a binary stream (stdin by default) until EOF or shutdown."""
+    infile = infile or sys.stdin.buffer
+    outfile = outfile or sys.stdout.buffer
+    for line in infile:
+        if not line.strip():
+            continue
+        response, stop = process_line(worker, line)
+        outfile.write(response)
+        outfile.flush()
+        if stop:
+            return
+
+
+def submit(path: str, op: str, timeout: Optional[float] = None, **params) -> Any:
+    """
+    Send one job to the worker on path and return its result.
+
+    Raises WorkerUnavailable if no worker accepts the connection, and
+    WorkerError if the job itself failed.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(path)
+        except OSError as exc:
+            raise WorkerUnavailable(f"{path}: {exc.strerror or exc}") from exc
+        sock.sendall(json.dumps(dict(params, op=op)).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        raise WorkerError("worker closed the connection without a response")
+    response = json.loads(line)
+    if not response['ok']:
+        raise WorkerError(response['error'])
+    return response['result']
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Model ve kataloğu bellekte tutan kalıcı tarla işçisi.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help="işçiyi başlat")
+    serve.add_argument('--socket', default=DEFAULT_SOCKET)
+    serve.add_argument('--stdio', action='store_true', help="soket yerine stdin/stdout üzerinden çalış")
+    serve.add_argument('--crops', default='crops.csv')
+    serve.add_argument('--conditions', default='crop_conditions.csv')
+    for name, text in (('ping', "işçinin durumunu göster"), ('stop', "işçiyi durdur")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument('--socket', default=DEFAULT_SOCKET)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        worker = FieldWorker(args.crops, args.conditions)
+        if args.stdio:
+            serve_stream(worker)
+            return 0
+        try:
+            serve_socket(worker, args.socket, lambda: print(
+                f"İşçi hazır: {args.socket} ({len(worker.model.crop_data)} ürün)", file=sys.stderr, flush=True))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    try:
+        result = submit(args.socket, 'ping' if args.command == 'ping' else 'shutdown', timeout=10)
+    except WorkerUnavailable as exc:
+        print(f"İşçi çalışmıyor: {exc}", file=sys.stderr)
+        return 1
+    if args.command == 'ping':
+        print(f"İşçi çalışıyor: pid {result['pid']}, {result['crops']} ürün, {result['jobs']} iş")
+    else:
+        print("İşçi durduruldu")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())